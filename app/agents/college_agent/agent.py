@@ -8,13 +8,18 @@ Pipeline: query_analysis_agent -> college_agent
 2. college_agent: Uses optimized query to search Pinecone and provide answers
 
 NOTE: ADK requires the agent variable to be named 'root_agent' for discovery.
+It is built on first access (module __getattr__), so importing this module or
+booting the API server does not construct the agents.
 """
 
+from typing import Optional
+
 from google.adk.agents import SequentialAgent
 from app.agents.sub_agents.query_analysis_agent.query_analysis_agent import (
     create_query_analysis_agent,
 )
 from app.agents.sub_agents.college_agent.college_agent import create_college_agent
+from app.services.env import load_env
 
 
 def create_college_consulting_pipeline() -> SequentialAgent:
@@ -39,5 +44,20 @@ def create_college_consulting_pipeline() -> SequentialAgent:
     )
 
 
-# ADK requires this variable to be named 'root_agent'
-root_agent = create_college_consulting_pipeline()
+_root_agent: Optional[SequentialAgent] = None
+
+
+def get_root_agent() -> SequentialAgent:
+    """Builds the pipeline on first use; later calls return the same instance."""
+    global _root_agent
+    if _root_agent is None:
+        load_env()
+        _root_agent = create_college_consulting_pipeline()
+    return _root_agent
+
+
+def __getattr__(name: str):
+    # ADK requires this variable to be named 'root_agent'
+    if name == "root_agent":
+        return get_root_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
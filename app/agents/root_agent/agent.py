@@ -1,11 +1,28 @@
+from typing import Optional
+
 from google.adk.agents import Agent, SequentialAgent
 # Use absolute import assuming run from project root
 from app.agents.sub_agents.extract_pdf_agent.extract_pdf_agent import create_extract_pdf_agent
+from app.services.env import load_env
+
+_root_agent: Optional[SequentialAgent] = None
+
 
-root_agent = SequentialAgent(
-        name="root_agent",
-        description="Root agent",
-        sub_agents=[create_extract_pdf_agent()]
-    )
+def get_root_agent() -> SequentialAgent:
+    """Builds the extraction pipeline on first use; later calls return the same instance."""
+    global _root_agent
+    if _root_agent is None:
+        load_env()
+        _root_agent = SequentialAgent(
+            name="root_agent",
+            description="Root agent",
+            sub_agents=[create_extract_pdf_agent()]
+        )
+    return _root_agent
 
 
+def __getattr__(name: str):
+    # ADK discovers the agent through the module attribute 'root_agent'
+    if name == "root_agent":
+        return get_root_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
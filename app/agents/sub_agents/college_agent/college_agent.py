@@ -2,14 +2,19 @@
 College Agent Sub-agent Implementation.
 
 This agent specializes in answering questions about US colleges.
-It uses the query_college_info tool to search Pinecone vector database.
+It uses the query_college_info tool to search Pinecone vector database,
+and get_institution_summary for precomputed per-institution overviews.
 It receives the optimized query from query_analysis_agent via {query_analysis_result}.
 """
 
 from google.adk.agents import Agent
 from google.adk.planners import BuiltInPlanner
 from google.genai import types
+
+from app.services.metrics import end_llm_span, start_llm_span
+
 from .tools.query_pinecone import query_college_info
+from .tools.summary_card import get_institution_summary
 
 
 def create_college_agent() -> Agent:
@@ -32,6 +37,9 @@ You are an expert US college admissions consultant with extensive knowledge abou
 The query_analysis_agent has already analyzed and optimized the user's query for RAG search.
 The optimized search query is: {query_analysis_result}
 
+## Earlier Conversation (summary, may be empty)
+{conversation_summary?}
+
 ## Your Role
 - Use the optimized query to search for relevant college information
 - Provide helpful, accurate, and comprehensive answers
@@ -42,6 +50,12 @@ The optimized search query is: {query_analysis_result}
 2. Analyze the search results carefully
 3. Provide a comprehensive answer based on the retrieved information
 4. Always cite the source of your information when possible
+5. Results come from each college's latest Common Data Set unless the user asks about
+   other years. For trends or specific years, pass `academic_years` to the tool
+   (e.g. "2022-2023,2023-2024", or "all" for every year on record) and mention the
+   academic year of each figure you quote
+6. For a general overview of a single college ("tell me about X"), call
+   `get_institution_summary` instead of searching, and answer from its card
 
 ## Response Guidelines
 - Be professional yet approachable
@@ -56,7 +70,9 @@ The optimized search query is: {query_analysis_result}
 - You must use this optimized query for the query_college_info tool
 - But your final response should match the user's original language
 """,
-        tools=[query_college_info],
+        tools=[query_college_info, get_institution_summary],
+        before_model_callback=start_llm_span,
+        after_model_callback=end_llm_span,
         planner=BuiltInPlanner(
             thinking_config=types.ThinkingConfig(
                 include_thoughts=True,
@@ -64,7 +80,3 @@ The optimized search query is: {query_analysis_result}
             )
         ),
     )
-
-
-# Create a singleton instance for import
-college_agent = create_college_agent()
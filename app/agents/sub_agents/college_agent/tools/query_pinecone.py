@@ -3,111 +3,589 @@ Pinecone Query Tool for College Agent.
 
 This tool searches college information from Pinecone vector database.
 The query should already be in English (translated by query_analysis_agent).
+
+Queries are embedded by the configured provider (EMBEDDING_PROVIDER, see
+app/services/embeddings.py). With LOCAL_VECTOR_INDEX_PATH set, the search
+runs against a LocalVectorIndex written by `script/indexer.py --local-index`
+instead of Pinecone, so the backend can serve without the network.
+
+With PARTITION_BY_ACADEMIC_YEAR on, vectors are partitioned by academic year
+and a search covers each institution's latest year unless the query asks for
+particular years or a trend, in which case those years' partitions are
+searched in parallel and merged.
+
+The index holds section chunks and smaller field-group chunks linked to their
+section (see app/services/cds_records.py). resolve_granularity() returns the
+field groups that matched, and the whole section only when the question is
+about most of it, which keeps point lookups to a few lines of context.
+
+Retrieval is hybrid: a BM25 index over the same chunks (LEXICAL_INDEX_PATH,
+see app/services/lexical_index.py) is searched first. When its best match is
+confident, as for "Rose-Hulman room and board", that ranking is used on its
+own and the embedding call is skipped; otherwise the lexical and vector
+rankings are merged by reciprocal-rank fusion.
+
+Query embeddings and search results are also kept in the shared cache
+(app/services/cache.py), so every worker benefits from a search any of them
+has run. Cached results are versioned by data_version() and stop being served as
+soon as the index is rebuilt or the extracted records change.
 """
 
+import asyncio
+import hashlib
 import os
-import httpx
-from typing import List
-from dotenv import load_dotenv
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from google.adk.tools import ToolContext
 from pinecone import Pinecone
 
-# Load environment variables
-current_dir = os.path.dirname(os.path.abspath(__file__))
-project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(current_dir))))
-env_path = os.path.join(project_root, 'app', '.env')
+from app.services.cache import SharedCache, get_shared_cache
+from app.services.cds_records import PARTITION_BY_ACADEMIC_YEAR, partition_namespace
+from app.services.embeddings import EmbeddingUnavailable, get_embedding_provider
+from app.services.entities import detect_academic_years
+from app.services.env import get_env
+from app.services.fact_store import get_fact_store
+from app.services.governor import AdmissionRejected, get_governor
+from app.services.lexical_index import LexicalIndex, get_lexical_index, reciprocal_rank_fusion, rescale
+from app.services.metrics import EVENTS, span
 
-if os.path.exists(env_path):
-    load_dotenv(dotenv_path=env_path)
-else:
-    load_dotenv(dotenv_path="app/.env")
+from .working_set import (
+    SOURCES_STATE_KEY,
+    WORKING_SET_STATE_KEY,
+    load_working_set,
+    plan_retrieval,
+    remember,
+    sources_of,
+)
 
-PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 INDEX_NAME = "college-consulting-index"
+# Overridable so benchmarks can point at a local stand-in (see script/stand_ins.py)
+PINECONE_INDEX_HOST = os.getenv("PINECONE_INDEX_HOST", "")
+LOCAL_VECTOR_INDEX_PATH = os.getenv("LOCAL_VECTOR_INDEX_PATH", "")
+# Year partitions searched at once for multi-year questions
+PARTITION_SEARCH_WORKERS = int(os.getenv("PARTITION_SEARCH_WORKERS", "4"))
+# Field groups of one section that have to match before the whole section is returned
+FIELD_EXPAND_MIN_GROUPS = int(os.getenv("FIELD_EXPAND_MIN_GROUPS", "3"))
+# A section and its field groups compete for the same slots, so each search over-fetches
+FIELD_CANDIDATE_FACTOR = 2
+# Fuse BM25 results with the vector results (needs the lexical index built by script/indexer.py)
+HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "true").lower() in ("1", "true", "yes")
+# Names the index build in shared cache keys; when unset it is derived from the index itself
+INDEX_BUILD_ID = os.getenv("INDEX_BUILD_ID", "")
+# How often the Pinecone-derived build id is re-read
+CACHE_VERSION_TTL_SECONDS = float(os.getenv("CACHE_VERSION_TTL_SECONDS", "300"))
+
+# API keys come from app/.env, read on first use rather than at import
+_index = None
+_local_index = None
+_local_index_build = ""
+_pinecone_build: Tuple[float, str] = (0.0, "")
+_build_lock = threading.Lock()
+_partition_pool = ThreadPoolExecutor(max_workers=PARTITION_SEARCH_WORKERS, thread_name_prefix="partition-search")
+
+
+def _get_index():
+    """Connects to the Pinecone index on first use and reuses the client afterwards."""
+    global _index
+    if _index is None:
+        pc = Pinecone(api_key=get_env("PINECONE_API_KEY"))
+        _index = pc.Index(INDEX_NAME, host=PINECONE_INDEX_HOST)
+    return _index
+
+
+def _get_local_index():
+    """Loads the LOCAL_VECTOR_INDEX_PATH index into memory on first use."""
+    global _local_index, _local_index_build
+    if _local_index is None:
+        # Imported lazily: numpy is only needed for the local backend
+        from app.services.vector_store import PartitionedVectorIndex
+
+        base = os.path.splitext(LOCAL_VECTOR_INDEX_PATH)[0]
+        manifest = next(
+            (path for path in (f"{base}.partitions.json", f"{base}.json") if os.path.exists(path)), LOCAL_VECTOR_INDEX_PATH
+        )
+        # The manifest is written last, so its modification time identifies the build
+        _local_index_build = f"local-{os.stat(manifest).st_mtime_ns}"
+        _local_index = PartitionedVectorIndex.load(LOCAL_VECTOR_INDEX_PATH)
+        print(
+            f"📦 Loaded local vector index ({len(_local_index)} vectors, "
+            f"{len(_local_index.namespaces())} partitions) from {LOCAL_VECTOR_INDEX_PATH}"
+        )
+    return _local_index
+
+
+def open_connections() -> Dict[str, Any]:
+    """Loads the local index or connects to Pinecone ahead of the first query (startup warm-up)."""
+    lexical = get_lexical_index() if HYBRID_RETRIEVAL else None
+    lexical_chunks = len(lexical) if lexical is not None else None
+    if LOCAL_VECTOR_INDEX_PATH:
+        return {"backend": "local", "vectors": len(_get_local_index()), "lexical_chunks": lexical_chunks}
+    with span("vector_describe"):
+        stats = _get_index().describe_index_stats()
+    return {"backend": "pinecone", "vectors": getattr(stats, "total_vector_count", None), "lexical_chunks": lexical_chunks}
+
+
+def index_build_id() -> str:
+    """
+    Identifies the vector index build that cached retrieval results came from.
+
+    INDEX_BUILD_ID when set (e.g. by the deploy that re-indexed). Otherwise the
+    local index's manifest time, or for Pinecone a digest of the vector count
+    of every namespace, re-read at most every CACHE_VERSION_TTL_SECONDS. An
+    in-place re-index that keeps every count unchanged is not detected; set
+    INDEX_BUILD_ID for those.
+    """
+    global _pinecone_build
+    if INDEX_BUILD_ID:
+        return INDEX_BUILD_ID
+    if LOCAL_VECTOR_INDEX_PATH:
+        _get_local_index()
+        return _local_index_build
+    with _build_lock:
+        checked_at, build = _pinecone_build
+        if build and time.monotonic() - checked_at < CACHE_VERSION_TTL_SECONDS:
+            return build
+        try:
+            stats = _get_index().describe_index_stats()
+            counts = sorted((name, getattr(ns, "vector_count", 0)) for name, ns in (stats.namespaces or {}).items())
+            build = "pinecone-" + hashlib.sha1(repr(counts).encode("utf-8")).hexdigest()[:12]
+        except Exception as e:
+            # Keep serving under the last known build; without one, shared retrieval entries stay unused
+            print(f"⚠️ Could not read the index build for cache keys: {e}")
+            build = build or f"unknown-{os.getpid()}"
+        _pinecone_build = (time.monotonic(), build)
+        return build
+
+
+def data_version() -> str:
+    """Version of cached retrieval results and answers: the index build plus the fact store they were rendered from."""
+    return f"{index_build_id()}.{get_fact_store().version}"
+
+
+def _get_cache() -> SharedCache:
+    cache = get_shared_cache()
+    cache.register_version("retrieval", data_version)
+    return cache
 
 
 def _get_embedding(text: str) -> List[float]:
     """
-    Generate embeddings using Gemini API via REST.
+    Generate embeddings with the configured embedding provider.
+    
+    Vectors cached in this process or in the shared cache skip admission
+    control; Gemini calls are retried, hedged and bounded by a deadline
+    (app/services/embeddings.py).
     
     Args:
         text: Text to generate embedding for.
         
     Returns:
-        List of floats representing the embedding vector.
+        List of floats representing the embedding vector (empty on failure).
     """
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-embedding-001:embedContent?key={GOOGLE_API_KEY}"
-    payload = {
-        "content": {"parts": [{"text": text}]},
-        "output_dimensionality": 768
-    }
+    provider = get_embedding_provider()
+    cached = provider.cached(text)
+    if cached is not None:
+        return cached
+    # Vectors of different models or dimensions never share a key
+    material = [provider.name, provider.model, provider.dimension, text]
+    cache = _get_cache()
+    cached = cache.get_vector("embedding", material)
+    if cached is not None:
+        provider.remember(text, cached)
+        return cached
     try:
-        response = httpx.post(url, json=payload, timeout=30.0)
-        response.raise_for_status()
-        return response.json()['embedding']['values']
-    except Exception as e:
+        with get_governor().admit_sync("embedding"), span("embedding", chars=len(text), provider=provider.name):
+            vector = provider.embed(text)
+    except EmbeddingUnavailable as e:
         print(f"Error generating embedding: {e}")
         return []
+    cache.set_vector("embedding", material, vector)
+    return vector
+
+
+def _format_results(matches: List[Dict[str, Any]], from_context: bool = False) -> str:
+    """Formats retrieved chunks for the agent."""
+    formatted_results = []
+    if from_context:
+        formatted_results.append(
+            f"📊 Found {len(matches)} relevant results (reused from earlier in this conversation):\n"
+        )
+    else:
+        formatted_results.append(f"📊 Found {len(matches)} relevant results:\n")
+
+    for i, match in enumerate(matches, 1):
+        result_text = f"""
+---
+### Result #{i} (Relevance: {match['score']:.2%})
+- **Institution**: {match.get('institution_name', 'N/A')}
+- **Section**: {match.get('section', 'N/A')}{f" ({match['field_group']})" if match.get('field_group') else ''}
+- **Academic Year**: {match.get('academic_year', 'N/A')}
+- **Source**: {match.get('source_file', 'N/A')}
+
+**Content**:
+{match.get('text', 'N/A')}
+"""
+        formatted_results.append(result_text)
+
+    return "\n".join(formatted_results)
+
+
+def _to_chunk(match: Any) -> Dict[str, Any]:
+    """Converts a Pinecone match into a plain, JSON-serializable chunk."""
+    metadata = match['metadata'] or {}
+    return {
+        "id": match['id'],
+        "score": float(match['score']),
+        "institution_name": metadata.get('institution_name', 'N/A'),
+        "section": metadata.get('section', 'N/A'),
+        "academic_year": metadata.get('academic_year', 'N/A'),
+        "source_file": metadata.get('source_file', 'N/A'),
+        "granularity": metadata.get('granularity', 'section'),
+        "field_group": metadata.get('field_group'),
+        "parent_id": metadata.get('parent_id'),
+        "text": metadata.get('text', 'N/A'),
+    }
+
+
+class RetrievalError(Exception):
+    """Raised when the embedding or the vector search fails."""
+
+
+def search_by_vector(
+    vector: List[float],
+    top_k: int = 5,
+    metadata_filter: Optional[Dict[str, Any]] = None,
+    namespace: Optional[str] = None,
+    academic_year: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Run the vector search for an already computed embedding, in one partition.
+    
+    Args:
+        namespace: Pinecone namespace; defaults to the configured embedding provider's.
+        academic_year: Search this year's partition of the namespace
+            (None = the unpartitioned namespace).
+    
+    Raises:
+        RetrievalError: The vector search failed.
+    """
+    if metadata_filter:
+        print(f"🎯 Narrowed search with filter: {metadata_filter}")
+
+    if LOCAL_VECTOR_INDEX_PATH:
+        try:
+            with span("vector_query", top_k=top_k, filtered=bool(metadata_filter), backend="local", year=academic_year):
+                return _get_local_index().query(
+                    vector, top_k=top_k, metadata_filter=metadata_filter,
+                    namespace=partition_namespace("", academic_year),
+                )
+        except Exception as e:
+            raise RetrievalError(f"Error querying the local vector index: {e}")
+
+    try:
+        index = _get_index()
+
+        query_kwargs: Dict[str, Any] = {"filter": metadata_filter} if metadata_filter else {}
+        namespace = get_embedding_provider().namespace if namespace is None else namespace
+        namespace = partition_namespace(namespace, academic_year)
+        if namespace:
+            query_kwargs["namespace"] = namespace
+
+        with span("vector_query", top_k=top_k, filtered=bool(metadata_filter), year=academic_year):
+            results = index.query(
+                vector=vector,
+                top_k=top_k,
+                include_metadata=True,
+                **query_kwargs
+            )
+    except Exception as e:
+        raise RetrievalError(f"Error querying Pinecone: {e}")
+
+    return [_to_chunk(match) for match in results['matches']]
+
+
+# (academic year, institutions restricted to it) per partition to search
+Scope = List[Tuple[Optional[str], Optional[List[str]]]]
+
+
+def year_scope(institutions: Optional[List[str]] = None, years: Optional[List[str]] = None) -> Scope:
+    """
+    The (academic year, institutions) partitions a search covers.
 
+    Falls back to the unpartitioned namespace when partitioning is off or no
+    extracted records are available to tell which years exist.
+    """
+    if not PARTITION_BY_ACADEMIC_YEAR:
+        return [(None, None)]
+    store = get_fact_store()
+    if not store.years():
+        return [(None, None)]
+    return store.search_scope(institutions, years)
+
+
+def _and_filter(*filters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    present = [f for f in filters if f]
+    if len(present) > 1:
+        return {"$and": present}
+    return present[0] if present else None
+
+
+def _section_chunk(field: Dict[str, Any], parent_id: str) -> Optional[Dict[str, Any]]:
+    """The parent section of a field-group chunk, rendered from the fact store."""
+    year = field.get("academic_year")
+    text = get_fact_store().section_text(field["institution_name"], field["section"], None if year == "N/A" else year)
+    if not text:
+        return None
+    return dict(field, id=parent_id, granularity="section", field_group=None, parent_id=None, text=text)
+
+
+def resolve_granularity(chunks: List[Dict[str, Any]], limit: int) -> List[Dict[str, Any]]:
+    """
+    Picks the finest useful granularity for each matched section.
+
+    A section matched through a few of its field groups is answered with
+    those small chunks. The whole section is returned instead when its own
+    chunk outranks its field groups, or when FIELD_EXPAND_MIN_GROUPS or more
+    of them matched (a broad question about that section). A section that
+    has to be expanded but was not retrieved is rendered from the fact store.
+
+    Args:
+        chunks: Search results of both granularities, best first.
+        limit: Number of chunks to return.
+    """
+    by_parent: Dict[str, List[Dict[str, Any]]] = {}
+    for chunk in chunks:
+        by_parent.setdefault(chunk.get("parent_id") or chunk["id"], []).append(chunk)
+
+    resolved = []
+    for parent_id, hits in by_parent.items():
+        section = next((c for c in hits if c.get("granularity", "section") == "section"), None)
+        fields = [c for c in hits if c.get("granularity") == "field"]
+        if section is not None and (not fields or section["score"] >= fields[0]["score"]):
+            resolved.append(section)
+        elif len(fields) >= FIELD_EXPAND_MIN_GROUPS:
+            expanded = dict(section, score=fields[0]["score"]) if section else _section_chunk(fields[0], parent_id)
+            resolved.extend([expanded] if expanded else fields)
+        else:
+            resolved.extend(fields)
+    resolved.sort(key=lambda chunk: -chunk["score"])
+    return resolved[:limit]
+
+
+def _search_partitions(
+    vector: List[float],
+    top_k: int,
+    metadata_filter: Optional[Dict[str, Any]],
+    scope: Scope,
+    namespace: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """Candidates of both granularities from every partition in the scope, best first."""
+
+    def search(part: Tuple[Optional[str], Optional[List[str]]]) -> List[Dict[str, Any]]:
+        year, restrict = part
+        narrowed = _and_filter(metadata_filter, {"institution_name": {"$in": restrict}} if restrict else None)
+        return search_by_vector(
+            vector, top_k=top_k * FIELD_CANDIDATE_FACTOR, metadata_filter=narrowed, namespace=namespace, academic_year=year
+        )
+
+    if len(scope) == 1:
+        chunks = search(scope[0])
+    else:
+        chunks = [chunk for found in _partition_pool.map(search, scope) for chunk in found]
+    chunks.sort(key=lambda chunk: -chunk["score"])
+    return chunks
+
+
+def _search_lexical(
+    index: LexicalIndex, query: str, top_k: int, metadata_filter: Optional[Dict[str, Any]], scope: Scope
+) -> List[Dict[str, Any]]:
+    """BM25 candidates from the same partitions, restricted by metadata instead of by namespace."""
+    chunks = []
+    with span("lexical_query", top_k=top_k, partitions=len(scope)):
+        for year, restrict in scope:
+            narrowed = _and_filter(
+                metadata_filter,
+                {"institution_name": {"$in": restrict}} if restrict else None,
+                {"academic_year": year} if year else None,
+            )
+            chunks.extend(index.query(query, top_k=top_k * FIELD_CANDIDATE_FACTOR, metadata_filter=narrowed))
+    chunks.sort(key=lambda chunk: -chunk["score"])
+    return chunks
+
+
+def _result_limit(top_k: int, scope: Scope, years: Optional[List[str]]) -> int:
+    return top_k * len(scope) if years else top_k
+
+
+def search_scoped(
+    vector: List[float],
+    top_k: int = 5,
+    metadata_filter: Optional[Dict[str, Any]] = None,
+    institutions: Optional[List[str]] = None,
+    years: Optional[List[str]] = None,
+    namespace: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Searches every partition in the year scope and merges the results by score.
+
+    Returns top_k chunks for the latest-year scope, and up to top_k per year
+    when explicit years are asked for, so a trend question sees every year.
+    Section and field-group matches are resolved by resolve_granularity().
+
+    Raises:
+        RetrievalError: A partition search failed.
+    """
+    scope = year_scope(institutions, years)
+    chunks = _search_partitions(vector, top_k, metadata_filter, scope, namespace)
+    return resolve_granularity(chunks, _result_limit(top_k, scope, years))
+
+
+def search_chunks(
+    query: str,
+    top_k: int = 5,
+    metadata_filter: Optional[Dict[str, Any]] = None,
+    institutions: Optional[List[str]] = None,
+    years: Optional[List[str]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Run the hybrid lexical and vector search.
+    
+    A confident BM25 match is returned without embedding the query. Otherwise
+    the query is embedded and the vector ranking is fused with the BM25
+    ranking (or used alone without a lexical index); if only the embedding
+    fails, the BM25 ranking is returned on its own.
+    
+    Args:
+        query: Search query (any language; the embedding model is multilingual).
+        top_k: Number of chunks to return (per year when years are given).
+        metadata_filter: Optional Pinecone metadata filter.
+        institutions: Institutions the search is about, which decides their latest year.
+        years: Academic years to search instead of the latest.
+        
+    Returns:
+        Retrieved chunks, best match first (from the shared cache when this
+        search already ran against the current index build).
+        
+    Raises:
+        AdmissionRejected: The embedding lane is saturated.
+        RetrievalError: The embedding or the Pinecone query failed.
+    """
+    cache = _get_cache()
+    material = {
+        "query": query,
+        "top_k": top_k,
+        "filter": metadata_filter,
+        "institutions": sorted(institutions) if institutions else None,
+        "years": sorted(years) if years else None,
+        "provider": get_embedding_provider().name,
+        "hybrid": HYBRID_RETRIEVAL,
+    }
+    cached = cache.get_json("retrieval", material)
+    if cached is not None:
+        EVENTS.inc(event="retrieval_cache_hit")
+        return cached
+
+    scope = year_scope(institutions, years)
+    lexical_index = get_lexical_index() if HYBRID_RETRIEVAL else None
+    lexical = _search_lexical(lexical_index, query, top_k, metadata_filter, scope) if lexical_index else []
 
-def query_college_info(query: str, top_k: int = 5) -> str:
+    if lexical and lexical_index.is_confident(query, lexical):
+        EVENTS.inc(event="retrieval_lexical_fast_path")
+        candidates = rescale(lexical)
+    else:
+        query_embedding = _get_embedding(query)
+        if query_embedding:
+            candidates = _search_partitions(query_embedding, top_k, metadata_filter, scope)
+            if lexical:
+                EVENTS.inc(event="retrieval_hybrid")
+                candidates = reciprocal_rank_fusion([candidates, lexical])
+        elif lexical:
+            print("⚠️ Embedding failed, searching with the lexical index only")
+            EVENTS.inc(event="retrieval_lexical_only")
+            candidates = rescale(lexical)
+        else:
+            raise RetrievalError("Failed to generate embedding for the query. Please try again.")
+
+    chunks = resolve_granularity(candidates, _result_limit(top_k, scope, years))
+    cache.set_json("retrieval", material, chunks)
+    return chunks
+
+
+def requested_years(query: str, academic_years: str) -> Optional[List[str]]:
+    """Years from the tool argument ("all" or a comma-separated list), else from the query text."""
+    known = get_fact_store().years()
+    if academic_years.strip().lower() == "all":
+        return known or None
+    if academic_years.strip():
+        return detect_academic_years(academic_years.replace(",", " "), known)
+    return detect_academic_years(query, known)
+
+
+async def query_college_info(query: str, tool_context: ToolContext, top_k: int = 5, academic_years: str = "") -> str:
     """
     Search college information from Pinecone vector database.
     
     This tool searches for relevant college information based on the user's query.
     The query should already be optimized for RAG search (in English).
+    Follow-up questions about institutions already discussed in this session
+    are answered from the session's working set or searched with a narrowed filter.
+    By default only each institution's most recent Common Data Set is searched.
     
     Args:
         query: Optimized search query in English.
                This should be the analyzed and translated query from query_analysis_agent.
-        top_k: Number of search results to return. Default is 5.
+        top_k: Number of search results to return (per academic year when several are searched). Default is 5.
+        academic_years: Leave empty for the latest data. For questions about
+               particular years or trends, comma-separated academic years
+               (e.g. "2022-2023,2023-2024") or "all".
         
     Returns:
         A formatted string containing relevant college information from the search results.
-        Each result includes the source file, institution name, section, and content.
+        Each result includes the source file, institution name, section, academic year and content.
     """
     print(f"🔍 Searching with query: {query}")
+
+    years = requested_years(query, academic_years or "")
+    if years is not None and PARTITION_BY_ACADEMIC_YEAR and not year_scope(years=years):
+        available = ", ".join(get_fact_store().years()) or "none"
+        return f"No college information is available for academic year(s) {', '.join(years)}. Available years: {available}."
+
+    working_set = load_working_set(tool_context.state)
+    plan = plan_retrieval(query, working_set, years)
+
+    if plan.is_cache_hit:
+        print(f"♻️ Reusing {len(plan.cached_chunks)} cached chunks for {plan.institutions}")
+        EVENTS.inc(event="working_set_hit")
+        tool_context.state[WORKING_SET_STATE_KEY] = remember(working_set, query, plan, plan.cached_chunks)
+        tool_context.state[SOURCES_STATE_KEY] = sources_of(plan.cached_chunks)
+        with span("format_results", chunks=len(plan.cached_chunks)):
+            return _format_results(plan.cached_chunks, from_context=True)
     
-    # Generate embedding for the query
-    query_embedding = _get_embedding(query)
-    
-    if not query_embedding:
-        return "Failed to generate embedding for the query. Please try again."
-    
-    # Query Pinecone
+    # Search (narrowed to the working set's institutions when this is a follow-up).
+    # ADK calls the tool on the event loop, and the search blocks: embedding
+    # calls wait for an "embedding" lane slot, then Pinecone answers over HTTP
     try:
-        pc = Pinecone(api_key=PINECONE_API_KEY)
-        index = pc.Index(INDEX_NAME)
-        
-        results = index.query(
-            vector=query_embedding,
+        chunks = await asyncio.to_thread(
+            search_chunks,
+            query,
             top_k=top_k,
-            include_metadata=True
+            metadata_filter=plan.metadata_filter,
+            institutions=plan.institutions or None,
+            years=years,
         )
-    except Exception as e:
-        return f"Error querying Pinecone: {e}"
+    except AdmissionRejected as e:
+        return f"The search service is busy right now. Please try again in {e.retry_after} seconds."
+    except RetrievalError as e:
+        return str(e)
     
     # Format and return results
-    if not results['matches']:
+    if not chunks:
         return "No relevant college information found for your query."
-    
-    formatted_results = []
-    formatted_results.append(f"📊 Found {len(results['matches'])} relevant results:\n")
-    
-    for i, match in enumerate(results['matches'], 1):
-        score = match['score']
-        metadata = match['metadata']
-        
-        result_text = f"""
----
-### Result #{i} (Relevance: {score:.2%})
-- **Institution**: {metadata.get('institution_name', 'N/A')}
-- **Section**: {metadata.get('section', 'N/A')}
-- **Source**: {metadata.get('source_file', 'N/A')}
 
-**Content**:
-{metadata.get('text', 'N/A')}
-"""
-        formatted_results.append(result_text)
-    
-    return "\n".join(formatted_results)
+    tool_context.state[WORKING_SET_STATE_KEY] = remember(working_set, query, plan, chunks)
+    tool_context.state[SOURCES_STATE_KEY] = sources_of(chunks)
+
+    with span("format_results", chunks=len(chunks)):
+        return _format_results(chunks)
@@ -0,0 +1,33 @@
+"""
+Summary Card Tool for College Agent.
+
+Returns an institution's precomputed summary card (see
+app/services/summary_cards.py) instead of searching every section, for
+general "tell me about X" questions.
+"""
+
+from app.services.metrics import EVENTS
+from app.services.summary_cards import find_institution, get_card
+
+
+def get_institution_summary(institution: str, language: str = "en") -> str:
+    """
+    Get the summary card of one college: profile, admissions, test scores, cost, aid, students and deadlines.
+
+    Use this for general overview questions about a single college ("tell me
+    about Hamilton College"). For particular facts, comparisons or other
+    years, use query_college_info instead.
+
+    Args:
+        institution: The college's name (official name or a common alias).
+        language: "en" for English or "ko" for Korean, matching the user's language.
+
+    Returns:
+        The summary card text, with its academic year and source.
+    """
+    name = find_institution(institution)
+    card = get_card(name, language) if name else None
+    if card is None:
+        return f"No summary card is available for '{institution}'. Use query_college_info instead."
+    EVENTS.inc(event="summary_card_tool")
+    return card["text"]
@@ -0,0 +1,137 @@
+"""
+Per-session Retrieval Working Set.
+
+Keeps the chunks retrieved earlier in a conversation, and the institutions
+they were about, in session state. Follow-up questions ("and what about its
+deadlines?") can then be answered straight from the working set or turned
+into a narrowly filtered search instead of a full vector search.
+"""
+
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from app.services.cds_records import known_institutions
+from app.services.entities import detect_sections, match_institutions, mentions_institution
+
+WORKING_SET_STATE_KEY = "retrieval_working_set"
+SOURCES_STATE_KEY = "retrieval_sources"
+WORKING_SET_MAX_CHUNKS = int(os.getenv("WORKING_SET_MAX_CHUNKS", "12"))
+WORKING_SET_MAX_ENTITIES = int(os.getenv("WORKING_SET_MAX_ENTITIES", "5"))
+
+
+@dataclass
+class RetrievalPlan:
+    """How a query should be served given the session's working set."""
+    institutions: List[str] = field(default_factory=list)
+    sections: List[str] = field(default_factory=list)
+    cached_chunks: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def is_cache_hit(self) -> bool:
+        return bool(self.cached_chunks)
+
+    @property
+    def metadata_filter(self) -> Optional[Dict[str, Any]]:
+        """
+        Pinecone metadata filter that narrows the search, if any.
+
+        Only institutions are filtered on; section ranking is left to the
+        vector search so a misdetected section cannot hide the right chunk.
+        """
+        if not self.institutions:
+            return None
+        return {"institution_name": {"$in": self.institutions}}
+
+
+def load_working_set(state: Any) -> Dict[str, Any]:
+    """Returns a copy of the working set stored in session state."""
+    stored = state.get(WORKING_SET_STATE_KEY) or {}
+    return {
+        "entities": list(stored.get("entities", [])),
+        "last_entities": list(stored.get("last_entities", [])),
+        "chunks": list(stored.get("chunks", [])),
+    }
+
+
+def plan_retrieval(query: str, working_set: Dict[str, Any], years: Optional[List[str]] = None) -> RetrievalPlan:
+    """
+    Decides whether a query can reuse the working set.
+
+    - Query names institutions already in the working set -> target those.
+    - Query names no institution at all -> target the previous turn's ones.
+    - Otherwise (a new institution or nothing to reuse) -> full search.
+
+    When every requested (institution, section) pair is already cached, the
+    plan carries those chunks and no remote search is needed. Questions about
+    particular academic years (years given) always search, since the working
+    set may hold other years' chunks.
+    """
+    sections = detect_sections(query)
+    targets = match_institutions(query, working_set["entities"])
+    if not targets and working_set["last_entities"] and not mentions_institution(query):
+        targets = working_set["last_entities"]
+
+    plan = RetrievalPlan(institutions=targets, sections=sections)
+    if not targets or not sections or years:
+        return plan
+
+    # Only the newest cached year of each pair stands in for a latest-year search,
+    # and only a whole section (a field-group chunk covers part of it)
+    newest: Dict[Any, Dict[str, Any]] = {}
+    for chunk in working_set["chunks"]:
+        if chunk.get("granularity", "section") != "section":
+            continue
+        if chunk["institution_name"] in targets and chunk["section"] in sections:
+            key = (chunk["institution_name"], chunk["section"])
+            if key not in newest or str(chunk.get("academic_year", "")) >= str(newest[key].get("academic_year", "")):
+                newest[key] = chunk
+    if all((name, section) in newest for name in targets for section in sections):
+        plan.cached_chunks = list(newest.values())
+    return plan
+
+
+def remember(
+    working_set: Dict[str, Any],
+    query: str,
+    plan: RetrievalPlan,
+    chunks: List[Dict[str, Any]],
+) -> Dict[str, Any]:
+    """
+    Adds retrieved chunks and resolved entities to the working set.
+
+    Chunks are kept most-recently-used last and capped at
+    WORKING_SET_MAX_CHUNKS; entities are kept most-recent first.
+    """
+    by_id = {c["id"]: c for c in working_set["chunks"]}
+    for chunk in chunks:
+        by_id.pop(chunk["id"], None)
+        by_id[chunk["id"]] = chunk
+    kept_chunks = list(by_id.values())[-WORKING_SET_MAX_CHUNKS:]
+
+    resolved = plan.institutions or match_institutions(query, known_institutions())
+    if not resolved and chunks:
+        resolved = [chunks[0]["institution_name"]]
+
+    entities = list(resolved)
+    entities += [name for name in working_set["entities"] if name not in entities]
+
+    return {
+        "entities": entities[:WORKING_SET_MAX_ENTITIES],
+        "last_entities": resolved or working_set["last_entities"],
+        "chunks": kept_chunks,
+    }
+
+
+def sources_of(chunks: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """Compact source list (institution, section and field group) for clients."""
+    return [
+        {
+            "institution": chunk["institution_name"],
+            "section": chunk["section"],
+            "field_group": chunk.get("field_group"),
+            "academic_year": chunk.get("academic_year", "N/A"),
+            "source": chunk["source_file"],
+        }
+        for chunk in chunks
+    ]
@@ -1 +1,2 @@
-from .extract_pdf_agent import create_extract_pdf_agent
\ No newline at end of file
+from .extract_pdf_agent import create_extract_pdf_agent
+from .repair_fields_agent import create_repair_fields_agent
@@ -157,4 +157,15 @@ class UniversityDataSchema(BaseModel):
     high_school_profile: HighSchoolProfile
     cost_and_financial_aid: CostAndFinancialAid
     student_life_and_faculty: StudentLifeAndFaculty
-    deadlines: Deadlines
\ No newline at end of file
+    deadlines: Deadlines
+
+# --- 4. 필드 재추출 (Field Repair) ---
+
+class FieldCorrection(BaseModel):
+    """검증에 실패한 필드 하나의 재추출 값"""
+    path: str = Field(..., description="수정할 필드의 경로 (요청에 주어진 그대로, 예: 'admissions_statistics.admitted.total')")
+    value: Optional[str] = Field(None, description="PDF에서 다시 확인한 값 (스키마 형식 그대로, 찾을 수 없으면 null)")
+
+class FieldCorrections(BaseModel):
+    """repair_fields_agent의 출력: 요청된 필드들의 수정 값"""
+    corrections: List[FieldCorrection] = Field(default_factory=list, description="요청된 필드별 수정 값")
@@ -5,6 +5,8 @@ from .cds_schema import UniversityDataSchema
 from google.adk.planners import BuiltInPlanner
 from google.genai import types
 
+from app.services.metrics import end_llm_span, start_llm_span
+
 def create_extract_pdf_agent():
     return Agent(
         name="extract_pdf_agent",
@@ -16,11 +18,11 @@ def create_extract_pdf_agent():
         """,
         tools=[read_pdf],
         output_schema=UniversityDataSchema,
+        before_model_callback=start_llm_span,
+        after_model_callback=end_llm_span,
         planner=BuiltInPlanner(
             thinking_config=types.ThinkingConfig(
                 include_thoughts=True,
                 thinking_level=types.ThinkingLevel.HIGH,)
         ),
     )
-
-extract_pdf_agent = create_extract_pdf_agent()
\ No newline at end of file
@@ -0,0 +1,27 @@
+
+from google.adk.agents import Agent
+from .tools.read_pdf import read_pdf
+from .cds_schema import FieldCorrections
+
+from app.services.metrics import end_llm_span, start_llm_span
+from app.services.record_repair import REPAIR_AUTHOR
+
+def create_repair_fields_agent():
+    """Re-extracts only the fields of a record that failed local validation (app/services/record_repair.py)."""
+    return Agent(
+        name=REPAIR_AUTHOR,
+        model="gemini-3-flash-preview",
+        instruction="""
+        당신은 대학 입시 데이터 전문가입니다.
+        이미 추출된 CDS 데이터 중 검증에 실패한 필드 목록이 주어집니다.
+        주어진 PDF 파일명을 도구(read_pdf)에 전달하여 내용을 읽고,
+        목록에 있는 필드만 PDF에서 다시 확인하여 올바른 값을 반환하세요.
+        - path는 요청에 주어진 그대로 사용하세요.
+        - 비율은 백분율(예: 7.3%는 7.3), 금액은 숫자만, 마감일은 MM-DD 형식으로 적으세요.
+        - PDF에서 값을 찾을 수 없으면 value를 null로 두세요.
+        """,
+        tools=[read_pdf],
+        output_schema=FieldCorrections,
+        before_model_callback=start_llm_span,
+        after_model_callback=end_llm_span,
+    )
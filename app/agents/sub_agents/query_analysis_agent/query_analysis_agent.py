@@ -9,6 +9,8 @@ from google.adk.agents import Agent
 from google.adk.planners import BuiltInPlanner
 from google.genai import types
 
+from app.services.metrics import end_llm_span, start_llm_span
+
 
 def create_query_analysis_agent() -> Agent:
     """
@@ -40,6 +42,11 @@ Analyze the user's query about US colleges and universities, then produce an opt
    - Remove unnecessary filler words
    - Structure for maximum retrieval accuracy
 
+## Earlier Conversation (summary, may be empty)
+{conversation_summary?}
+
+Use it to resolve follow-up references such as "it" or "that school" to the institution discussed earlier.
+
 ## Output Format
 Return ONLY the optimized English search query. Do not include explanations or additional text.
 
@@ -58,6 +65,8 @@ Input: "윌리엄스 칼리지 입학 마감일"
 Output: "Williams College application deadline admission dates early decision regular decision"
 """,
         output_key="query_analysis_result",
+        before_model_callback=start_llm_span,
+        after_model_callback=end_llm_span,
         planner=BuiltInPlanner(
             thinking_config=types.ThinkingConfig(
                 include_thoughts=True,
@@ -65,7 +74,3 @@ Output: "Williams College application deadline admission dates early decision re
             )
         ),
     )
-
-
-# Create a singleton instance for import
-query_analysis_agent = create_query_analysis_agent()
@@ -1,32 +1,179 @@
 
+import time
+
+# Taken before the heavy imports below so the startup budget covers them
+_IMPORT_STARTED = time.perf_counter()
+
+import asyncio
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
 from google.adk.cli.fast_api import get_fast_api_app
 
+from .services.env import load_env
+
+# Modules below read their settings (CACHE_BACKEND, LOCAL_VECTOR_INDEX_PATH, ...)
+# into constants at import time, so app/.env has to be loaded first
+load_env()
+
 from .upload_api import router as upload_router
 from .routers.chat_router import router as chat_router
+from .routers.cards_router import router as cards_router
+from .services.degraded import get_breaker
+from .services.governor import AdmissionMiddleware, AdmissionRejected, get_governor
+from .services.metrics import observe_stage, register_collector, render_prometheus
+from .services.profiling import ProfilingMiddleware
+from .services.session_pool import get_session_pool
+from .services.sessions import (
+    SESSION_SWEEP_INTERVAL_SECONDS,
+    get_session_service,
+    register_session_service,
+)
+from .services.uploads import UploadSizeLimitMiddleware
+from .services.warmup import get_warmup_state, run_warmup
 
 # Initialize ADK-based FastAPI app
 # Pointing to the directory containing agent folders (app/agents)
 # ADK will scan this directory for folders (e.g., 'root_agent') containing 'agent.py'
 AGENTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "agents")
 
+# Warn when importing and wiring the app takes longer than this (see script/import_report.py)
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", "5"))
+
+# Sessions live in one SQLite database shared by all workers, with bounded history
+SESSION_SERVICE_URI = register_session_service()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # ADK's app always has its own lifespan, so @app.on_event handlers would never run
+    print("Registered Routes (Startup):")
+    for route in app.routes:
+        print(f"Path: {route.path} Name: {route.name}")
+    background = [
+        asyncio.create_task(_expire_idle_sessions_periodically()),
+        asyncio.create_task(run_warmup()),
+        asyncio.create_task(get_session_pool().run()),
+    ]
+    _check_startup_budget()
+    try:
+        yield
+    finally:
+        for task in background:
+            task.cancel()
+        try:
+            drained = await get_session_pool().drain()
+            if drained:
+                print(f"🧹 Deleted {drained} unused pooled sessions")
+        except Exception as e:
+            print(f"❌ Failed to drain the session pool: {e}")
+
+
 # web=True to serve the ADK debug web interface and allow default handlers
-app = get_fast_api_app(agents_dir=AGENTS_DIR, web=True, allow_origins=["*"])
+app = get_fast_api_app(
+    agents_dir=AGENTS_DIR,
+    session_service_uri=SESSION_SERVICE_URI,
+    web=True,
+    allow_origins=["*"],
+    lifespan=lifespan,
+)
 
 # Include custom routers
 app.include_router(upload_router)
 app.include_router(chat_router)
+app.include_router(cards_router)
+
+# Admission control: cap concurrent ADK pipeline runs and shed load with 429/503
+app.add_middleware(AdmissionMiddleware)
+
+# Reject oversized PDF uploads (UPLOAD_MAX_BYTES) before their body is read
+app.add_middleware(UploadSizeLimitMiddleware)
+
+# Opt-in per-request profiling (X-Profile: <PROFILING_ADMIN_TOKEN>); outermost so it covers admission too
+app.add_middleware(ProfilingMiddleware)
+
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request, exc: AdmissionRejected):
+    return exc.to_response()
 
 @app.get("/")
 async def root():
     return {"message": "College Consultant API is running"}
 
-@app.on_event("startup")
-async def startup_event():
-    print("Registered Routes (Startup):")
-    for route in app.routes:
-        print(f"Path: {route.path} Name: {route.name}")
+@app.get("/ready")
+async def ready():
+    """Readiness for load balancers: 503 until the startup warm-up has finished."""
+    snapshot = get_warmup_state().snapshot()
+    return JSONResponse(snapshot, status_code=200 if snapshot["ready"] else 503)
+
+
+def _check_startup_budget():
+    """Reports how long app import and setup took against STARTUP_BUDGET_SECONDS."""
+    elapsed = time.perf_counter() - _IMPORT_STARTED
+    observe_stage("startup", elapsed, ok=elapsed <= STARTUP_BUDGET_SECONDS)
+    if elapsed > STARTUP_BUDGET_SECONDS:
+        print(
+            f"⚠️ Startup took {elapsed:.2f}s, over the {STARTUP_BUDGET_SECONDS:.2f}s budget. "
+            "Run script/import_report.py to see which imports are slow"
+        )
+    else:
+        print(f"🚀 Startup took {elapsed:.2f}s (budget {STARTUP_BUDGET_SECONDS:.2f}s)")
+
+
+async def _expire_idle_sessions_periodically():
+    """Background loop that deletes idle chat sessions."""
+    while True:
+        try:
+            deleted = await get_session_service().expire_idle_sessions()
+            if deleted:
+                print(f"🧹 Expired {deleted} idle sessions")
+        except Exception as e:
+            print(f"❌ Failed to expire idle sessions: {e}")
+        await asyncio.sleep(SESSION_SWEEP_INTERVAL_SECONDS)
+
+@app.get("/debug/governor")
+async def debug_governor():
+    """In-flight counts, queue depth and rejection counters per lane."""
+    return {
+        **get_governor().snapshot(),
+        "degraded_mode": get_breaker().snapshot(),
+        "session_pool": get_session_pool().snapshot(),
+    }
+
+def _governor_gauges():
+    """Lane occupancy, rejections and breaker state as Prometheus gauges."""
+    snapshot = get_governor().snapshot()
+    gauges = []
+    for field, help_text in (
+        ("in_flight", "Admitted work currently running per lane."),
+        ("queue_depth", "Work waiting for a slot per lane."),
+        ("rejected_queue_full", "Requests shed because the lane queue was full."),
+        ("rejected_timeout", "Requests shed after waiting too long in the lane queue."),
+    ):
+        samples = [({"lane": name}, lane[field]) for name, lane in snapshot["lanes"].items()]
+        gauges.append((f"college_governor_{field}", help_text, samples))
+    gauges.append((
+        "college_rate_limited",
+        "Requests rejected by the per-user or per-session rate limit.",
+        [({"scope": scope}, count) for scope, count in snapshot["rate_limited"].items()],
+    ))
+    state = get_breaker().snapshot()["state"]
+    gauges.append((
+        "college_degraded_mode",
+        "1 for the current latency breaker state.",
+        [({"state": name}, int(name == state)) for name in ("closed", "open", "half-open")],
+    ))
+    return gauges
+
+
+register_collector(_governor_gauges)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Per-stage latency histograms, token counters and governor gauges (Prometheus format)."""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
 
 @app.get("/debug/routes")
 async def debug_routes():
@@ -0,0 +1,46 @@
+"""
+Summary Card Router.
+
+Serves the precomputed per-institution summary cards (see
+app/services/summary_cards.py) without touching the LLM, the embedding API or
+the vector index.
+"""
+
+import asyncio
+from typing import Literal
+
+from fastapi import APIRouter, HTTPException
+
+from app.services.summary_cards import find_institution, get_card, get_card_store
+
+router = APIRouter(prefix="/cards", tags=["cards"])
+
+
+@router.get("")
+async def list_cards():
+    """
+    List the institutions that have a summary card.
+
+    Returns:
+        dict: Institution names, sorted.
+    """
+    return {"institutions": await asyncio.to_thread(get_card_store().institutions)}
+
+
+@router.get("/{institution}")
+async def get_summary_card(institution: str, lang: Literal["en", "ko"] = "en"):
+    """
+    Get the summary card of one institution.
+
+    Args:
+        institution: Official name or a known alias ("Georgia Tech", "하버드").
+        lang: Card language.
+
+    Returns:
+        dict: institution, academic_year, source, generated_at, lang and text.
+    """
+    name = await asyncio.to_thread(find_institution, institution)
+    card = await asyncio.to_thread(get_card, name, lang) if name else None
+    if card is None:
+        raise HTTPException(status_code=404, detail=f"No summary card for '{institution}'")
+    return card
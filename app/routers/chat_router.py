@@ -1,17 +1,49 @@
 """
 Chat Router for College Consulting Service.
 
-This router handles chat session management for the college agent.
+This router handles chat session management for the college agent and a slim
+streaming endpoint that runs the pipeline in-process.
 """
 
+import asyncio
+import json
+import os
+import re
+import time
 import uuid
+import zlib
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional, Tuple
+
 import httpx
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from google.adk.agents.run_config import RunConfig, StreamingMode
+from google.adk.events import Event
+from google.adk.sessions import Session
+from google.genai import types
+from pydantic import BaseModel
+
+from app.agents.sub_agents.college_agent.tools.query_pinecone import data_version
+from app.agents.sub_agents.college_agent.tools.working_set import SOURCES_STATE_KEY
+from app.services.cache import get_shared_cache
+from app.services.degraded import answer_degraded, get_breaker
+from app.services.entities import is_korean
+from app.services.governor import AdmissionRejected, get_governor
+from app.services.metrics import EVENTS, observe_stage
+from app.services.pipeline import get_runner
+from app.services.session_pool import USER_ID, get_session_pool
+from app.services.sessions import get_session_service
+from app.services.summary_cards import SUMMARY_CARDS_ENABLED, get_card, is_overview_question
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
-ADK_SERVER_URL = "http://localhost:8000"
+ADK_SERVER_URL = os.getenv("ADK_SERVER_URL", "http://localhost:8000")
 APP_NAME = "college_agent"
+ANSWER_AUTHOR = "college_agent"  # Sub-agent whose text is shown to the user
+# Create unknown sessions on their first message instead of answering 404 (see stream_chat)
+CHAT_LAZY_SESSIONS = os.getenv("CHAT_LAZY_SESSIONS", "false").lower() in ("1", "true", "yes")
+# Client-generated session ids accepted for lazy creation (UUIDs and the like)
+SESSION_ID_RE = re.compile(r"[A-Za-z0-9_-]{8,64}")
 
 
 @router.post("/session")
@@ -20,30 +52,18 @@ async def create_chat_session():
     Create a new chat session for college consulting.
     
     This endpoint should be called when a user first enters the chat interface.
-    It creates a new ADK session and returns the session_id for subsequent messages.
+    The session comes from the worker's pool of pre-created sessions (see
+    app/services/session_pool.py), so it is usually returned without any
+    database or HTTP round-trip.
     
     Returns:
         dict: Contains session_id, user_id, and app_name for the new session.
     """
-    session_id = str(uuid.uuid4())
-    user_id = "user"  # Future: integrate with authentication
+    user_id = USER_ID
     
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            # Create session via ADK API
-            session_url = f"{ADK_SERVER_URL}/apps/{APP_NAME}/users/{user_id}/sessions/{session_id}"
-            
-            response = await client.post(session_url, json={})
-            response.raise_for_status()
-            
-            print(f"✅ Created new chat session: {session_id}")
-            
-    except httpx.HTTPStatusError as e:
-        print(f"❌ Failed to create session: {e}")
-        raise HTTPException(
-            status_code=500,
-            detail=f"Failed to create chat session: {e.response.text}"
-        )
+        session_id = await get_session_pool().acquire()
+        print(f"✅ Created new chat session: {session_id}")
     except Exception as e:
         print(f"❌ Error creating session: {e}")
         raise HTTPException(
@@ -69,7 +89,7 @@ async def get_session_info(session_id: str):
     Returns:
         dict: Session information from ADK.
     """
-    user_id = "user"
+    user_id = USER_ID
     
     try:
         async with httpx.AsyncClient(timeout=30.0) as client:
@@ -92,3 +112,282 @@ async def get_session_info(session_id: str):
             status_code=500,
             detail=f"Error getting session: {str(e)}"
         )
+
+
+class ChatMessage(BaseModel):
+    """A user message sent to the streaming chat endpoint."""
+    message: str
+
+
+def _sse(payload: Dict[str, Any]) -> bytes:
+    """Encodes one compact event in Server-Sent Events framing."""
+    return f"data: {json.dumps(payload, ensure_ascii=False, separators=(',', ':'))}\n\n".encode("utf-8")
+
+
+def _add_usage(totals: Dict[str, int], usage: Any) -> None:
+    """Accumulates Gemini usage metadata into prompt/candidates/thoughts totals."""
+    totals["prompt"] += usage.prompt_token_count or 0
+    totals["candidates"] += usage.candidates_token_count or 0
+    totals["thoughts"] += usage.thoughts_token_count or 0
+    totals["total"] += usage.total_token_count or 0
+
+
+async def _stream_turn(user_id: str, session_id: str, message: str) -> AsyncIterator[bytes]:
+    """
+    Runs one pipeline turn and yields the compact event protocol:
+
+    - {"type": "sources", "sources": [...]}   once, as soon as retrieval is done
+    - {"type": "delta", "text": "..."}        answer text only (no thoughts)
+    - {"type": "usage", ...}                  token totals for the turn
+    - {"type": "error", "message": "..."}     if the pipeline fails
+    - {"type": "done"}                        always last
+    """
+    usage = {"prompt": 0, "candidates": 0, "thoughts": 0, "total": 0}
+    sent_sources = False
+    streamed_partial = False
+    started = time.monotonic()
+    first_token_at = None
+    outcome = None  # Set once the turn finished, successfully or not
+
+    try:
+        async for event in get_runner().run_async(
+            user_id=user_id,
+            session_id=session_id,
+            new_message=types.Content(role="user", parts=[types.Part(text=message)]),
+            run_config=RunConfig(streaming_mode=StreamingMode.SSE),
+        ):
+            if not sent_sources and event.actions and SOURCES_STATE_KEY in event.actions.state_delta:
+                sent_sources = True
+                yield _sse({"type": "sources", "sources": event.actions.state_delta[SOURCES_STATE_KEY]})
+
+            if not event.partial and event.usage_metadata:
+                _add_usage(usage, event.usage_metadata)
+
+            # Only the college_agent's answer is user-facing
+            if event.author != ANSWER_AUTHOR or not event.content or not event.content.parts:
+                continue
+            text = "".join(p.text for p in event.content.parts if p.text and not p.thought)
+            if event.partial:
+                streamed_partial = streamed_partial or bool(text)
+                if text:
+                    if first_token_at is None:
+                        first_token_at = time.monotonic()
+                        observe_stage("chat.first_token", first_token_at - started, session_id=session_id)
+                    yield _sse({"type": "delta", "text": text})
+            else:
+                # The final aggregated event repeats the streamed text
+                if text and not streamed_partial:
+                    yield _sse({"type": "delta", "text": text})
+                streamed_partial = False
+        outcome = True
+    except Exception as e:
+        outcome = False
+        print(f"❌ Error streaming chat turn: {e}")
+        yield _sse({"type": "error", "message": str(e)})
+    finally:
+        # Feed the degraded-mode breaker; a client disconnect is not an upstream signal
+        if outcome is None:
+            get_breaker().cancel_probe()
+        else:
+            elapsed = time.monotonic() - started
+            get_breaker().record(elapsed, ok=outcome)
+            observe_stage("chat.turn", elapsed, ok=outcome, session_id=session_id)
+
+    yield _sse({"type": "usage", **usage})
+    yield _sse({"type": "done"})
+
+
+def _answer_degraded_cached(message: str) -> Tuple[str, List[Dict[str, Any]]]:
+    """answer_degraded() through the shared cache, so a repeated question is answered by any worker without a search."""
+    cache = get_shared_cache()
+    cache.register_version("answer", data_version)
+    cached = cache.get_json("answer", message.strip())
+    if cached is not None:
+        EVENTS.inc(event="answer_cache_hit")
+        return cached["answer"], cached["sources"]
+    answer, sources = answer_degraded(message)
+    # Nothing found may only mean the search failed just now, so only real answers are kept
+    if sources:
+        cache.set_json("answer", message.strip(), {"answer": answer, "sources": sources})
+    return answer, sources
+
+
+async def _stream_degraded(message: str) -> AsyncIterator[bytes]:
+    """
+    Answers without any LLM call, using the same event protocol plus a
+    {"type": "mode", "mode": "degraded"} event so clients can label it.
+    """
+    EVENTS.inc(event="degraded_answer")
+    yield _sse({"type": "mode", "mode": "degraded"})
+    answer, sources = await asyncio.to_thread(_answer_degraded_cached, message)
+    if sources:
+        yield _sse({"type": "sources", "sources": sources})
+    yield _sse({"type": "delta", "text": answer})
+    yield _sse({"type": "usage", "prompt": 0, "candidates": 0, "thoughts": 0, "total": 0})
+    yield _sse({"type": "done"})
+
+
+async def _create_session_lazily(user_id: str, session_id: str) -> Session:
+    """Creates the session a first message was sent to; a concurrent first message may have just done so."""
+    service = get_session_service()
+    try:
+        session = await service.create_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
+        EVENTS.inc(event="session_created_lazily")
+        print(f"✅ Created chat session on first message: {session_id}")
+        return session
+    except Exception as e:
+        session = await service.get_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
+        if session is None:
+            print(f"❌ Error creating session {session_id}: {e}")
+            raise HTTPException(status_code=500, detail=f"Error creating chat session: {str(e)}")
+        return session
+
+
+def _overview_card(message: str) -> Optional[Dict[str, Any]]:
+    """The summary card answering message, when it asks for an overview of one institution."""
+    institution = is_overview_question(message)
+    if institution is None:
+        return None
+    return get_card(institution, "ko" if is_korean(message) else "en")
+
+
+async def _stream_card(session: Session, message: str, card: Dict[str, Any]) -> AsyncIterator[bytes]:
+    """
+    Answers an overview question with the institution's summary card, without
+    any LLM call, plus a {"type": "mode", "mode": "card"} event. The turn is
+    still recorded in the session, so follow-up questions have its context.
+    """
+    EVENTS.inc(event="summary_card_answer")
+    yield _sse({"type": "mode", "mode": "card"})
+    yield _sse({"type": "sources", "sources": [{
+        "institution": card["institution"],
+        "section": "summary_card",
+        "academic_year": card["academic_year"] or "N/A",
+        "source": card["source"] or "N/A",
+    }]})
+    yield _sse({"type": "delta", "text": card["text"]})
+
+    invocation_id = f"e-{uuid.uuid4()}"
+    service = get_session_service()
+    try:
+        for role, author, text in (("user", "user", message), ("model", ANSWER_AUTHOR, card["text"])):
+            await service.append_event(session, Event(
+                invocation_id=invocation_id,
+                author=author,
+                content=types.Content(role=role, parts=[types.Part(text=text)]),
+            ))
+    except Exception as e:
+        print(f"❌ Failed to record the summary card turn: {e}")
+    yield _sse({"type": "usage", "prompt": 0, "candidates": 0, "thoughts": 0, "total": 0})
+    yield _sse({"type": "done"})
+
+
+async def _release_when_done(chunks: AsyncIterator[bytes], lane: str, started_at: float) -> AsyncIterator[bytes]:
+    """Holds the governor slot until the stream has been fully sent."""
+    try:
+        async for chunk in chunks:
+            yield chunk
+    finally:
+        get_governor().release(lane, started_at)
+
+
+async def _stream_full_or_degraded(user_id: str, session_id: str, message: str, started_at: float) -> AsyncIterator[bytes]:
+    """
+    Asks the latency breaker only once the response body is being sent.
+
+    should_degrade() may claim the half-open probe, which only the full turn
+    releases; deciding here rather than in the endpoint means a client that
+    disconnects before the stream starts never leaves a claimed probe behind.
+    """
+    if get_breaker().should_degrade():
+        get_governor().release("chat", started_at)
+        chunks = _stream_degraded(message)
+    else:
+        chunks = _release_when_done(_stream_turn(user_id, session_id, message), "chat", started_at)
+    async for chunk in chunks:
+        yield chunk
+
+
+async def _gzip_stream(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Gzip-compresses a stream, flushing after each event so it is not delayed."""
+    compressor = zlib.compressobj(wbits=31)
+    async for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+@router.post("/{session_id}/stream")
+async def stream_chat(
+    session_id: str,
+    body: ChatMessage,
+    request: Request,
+    compress: bool = False,
+    mode: Literal["auto", "full", "degraded"] = "auto",
+    create: bool = False,
+):
+    """
+    Run the college consulting pipeline and stream a compact event protocol.
+    
+    Unlike ADK's /run_sse, this endpoint never sends thoughts, thought signatures,
+    usage metadata per event or state deltas; clients receive only answer text
+    deltas, one early "sources" event and a final usage summary.
+    
+    Args:
+        session_id: The session created via POST /chat/session.
+        body: The user's message.
+        compress: Gzip the stream when the client accepts it.
+        mode: "auto" answers overview questions from the institution's summary card
+              and uses the full pipeline otherwise, unless the latency breaker is open or
+              the chat lane is saturated, "degraded" always answers retrieval-only,
+              "full" never degrades.
+        create: Create the session if it does not exist yet (also on for every
+              request with CHAT_LAZY_SESSIONS), so a new visitor's first message
+              can go out with a client-generated session id and no POST /chat/session.
+        
+    Returns:
+        StreamingResponse: text/event-stream of compact JSON events.
+    """
+    user_id = USER_ID
+    session = await get_session_service().get_session(
+        app_name=APP_NAME, user_id=user_id, session_id=session_id
+    )
+    if session is None:
+        if not (create or CHAT_LAZY_SESSIONS) or not SESSION_ID_RE.fullmatch(session_id):
+            raise HTTPException(status_code=404, detail="Session not found")
+        session = await _create_session_lazily(user_id, session_id)
+
+    # Rate-limited turns fail fast with 429 + Retry-After before streaming starts
+    governor = get_governor()
+    governor.check_rate(user_id, session_id, request.client.host if request.client else None)
+
+    # Overview questions answered by a summary card need no chat lane at all
+    card = None
+    if mode == "auto" and SUMMARY_CARDS_ENABLED:
+        card = await asyncio.to_thread(_overview_card, body.message)
+
+    started_at = None
+    degrade = mode == "degraded"
+    if card is None and not degrade:
+        try:
+            started_at = await governor.acquire("chat")
+        except AdmissionRejected:
+            # Overloaded: serve a quick answer in auto mode, otherwise 503
+            if mode != "auto":
+                raise
+            degrade = True
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    if card is not None:
+        stream = _stream_card(session, body.message, card)
+    elif degrade:
+        stream = _stream_degraded(body.message)
+    elif mode == "auto":
+        stream = _stream_full_or_degraded(user_id, session_id, body.message, started_at)
+    else:
+        stream = _release_when_done(_stream_turn(user_id, session_id, body.message), "chat", started_at)
+    if compress and "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
+        stream = _gzip_stream(stream)
+
+    return StreamingResponse(stream, media_type="text/event-stream", headers=headers)
@@ -1,12 +1,17 @@
 
-import shutil
+import asyncio
 import os
 import uuid
 import httpx
 from pathlib import Path
 from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi.responses import JSONResponse
 import json
 
+from app.services.metrics import span
+from app.services.summary_cards import refresh_cards
+from app.services.uploads import UploadRejected, store_upload
+
 router = APIRouter(
     prefix="/upload",
     tags=["upload"],
@@ -25,21 +30,23 @@ JSON_DIR = DATA_DIR / "json"
 PDF_DIR.mkdir(parents=True, exist_ok=True)
 JSON_DIR.mkdir(parents=True, exist_ok=True)
 
-ADK_SERVER_URL = "http://localhost:8000"
+ADK_SERVER_URL = os.getenv("ADK_SERVER_URL", "http://localhost:8000")
 
 @router.post("/")
 async def upload_pdf(file: UploadFile = File(...)):
+    # The extraction run is admitted to the "extraction" lane by AdmissionMiddleware
+    with span("pdf_extraction", filename=file.filename):
+        return await _upload_and_extract(file)
+
+
+async def _upload_and_extract(file: UploadFile):
     try:
-        if not file.filename:
-            return {"error": "No filename provided"}
-            
-        file_path = PDF_DIR / file.filename
-        
-        # Save file
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-            
-        print(f"File saved to {file_path}")
+        # Streamed to a temp file off the event loop, then renamed into PDF_DIR
+        stored = await store_upload(file, str(PDF_DIR))
+        filename = stored["filename"]
+        file_path = PDF_DIR / filename
+
+        print(f"File saved to {file_path} ({stored['size_bytes']} bytes, {stored['pages']} pages)")
         
         # Generate a session ID (or use a fixed one for MVP testing if preferred, but UUID is better)
         session_id = str(uuid.uuid4())
@@ -47,7 +54,7 @@ async def upload_pdf(file: UploadFile = File(...)):
         app_name = "root_agent" # According to agent.py
         
         # Invoke Agent via ADK API
-        print(f"Invoking agent for {file.filename}...")
+        print(f"Invoking agent for {filename}...")
         
         async with httpx.AsyncClient(timeout=120.0) as client:
             # Debug: Check available apps
@@ -63,7 +70,7 @@ async def upload_pdf(file: UploadFile = File(...)):
                 "sessionId": session_id,
                 "newMessage": {
                     "role": "user",
-                    "parts": [{"text": f"Extract data from PDF: {file.filename}"}]
+                    "parts": [{"text": f"Extract data from PDF: {filename}"}]
                 }
             }
         
@@ -90,24 +97,48 @@ async def upload_pdf(file: UploadFile = File(...)):
         # Or better, if the agent successfully used the schema, the last message part text should be the JSON.
         
         # Simplest approach: Save the whole result for debugging, and if we can parse the JSON, save that too.
-        json_output_path = JSON_DIR / f"{file.filename}.json"
+        json_output_path = JSON_DIR / f"{filename}.json"
         
         # Try to extract the structured data from the response events
         # This part depends heavily on ADK's response structure for structured output.
         # We'll save the raw API response first.
         
-        full_response_path = JSON_DIR / f"{file.filename}_full_response.json"
-        with open(full_response_path, "w", encoding="utf-8") as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
+        full_response_path = JSON_DIR / f"{filename}_full_response.json"
+        await asyncio.to_thread(_write_json, full_response_path, result)
+        # The school's summary card follows its new record right away
+        await asyncio.to_thread(refresh_cards, str(JSON_DIR))
 
         return {
-            "filename": file.filename,
+            "filename": filename,
             "message": "File uploaded and processed.",
             "saved_path": str(file_path),
+            "size_bytes": stored["size_bytes"],
+            "sha256": stored["sha256"],
+            "pages": stored["pages"],
             "agent_response_saved": str(full_response_path),
             "session_id": session_id
         }
             
+    except UploadRejected as e:
+        print(f"Upload rejected: {e.reason}")
+        return e.to_response()
+    except httpx.HTTPStatusError as e:
+        status = e.response.status_code
+        if status not in (429, 503):
+            print(f"Error processing upload: {e}")
+            return {"error": str(e)}
+        # The extraction lane shed the run; pass the status and Retry-After on
+        print(f"Extraction not admitted ({status})")
+        return JSONResponse(
+            status_code=status,
+            content={"detail": "Extraction is busy, please try again later"},
+            headers={"Retry-After": e.response.headers.get("Retry-After", "1")},
+        )
     except Exception as e:
         print(f"Error processing upload: {e}")
         return {"error": str(e)}
+
+
+def _write_json(path: Path, data) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
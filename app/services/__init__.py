@@ -0,0 +1 @@
+# Shared backend services (sessions, retrieval, caching, instrumentation)
@@ -0,0 +1,371 @@
+"""
+Shared Cache Tier.
+
+In-process caches are duplicated, and cold, in every uvicorn worker and
+script. This tier sits behind them so a result computed by one process is
+reused by all of them. CACHE_BACKEND selects where entries live:
+
+- sqlite: one SQLite database on local disk (CACHE_SQLITE_PATH), shared by
+          every process on the host through WAL (the default)
+- redis:  a Redis-compatible server at CACHE_REDIS_URL, shared across hosts
+          (optional dependency: pip install redis; script/stand_ins.py runs a
+          small stand-in for tests)
+- none:   no shared cache
+
+Entries are grouped in namespaces, each with its own eviction policy
+(CACHE_<NAMESPACE>_TTL_SECONDS and CACHE_<NAMESPACE>_MAX_ENTRIES): expired
+entries are never served, and the least recently used ones beyond
+max_entries are evicted, so a burst in one namespace cannot push another's
+entries out.
+
+- embedding: query text -> vector, versioned by the embedding model
+- retrieval: vector search results, versioned by the index build
+- answer:    degraded-mode answers, versioned by the index build and the fact store
+
+Every key embeds the version registered for its namespace, so after a
+re-index the old entries are simply never read again and age out. A failing
+backend never fails a request: the lookup counts as an error and a miss.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from array import array
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from .metrics import CACHE_REQUESTS, register_collector
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "sqlite").lower()
+CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH", os.path.join(BASE_DIR, "data", "cache", "shared_cache.db"))
+CACHE_SQLITE_BUSY_TIMEOUT_SECONDS = float(os.getenv("CACHE_SQLITE_BUSY_TIMEOUT_SECONDS", "1"))
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://127.0.0.1:6379/0")
+CACHE_REDIS_TIMEOUT_SECONDS = float(os.getenv("CACHE_REDIS_TIMEOUT_SECONDS", "0.25"))
+# Prefix of every Redis key, so several deployments can share one server
+CACHE_KEY_PREFIX = os.getenv("CACHE_KEY_PREFIX", "college")
+# Expired and over-limit entries of a namespace are evicted every this many writes to it
+CACHE_EVICT_EVERY = int(os.getenv("CACHE_EVICT_EVERY", "50"))
+# Reads refresh an entry's recency at most this often, so hot keys do not turn every read into a write
+CACHE_TOUCH_INTERVAL_SECONDS = 60.0
+# A failing backend is reported at most this often
+ERROR_REPORT_INTERVAL_SECONDS = 60.0
+
+
+@dataclass(frozen=True)
+class NamespacePolicy:
+    """How long entries of a namespace live and how many of them are kept."""
+    ttl_seconds: float
+    max_entries: int
+
+
+def _policy(namespace: str, ttl_seconds: float, max_entries: int) -> NamespacePolicy:
+    prefix = f"CACHE_{namespace.upper()}"
+    return NamespacePolicy(
+        ttl_seconds=float(os.getenv(f"{prefix}_TTL_SECONDS", str(ttl_seconds))),
+        max_entries=int(os.getenv(f"{prefix}_MAX_ENTRIES", str(max_entries))),
+    )
+
+
+POLICIES: Dict[str, NamespacePolicy] = {
+    "embedding": _policy("embedding", 7 * 24 * 3600, 50000),
+    "retrieval": _policy("retrieval", 3600, 10000),
+    "answer": _policy("answer", 3600, 2000),
+}
+
+
+class CacheBackend(ABC):
+    """Byte values under (namespace, key), with the namespace's policy applied on write."""
+
+    name = ""
+
+    def __init__(self):
+        self._writes: Dict[str, int] = {}
+        self._writes_lock = threading.Lock()
+
+    def _due_for_eviction(self, namespace: str) -> bool:
+        """True on every CACHE_EVICT_EVERY-th write to namespace."""
+        with self._writes_lock:
+            self._writes[namespace] = self._writes.get(namespace, 0) + 1
+            return self._writes[namespace] % max(1, CACHE_EVICT_EVERY) == 0
+
+    @abstractmethod
+    def get(self, namespace: str, key: str) -> Optional[bytes]:
+        """The value stored under (namespace, key), or None."""
+
+    @abstractmethod
+    def set(self, namespace: str, key: str, value: bytes, policy: NamespacePolicy) -> None:
+        """Stores a value, applying the namespace's TTL and size bound."""
+
+    @abstractmethod
+    def clear(self, namespace: str) -> None:
+        """Drops every entry of namespace."""
+
+    @abstractmethod
+    def entries(self, namespace: str) -> int:
+        """Number of entries currently stored in namespace."""
+
+
+class SQLiteCache(CacheBackend):
+    """
+    Cache in a local SQLite database, shared by every process on the host.
+
+    Each thread keeps its own connection. Recency is tracked per entry, and
+    eviction runs on the write path every CACHE_EVICT_EVERY writes.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str = CACHE_SQLITE_PATH):
+        super().__init__()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        # WAL lets several worker processes read while one of them writes.
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " namespace TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL,"
+            " expires_at REAL NOT NULL, accessed_at REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key)) WITHOUT ROWID"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_recency ON entries (namespace, accessed_at)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit: every statement is its own short transaction
+            conn = sqlite3.connect(self.path, timeout=CACHE_SQLITE_BUSY_TIMEOUT_SECONDS, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace: str, key: str) -> Optional[bytes]:
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT value, expires_at, accessed_at FROM entries WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchone()
+        now = time.time()
+        if row is None or row[1] <= now:
+            return None
+        if now - row[2] >= CACHE_TOUCH_INTERVAL_SECONDS:
+            conn.execute("UPDATE entries SET accessed_at = ? WHERE namespace = ? AND key = ?", (now, namespace, key))
+        return row[0]
+
+    def set(self, namespace: str, key: str, value: bytes, policy: NamespacePolicy) -> None:
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (namespace, key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+            (namespace, key, sqlite3.Binary(value), now + policy.ttl_seconds, now),
+        )
+        if self._due_for_eviction(namespace):
+            self.evict(namespace, policy)
+
+    def evict(self, namespace: str, policy: NamespacePolicy) -> None:
+        """Drops the namespace's expired entries, then its least recently used ones beyond max_entries."""
+        conn = self._conn()
+        conn.execute("DELETE FROM entries WHERE namespace = ? AND expires_at <= ?", (namespace, time.time()))
+        overflow = self.entries(namespace) - policy.max_entries
+        if overflow > 0:
+            conn.execute(
+                "DELETE FROM entries WHERE namespace = ? AND key IN "
+                "(SELECT key FROM entries WHERE namespace = ? ORDER BY accessed_at LIMIT ?)",
+                (namespace, namespace, overflow),
+            )
+
+    def clear(self, namespace: str) -> None:
+        self._conn().execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
+
+    def entries(self, namespace: str) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM entries WHERE namespace = ?", (namespace,)).fetchone()[0]
+
+
+class RedisCache(CacheBackend):
+    """
+    Cache on a Redis-compatible server.
+
+    Entries expire through SET ... PX; recency is kept in one sorted set per
+    namespace, and eviction pops its oldest members every CACHE_EVICT_EVERY
+    writes.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str = CACHE_REDIS_URL):
+        super().__init__()
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("CACHE_BACKEND=redis needs the redis package (pip install redis)") from e
+        # RESP2: understood by every Redis-compatible server, not only Redis 6+
+        self._client = redis.Redis.from_url(
+            url,
+            protocol=2,
+            socket_timeout=CACHE_REDIS_TIMEOUT_SECONDS,
+            socket_connect_timeout=CACHE_REDIS_TIMEOUT_SECONDS,
+        )
+
+    def _key(self, namespace: str, key: str) -> str:
+        return f"{CACHE_KEY_PREFIX}:{namespace}:{key}"
+
+    def _recency(self, namespace: str) -> str:
+        return f"{CACHE_KEY_PREFIX}:{namespace}:_recency"
+
+    def get(self, namespace: str, key: str) -> Optional[bytes]:
+        pipe = self._client.pipeline(transaction=False)
+        pipe.get(self._key(namespace, key))
+        # XX: only refreshes keys that are already tracked, a miss adds nothing
+        pipe.zadd(self._recency(namespace), {key: time.time()}, xx=True)
+        value, _ = pipe.execute()
+        if value is None:
+            # Expired on the server: stop tracking it, so it does not count towards max_entries
+            self._client.zrem(self._recency(namespace), key)
+        return value
+
+    def set(self, namespace: str, key: str, value: bytes, policy: NamespacePolicy) -> None:
+        pipe = self._client.pipeline(transaction=False)
+        pipe.set(self._key(namespace, key), value, px=int(policy.ttl_seconds * 1000))
+        pipe.zadd(self._recency(namespace), {key: time.time()})
+        pipe.execute()
+        if self._due_for_eviction(namespace):
+            self.evict(namespace, policy)
+
+    def evict(self, namespace: str, policy: NamespacePolicy) -> None:
+        """Forgets keys that expired on the server, then deletes the least recently used beyond max_entries."""
+        recency = self._recency(namespace)
+        self._client.zremrangebyscore(recency, "-inf", time.time() - policy.ttl_seconds)
+        overflow = self._client.zcard(recency) - policy.max_entries
+        if overflow > 0:
+            oldest = [member for member, _ in self._client.zpopmin(recency, overflow)]
+            self._client.delete(*[self._key(namespace, member.decode()) for member in oldest])
+
+    def clear(self, namespace: str) -> None:
+        recency = self._recency(namespace)
+        members = self._client.zrange(recency, 0, -1)
+        self._client.delete(recency, *[self._key(namespace, member.decode()) for member in members])
+
+    def entries(self, namespace: str) -> int:
+        return self._client.zcard(self._recency(namespace))
+
+
+class SharedCache:
+    """
+    Versioned JSON and vector values on a CacheBackend.
+
+    Keys are {version}:{sha256 of the key material}, where version comes from
+    the callable registered for the namespace with register_version().
+    """
+
+    def __init__(self, backend: Optional[CacheBackend], policies: Dict[str, NamespacePolicy] = POLICIES):
+        self.backend = backend
+        self.policies = policies
+        self._versions: Dict[str, Callable[[], str]] = {}
+        self._last_error_report = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    def register_version(self, namespace: str, version: Callable[[], str]) -> None:
+        """Sets what invalidates a namespace: a change in version() makes every old key unreachable."""
+        self._versions[namespace] = version
+
+    def key(self, namespace: str, material: Any) -> str:
+        version = self._versions.get(namespace)
+        digest = hashlib.sha256(
+            json.dumps(material, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+        ).hexdigest()
+        return f"{version() if version else ''}:{digest[:32]}"
+
+    def get_bytes(self, namespace: str, material: Any) -> Optional[bytes]:
+        if self.backend is None:
+            return None
+        try:
+            value = self.backend.get(namespace, self.key(namespace, material))
+        except Exception as e:
+            self._report(e)
+            CACHE_REQUESTS.inc(namespace=namespace, outcome="error")
+            return None
+        CACHE_REQUESTS.inc(namespace=namespace, outcome="hit" if value is not None else "miss")
+        return value
+
+    def set_bytes(self, namespace: str, material: Any, value: bytes) -> None:
+        if self.backend is None:
+            return
+        try:
+            self.backend.set(namespace, self.key(namespace, material), value, self.policies[namespace])
+        except Exception as e:
+            self._report(e)
+            CACHE_REQUESTS.inc(namespace=namespace, outcome="error")
+
+    def get_json(self, namespace: str, material: Any) -> Optional[Any]:
+        value = self.get_bytes(namespace, material)
+        return json.loads(value) if value is not None else None
+
+    def set_json(self, namespace: str, material: Any, value: Any) -> None:
+        self.set_bytes(namespace, material, json.dumps(value, ensure_ascii=False).encode("utf-8"))
+
+    def get_vector(self, namespace: str, material: Any) -> Optional[List[float]]:
+        value = self.get_bytes(namespace, material)
+        if value is None:
+            return None
+        vector = array("f")
+        vector.frombytes(value)
+        return vector.tolist()
+
+    def set_vector(self, namespace: str, material: Any, vector: List[float]) -> None:
+        # float32, as the in-process embedding cache stores them
+        self.set_bytes(namespace, material, array("f", vector).tobytes())
+
+    def _report(self, error: Exception) -> None:
+        now = time.monotonic()
+        if now - self._last_error_report >= ERROR_REPORT_INTERVAL_SECONDS:
+            self._last_error_report = now
+            print(f"⚠️ Shared cache ({self.backend.name}) unavailable, serving without it: {error}")
+
+
+BACKENDS = {
+    "sqlite": SQLiteCache,
+    "redis": RedisCache,
+}
+
+_shared_cache: Optional[SharedCache] = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_shared_cache() -> SharedCache:
+    """Returns the process-wide shared cache for CACHE_BACKEND, disabled if it cannot be opened."""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            backend = None
+            if CACHE_BACKEND in BACKENDS:
+                try:
+                    backend = BACKENDS[CACHE_BACKEND]()
+                except Exception as e:
+                    print(f"⚠️ Shared cache ({CACHE_BACKEND}) could not be opened, running without it: {e}")
+            elif CACHE_BACKEND != "none":
+                print(f"⚠️ Unknown CACHE_BACKEND '{CACHE_BACKEND}'; expected one of {', '.join(BACKENDS)} or none")
+            _shared_cache = SharedCache(backend)
+        return _shared_cache
+
+
+def _cache_gauges():
+    if _shared_cache is None or _shared_cache.backend is None:
+        return []
+    samples = []
+    for namespace in _shared_cache.policies:
+        try:
+            samples.append(({"namespace": namespace}, _shared_cache.backend.entries(namespace)))
+        except Exception:
+            continue
+    return [("college_cache_entries", "Entries held in the shared cache by namespace.", samples)]
+
+
+register_collector(_cache_gauges)
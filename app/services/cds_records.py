@@ -0,0 +1,558 @@
+"""
+CDS Record Loading.
+
+Reads the extract_pdf_agent event logs saved under app/data/json and returns
+the structured UniversityDataSchema records they contain, and renders record
+sections as the natural-language chunks that get indexed. Shared by the
+indexer script and the backend services that need the extracted data.
+
+Every record belongs to one academic year ("2024-2025"), taken from
+metadata.academic_year or, failing that, the file name. With
+PARTITION_BY_ACADEMIC_YEAR on, each year's vectors live in their own Pinecone
+namespace (or local index partition), so a search scans only the years it
+needs however much history has been loaded.
+
+Besides one chunk per section, a record is indexed at field granularity
+(FIELD_VECTORS): small chunks for groups of related fields ("SAT scores",
+"room and board", "Early Decision 1"), each linked to its section chunk by
+parent_id. A point lookup then matches a few lines instead of the whole
+section; see resolve_granularity() in the query_college_info tool.
+
+Records are normalized and validated as they are loaded (see
+app/services/record_repair.py), so every reader sees canonical values.
+"""
+
+import json
+import os
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from .record_repair import (
+    RECORD_REPAIR_ENABLED,
+    REPAIR_AUTHOR,
+    apply_corrections,
+    display_deadlines,
+    extract_field_corrections,
+    repair_record,
+)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+JSON_DIR = os.path.join(BASE_DIR, "data", "json")
+
+# Off until the per-year namespaces have been filled (run script/indexer.py with it
+# on); indexes built before partitioning only have the base namespace
+PARTITION_BY_ACADEMIC_YEAR = os.getenv("PARTITION_BY_ACADEMIC_YEAR", "false").lower() in ("1", "true", "yes")
+UNKNOWN_YEAR = "unknown"
+FIELD_VECTORS = os.getenv("FIELD_VECTORS", "true").lower() in ("1", "true", "yes")
+
+# "2024-2025", "2024-25", "2024/2025", "2024_2025"
+ACADEMIC_YEAR_RE = re.compile(r"(?<!\d)(20\d{2})\s*[-–/_ ]\s*(?:20)?(\d{2})(?!\d)")
+
+
+def normalize_academic_year(value: Any) -> Optional[str]:
+    """Returns the academic year in value as "YYYY-YYYY", or None if there is none."""
+    for match in ACADEMIC_YEAR_RE.finditer(str(value or "")):
+        start = int(match.group(1))
+        if (start + 1) % 100 == int(match.group(2)):
+            return f"{start}-{start + 1}"
+    return None
+
+
+def record_year(filename: str, record: Dict[str, Any]) -> str:
+    """The academic year a record belongs to: its metadata, then its file name."""
+    return (
+        normalize_academic_year((record.get('metadata') or {}).get('academic_year'))
+        or normalize_academic_year(filename)
+        or UNKNOWN_YEAR
+    )
+
+
+def year_sort_key(year: str):
+    """Orders academic years oldest first, with UNKNOWN_YEAR before all of them."""
+    return (year != UNKNOWN_YEAR, year)
+
+
+def partition_namespace(base: str, year: Optional[str]) -> str:
+    """
+    The Pinecone namespace (or local index partition) holding one academic year.
+
+    Args:
+        base: The embedding provider's namespace ("" for Gemini).
+        year: Academic year; None, or partitioning switched off, gives base.
+    """
+    if not PARTITION_BY_ACADEMIC_YEAR or not year:
+        return base
+    return f"{base}-{year}" if base else year
+
+
+def extract_structured_data(data: Any, filename: str) -> Any:
+    """
+    Extracts the relevant structured data from the raw JSON response.
+
+    repair_fields_agent events are skipped; load_record() applies their corrections.
+    """
+    # Structure 1: List of candidates with 'functionResponse' (완료된 응답)
+    if isinstance(data, list):
+        for item in data:
+            if item.get('author') == REPAIR_AUTHOR:
+                continue
+            parts = item.get('content', {}).get('parts', [])
+            for part in parts:
+                fn_response = part.get('functionResponse', {})
+                if fn_response.get('name') == 'set_model_response':
+                    return fn_response.get('response')
+
+    # Structure 2: List of candidates with 'functionCall' (호출 시점에 저장된 경우)
+    if isinstance(data, list):
+        for item in data:
+            if item.get('author') == REPAIR_AUTHOR:
+                continue
+            parts = item.get('content', {}).get('parts', [])
+            for part in parts:
+                fn_call = part.get('functionCall', {})
+                if fn_call.get('name') == 'set_model_response':
+                    return fn_call.get('args')
+
+    # Structure 3: Fallback, look for JSON string in 'text' parts
+    if isinstance(data, list):
+        for item in data:
+            if item.get('author') == REPAIR_AUTHOR:
+                continue
+            parts = item.get('content', {}).get('parts', [])
+            for part in parts:
+                text = part.get('text', '')
+                if text.strip().startswith('{') and text.strip().endswith('}'):
+                    try:
+                        return json.loads(text)
+                    except json.JSONDecodeError:
+                        continue
+
+    # Structure 4: Maybe the file itself is the dict?
+    if isinstance(data, dict):
+        return data
+
+    return None
+
+
+def format_section_to_text(institution_name: str, key: str, value: Any) -> str:
+    """Converts a structured data section into a natural language string using templates."""
+    
+    if key == "general_info":
+        return (
+            f"General Information for {institution_name}:\n"
+            f"- Institution Name: {value.get('institution_name', 'N/A')}\n"
+            f"- Type: {value.get('school_type', 'N/A')}\n"
+            f"- Category: {value.get('school_category', 'N/A')}\n"
+            f"- Location: {value.get('city', 'N/A')}, {value.get('state', 'N/A')}\n"
+            f"- Website: {value.get('website', 'N/A')}\n"
+            f"- Academic Calendar: {value.get('academic_calendar', 'N/A')}"
+        )
+
+    elif key == "admission_factors":
+        # Arrays to string
+        very_imp = ", ".join(value.get('very_important', [])) or "None"
+        imp = ", ".join(value.get('important', [])) or "None"
+        cons = ", ".join(value.get('considered', [])) or "None"
+        not_cons = ", ".join(value.get('not_considered', [])) or "None"
+        
+        return (
+            f"Admission Factors for {institution_name}:\n"
+            f"- Very Important: {very_imp}\n"
+            f"- Important: {imp}\n"
+            f"- Considered: {cons}\n"
+            f"- Not Considered: {not_cons}"
+        )
+
+    elif key == "admissions_statistics":
+        stats = value
+        applicants = stats.get('applicants', {})
+        admitted = stats.get('admitted', {})
+        enrolled = stats.get('enrolled', {})
+        waitlist = stats.get('waitlist', {})
+        
+        return (
+            f"Admissions Statistics for {institution_name} ({stats.get('cohort_year', 'N/A')}):\n"
+            f"- Acceptance Rate: {stats.get('acceptance_rate', 'N/A')}%\n"
+            f"- Yield Rate: {stats.get('yield_rate', 'N/A')}%\n"
+            f"- Total Applicants: {applicants.get('total', 'N/A')}\n"
+            f"- Total Admitted: {admitted.get('total', 'N/A')}\n"
+            f"- Total Enrolled: {enrolled.get('total', 'N/A')}\n"
+            f"- Waitlist Policy: {'Yes' if waitlist.get('has_policy') else 'No'}\n"
+            f"  * Offered Spot: {waitlist.get('offered_spot', 'N/A')}\n"
+            f"  * Accepted Spot: {waitlist.get('accepted_spot', 'N/A')}\n"
+            f"  * Admitted from Waitlist: {waitlist.get('admitted_from_waitlist', 'N/A')}"
+        )
+
+    elif key == "test_scores":
+        sat = value.get('sat', {})
+        act = value.get('act', {})
+        
+        return (
+            f"Standardized Test Scores for {institution_name}:\n"
+            f"- Policy: {value.get('policy', 'N/A')}\n"
+            f"- SAT Submission Rate: {value.get('submission_rate_sat', 'N/A')}\n"
+            f"- ACT Submission Rate: {value.get('submission_rate_act', 'N/A')}\n"
+            f"- SAT Scores (25th-75th percentile):\n"
+            f"  * Composite: {sat.get('composite_25th', 'N/A')} - {sat.get('composite_75th', 'N/A')}\n"
+            f"  * Math: {sat.get('math_25th', 'N/A')} - {sat.get('math_75th', 'N/A')}\n"
+            f"  * EBRW: {sat.get('ebrw_25th', 'N/A')} - {sat.get('ebrw_75th', 'N/A')}\n"
+            f"- ACT Scores (25th-75th percentile):\n"
+            f"  * Composite: {act.get('composite_25th', 'N/A')} - {act.get('composite_75th', 'N/A')}\n"
+            f"  * Math: {act.get('math_25th', 'N/A')} - {act.get('math_75th', 'N/A')}\n"
+            f"  * English: {act.get('english_25th', 'N/A')} - {act.get('english_75th', 'N/A')}"
+        )
+
+    elif key == "high_school_profile":
+        return (
+            f"High School Profile for {institution_name}:\n"
+            f"- Average GPA: {value.get('average_gpa', 'N/A')}\n"
+            f"- Percent in Top 10% of Class: {value.get('percent_top_10', 'N/A')}\n"
+            f"- Percent in Top 25% of Class: {value.get('percent_top_25', 'N/A')}\n"
+            f"- Percent in Top 50% of Class: {value.get('percent_top_50', 'N/A')}\n"
+            f"- GPA Submission Rate: {value.get('gpa_submission_rate', 'N/A')}\n"
+            f"- Class Rank Submission Rate: {value.get('class_rank_submission_rate', 'N/A')}"
+        )
+
+    elif key == "cost_and_financial_aid":
+        expenses = value.get('expenses', {})
+        aid = value.get('financial_aid', {})
+        
+        return (
+            f"Cost and Financial Aid for {institution_name}:\n"
+            f"- Tuition Structure: {value.get('tuition_structure', 'N/A')}\n"
+            f"- Expenses (Annual):\n"
+            f"  * Tuition (In-state): ${expenses.get('tuition_in_state', 'N/A')}\n"
+            f"  * Tuition (Out-of-state): ${expenses.get('tuition_out_of_state', 'N/A')}\n"
+            f"  * Fees: ${expenses.get('fees', 'N/A')}\n"
+            f"  * Room and Board: ${expenses.get('room_and_board', 'N/A')}\n"
+            f"  * Books and Supplies: ${expenses.get('books_and_supplies', 'N/A')}\n"
+            f"  * Other Expenses: ${expenses.get('other_expenses', 'N/A')}\n"
+            f"- Financial Aid:\n"
+            f"  * International Students Eligible: {'Yes' if aid.get('international_students_eligible') else 'No'}\n"
+            f"  * Average Need-based Package: ${aid.get('average_need_based_package', 'N/A')}\n"
+            f"  * Percent of Need Met: {aid.get('percent_need_met', 'N/A')}"
+        )
+
+    elif key == "student_life_and_faculty":
+        demo = value.get('demographics', {})
+        return (
+            f"Student Life and Faculty at {institution_name}:\n"
+            f"- Student-Faculty Ratio: {value.get('student_faculty_ratio', 'N/A')}\n"
+            f"- Undergraduate Enrollment: {value.get('undergraduate_enrollment', 'N/A')}\n"
+            f"- Class Size under 20: {value.get('class_size_under_20_percent', 'N/A')}\n"
+            f"- Demographics:\n"
+            f"  * Out-of-state Students: {demo.get('out_of_state_percent', 'N/A')}\n"
+            f"  * International Students: {demo.get('international_percent', 'N/A')}"
+        )
+
+    elif key == "deadlines":
+        value = display_deadlines(value)
+        text = f"Application Deadlines for {institution_name}:\n"
+        
+        # Helper for deadline details
+        def format_deadline(label, data):
+            if not data: return ""
+            return (
+                f"- {label}:\n"
+                f"  * Deadline: {data.get('deadline', 'N/A')}\n"
+                f"  * Notification: {data.get('notification_date', 'N/A')}\n"
+                f"  * Binding: {'Yes' if data.get('is_binding') else 'No'}\n"
+                f"  * Type: {data.get('type', 'N/A')}\n"
+            )
+
+        text += format_deadline("Early Decision 1", value.get('early_decision_1'))
+        text += format_deadline("Early Decision 2", value.get('early_decision_2'))
+        text += format_deadline("Early Action", value.get('early_action'))
+        text += format_deadline("Regular Decision", value.get('regular_decision'))
+        
+        transfer = value.get('transfer_admission', {})
+        if transfer:
+             text += (
+                f"- Transfer Admission:\n"
+                f"  * Deadline: {transfer.get('deadline', 'N/A')}\n"
+                f"  * Rolling: {'Yes' if transfer.get('is_rolling') else 'No'}\n"
+            )
+        return text
+
+    return ""
+
+
+# section -> [(field group, title, [(line label, path or tuple of paths, template)])]
+FieldLine = Tuple[str, Union[str, Tuple[str, str]], str]
+FIELD_GROUPS: Dict[str, List[Tuple[str, str, List[FieldLine]]]] = {
+    "general_info": [
+        ("location", "Location", [
+            ("Location", ("city", "state"), "{}, {}"),
+            ("Website", "website", "{}"),
+        ]),
+        ("institution_type", "Institution Type", [
+            ("Type", "school_type", "{}"),
+            ("Category", "school_category", "{}"),
+            ("Academic Calendar", "academic_calendar", "{}"),
+        ]),
+    ],
+    "admissions_statistics": [
+        ("acceptance_rate", "Acceptance and Yield Rate", [
+            ("Acceptance Rate", "acceptance_rate", "{}%"),
+            ("Yield Rate", "yield_rate", "{}%"),
+        ]),
+        ("applicant_pool", "Applicants, Admitted and Enrolled", [
+            ("Total Applicants", "applicants.total", "{}"),
+            ("Total Admitted", "admitted.total", "{}"),
+            ("Total Enrolled", "enrolled.total", "{}"),
+        ]),
+        ("waitlist", "Waitlist", [
+            ("Waitlist Policy", "waitlist.has_policy", "{}"),
+            ("Offered Spot", "waitlist.offered_spot", "{}"),
+            ("Accepted Spot", "waitlist.accepted_spot", "{}"),
+            ("Admitted from Waitlist", "waitlist.admitted_from_waitlist", "{}"),
+        ]),
+    ],
+    "test_scores": [
+        ("test_policy", "Test Policy and Submission Rates", [
+            ("Policy", "policy", "{}"),
+            ("SAT Submission Rate", "submission_rate_sat", "{}"),
+            ("ACT Submission Rate", "submission_rate_act", "{}"),
+        ]),
+        ("sat_scores", "SAT Scores (25th-75th percentile)", [
+            ("SAT Composite", ("sat.composite_25th", "sat.composite_75th"), "{} - {}"),
+            ("SAT Math", ("sat.math_25th", "sat.math_75th"), "{} - {}"),
+            ("SAT EBRW", ("sat.ebrw_25th", "sat.ebrw_75th"), "{} - {}"),
+        ]),
+        ("act_scores", "ACT Scores (25th-75th percentile)", [
+            ("ACT Composite", ("act.composite_25th", "act.composite_75th"), "{} - {}"),
+            ("ACT Math", ("act.math_25th", "act.math_75th"), "{} - {}"),
+            ("ACT English", ("act.english_25th", "act.english_75th"), "{} - {}"),
+        ]),
+    ],
+    "high_school_profile": [
+        ("gpa", "High School GPA", [
+            ("Average GPA", "average_gpa", "{}"),
+            ("GPA Submission Rate", "gpa_submission_rate", "{}"),
+        ]),
+        ("class_rank", "High School Class Rank", [
+            ("Percent in Top 10% of Class", "percent_top_10", "{}"),
+            ("Percent in Top 25% of Class", "percent_top_25", "{}"),
+            ("Percent in Top 50% of Class", "percent_top_50", "{}"),
+            ("Class Rank Submission Rate", "class_rank_submission_rate", "{}"),
+        ]),
+    ],
+    "cost_and_financial_aid": [
+        ("tuition", "Tuition and Fees (Annual)", [
+            ("Tuition Structure", "tuition_structure", "{}"),
+            ("Tuition (In-state)", "expenses.tuition_in_state", "${}"),
+            ("Tuition (Out-of-state)", "expenses.tuition_out_of_state", "${}"),
+            ("Fees", "expenses.fees", "${}"),
+        ]),
+        ("living_costs", "Room and Board and Other Expenses (Annual)", [
+            ("Room and Board", "expenses.room_and_board", "${}"),
+            ("Books and Supplies", "expenses.books_and_supplies", "${}"),
+            ("Other Expenses", "expenses.other_expenses", "${}"),
+        ]),
+        ("financial_aid", "Financial Aid", [
+            ("International Students Eligible", "financial_aid.international_students_eligible", "{}"),
+            ("Average Need-based Package", "financial_aid.average_need_based_package", "${}"),
+            ("Percent of Need Met", "financial_aid.percent_need_met", "{}"),
+        ]),
+    ],
+    "student_life_and_faculty": [
+        ("class_size", "Student-Faculty Ratio and Class Size", [
+            ("Student-Faculty Ratio", "student_faculty_ratio", "{}"),
+            ("Class Size under 20", "class_size_under_20_percent", "{}"),
+        ]),
+        ("enrollment", "Enrollment and Demographics", [
+            ("Undergraduate Enrollment", "undergraduate_enrollment", "{}"),
+            ("Out-of-state Students", "demographics.out_of_state_percent", "{}"),
+            ("International Students", "demographics.international_percent", "{}"),
+        ]),
+    ],
+    "deadlines": [
+        (plan, f"{label} Deadline", [
+            ("Deadline", f"{plan}.deadline", "{}"),
+            ("Notification", f"{plan}.notification_date", "{}"),
+            ("Binding", f"{plan}.is_binding", "{}"),
+            ("Type", f"{plan}.type", "{}"),
+        ])
+        for plan, label in [
+            ("early_decision_1", "Early Decision 1 (ED1)"),
+            ("early_decision_2", "Early Decision 2 (ED2)"),
+            ("early_action", "Early Action (EA)"),
+            ("regular_decision", "Regular Decision (RD)"),
+        ]
+    ] + [
+        ("transfer_admission", "Transfer Admission Deadline", [
+            ("Deadline", "transfer_admission.deadline", "{}"),
+            ("Rolling", "transfer_admission.is_rolling", "{}"),
+        ]),
+    ],
+}
+
+
+def _field_value(section: Any, path: str) -> Any:
+    value = section
+    for key in path.split("."):
+        value = value.get(key) if isinstance(value, dict) else None
+    if isinstance(value, bool):
+        return "Yes" if value else "No"
+    return None if value in (None, "", []) else value
+
+
+def format_field_groups(institution_name: str, key: str, value: Any) -> List[Tuple[str, str]]:
+    """
+    Renders a section's field groups as short texts.
+
+    Returns:
+        list: (field group, text) pairs. Missing fields are left out, and so
+              are groups with no values at all.
+    """
+    if not isinstance(value, dict):
+        return []
+    if key == "deadlines":
+        value = display_deadlines(value)
+    groups = []
+    for group, title, lines in FIELD_GROUPS.get(key, []):
+        rendered = []
+        for label, path, template in lines:
+            if isinstance(path, tuple):
+                fields = [_field_value(value, p) for p in path]
+                if any(field is not None for field in fields):
+                    rendered.append(f"- {label}: {template.format(*('N/A' if f is None else f for f in fields))}")
+            else:
+                field = _field_value(value, path)
+                if field is not None:
+                    rendered.append(f"- {label}: {template.format(field)}")
+        if rendered:
+            lines_text = "\n".join(rendered)
+            groups.append((group, f"{title} for {institution_name}:\n{lines_text}"))
+    return groups
+
+
+def record_chunks(filename: str, record: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Splits one structured record into the section chunks that get indexed.
+
+    Returns:
+        list: {"id", "text", "metadata"} per section, with ids "{filename}#{section}"
+              (unique within a year's partition, since each file is one year),
+              followed by its field-group chunks "{filename}#{section}/{group}"
+              when FIELD_VECTORS is on.
+    """
+    source_file = (record.get('metadata') or {}).get('source_file', filename)
+    institution_name = (record.get('general_info') or {}).get('institution_name', 'Unknown University')
+    academic_year = record_year(filename, record)
+
+    chunks = []
+    for key, value in record.items():
+        if key == 'metadata':
+            continue
+
+        # Unknown sections fall back to their JSON
+        text = format_section_to_text(institution_name, key, value)
+        if not text:
+            text = f"INFO FOR {institution_name} - SECTION {key}: " + json.dumps(value, ensure_ascii=False)
+
+        section_id = f"{filename}#{key}"
+        chunks.append({
+            "id": section_id,
+            "text": text,
+            "metadata": {
+                "source_file": source_file,
+                "institution_name": institution_name,
+                "section": key,
+                "academic_year": academic_year,
+                "granularity": "section",
+                "text": text,
+            },
+        })
+        if not FIELD_VECTORS:
+            continue
+        for group, group_text in format_field_groups(institution_name, key, value):
+            chunks.append({
+                "id": f"{section_id}/{group}",
+                "text": group_text,
+                "metadata": {
+                    "source_file": source_file,
+                    "institution_name": institution_name,
+                    "section": key,
+                    "academic_year": academic_year,
+                    "granularity": "field",
+                    "field_group": group,
+                    "parent_id": section_id,
+                    "text": group_text,
+                },
+            })
+    return chunks
+
+
+def matches_filter(metadata: Dict[str, Any], metadata_filter: Optional[Dict[str, Any]]) -> bool:
+    """Evaluates a Pinecone-style metadata filter against one chunk's metadata."""
+    if not metadata_filter:
+        return True
+    for key, condition in metadata_filter.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        if key == "$or":
+            if not any(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        value = metadata.get(key)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, expected in condition.items():
+            if op == "$eq" and value != expected:
+                return False
+            if op == "$ne" and value == expected:
+                return False
+            if op == "$in" and value not in expected:
+                return False
+            if op == "$nin" and value in expected:
+                return False
+    return True
+
+
+def load_record(filepath: str) -> Optional[Dict[str, Any]]:
+    """Loads one event log file and returns its structured record, if any."""
+    try:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"❌ Failed to read {filepath}: {e}")
+        return None
+    record = extract_structured_data(data, os.path.basename(filepath))
+    if not isinstance(record, dict):
+        return None
+    # Fields re-extracted by repair_fields_agent (script/extract_batch.py) replace the originals
+    record = apply_corrections(record, extract_field_corrections(data))
+    return repair_record(record).record if RECORD_REPAIR_ENABLED else record
+
+
+def load_records(json_dir: str = JSON_DIR) -> Dict[str, Dict[str, Any]]:
+    """
+    Loads every structured record in json_dir.
+
+    Returns:
+        dict: Mapping of event log filename to its structured record.
+    """
+    records: Dict[str, Dict[str, Any]] = {}
+    if not os.path.isdir(json_dir):
+        return records
+    for filename in sorted(os.listdir(json_dir)):
+        if not filename.endswith('.json'):
+            continue
+        record = load_record(os.path.join(json_dir, filename))
+        if record:
+            records[filename] = record
+    return records
+
+
+@lru_cache(maxsize=1)
+def known_institutions() -> List[str]:
+    """Returns the institution names present in the extracted data."""
+    names = {
+        (record.get('general_info') or {}).get('institution_name')
+        for record in load_records().values()
+    }
+    return sorted(name for name in names if name)
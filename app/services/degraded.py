@@ -0,0 +1,205 @@
+"""
+Degraded Retrieval-only Answer Mode.
+
+When the Gemini path is slow or failing, chat turns skip query_analysis_agent
+and college_agent entirely and are answered from local data instead:
+
+1. The local fact store, when the message names an institution and a topic.
+2. Otherwise the top section returned by the vector search on the raw message.
+
+Answers use a fixed template in the user's language (Korean or English) and
+are clearly labelled as quick answers.
+
+The LatencyBreaker switches degraded mode on automatically when recent LLM
+turns are too slow or error-prone, and back off once a probe turn through
+the full pipeline succeeds within the latency budget.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+from .entities import detect_sections, is_korean, match_institutions
+from .fact_store import get_fact_store
+
+DEGRADED_LATENCY_P95_SECONDS = float(os.getenv("DEGRADED_LATENCY_P95_SECONDS", "25"))
+DEGRADED_ERROR_RATE = float(os.getenv("DEGRADED_ERROR_RATE", "0.5"))
+DEGRADED_WINDOW_SECONDS = float(os.getenv("DEGRADED_WINDOW_SECONDS", "120"))
+DEGRADED_MIN_SAMPLES = int(os.getenv("DEGRADED_MIN_SAMPLES", "5"))
+DEGRADED_COOLDOWN_SECONDS = float(os.getenv("DEGRADED_COOLDOWN_SECONDS", "60"))
+
+TEMPLATES = {
+    "en": (
+        "⚠️ Quick answer (limited mode)\n"
+        "Our AI advisor is responding slowly right now, so here is the most relevant "
+        "data we have on file, shown as-is.\n\n"
+        "{body}\n\n"
+        "Source: {source}\n"
+        "Ask again in a little while for a full, personalised answer."
+    ),
+    "ko": (
+        "⚠️ 간편 답변 모드\n"
+        "현재 AI 상담 응답이 지연되고 있어, 보유한 자료 중 가장 관련성 높은 정보를 "
+        "원문 그대로 보여드립니다.\n\n"
+        "{body}\n\n"
+        "출처: {source}\n"
+        "잠시 후 다시 질문하시면 자세한 맞춤 답변을 받으실 수 있습니다."
+    ),
+}
+NOT_FOUND = {
+    "en": "⚠️ Quick answer (limited mode)\nOur AI advisor is responding slowly right now and no matching data was found. Please try again in a little while.",
+    "ko": "⚠️ 간편 답변 모드\n현재 AI 상담 응답이 지연되고 있으며, 관련 자료를 찾지 못했습니다. 잠시 후 다시 시도해 주세요.",
+}
+
+
+class LatencyBreaker:
+    """
+    Circuit breaker over recent LLM turn latencies and errors.
+
+    closed    -> full pipeline; opens when p95 latency or error rate is too high
+    open      -> degraded answers until the cooldown elapses
+    half-open -> one probe turn runs the full pipeline; success closes the
+                 breaker, failure re-opens it
+    """
+
+    def __init__(self):
+        self._samples: deque = deque()
+        self._lock = threading.Lock()
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.times_opened = 0
+
+    def _trim(self, now: float) -> None:
+        while self._samples and now - self._samples[0][0] > DEGRADED_WINDOW_SECONDS:
+            self._samples.popleft()
+
+    def should_degrade(self) -> bool:
+        """Decides whether the next turn should skip the LLM path."""
+        with self._lock:
+            if self.state == "closed":
+                return False
+            if self.state == "open" and time.time() - self.opened_at >= DEGRADED_COOLDOWN_SECONDS:
+                self.state = "half-open"
+            if self.state == "half-open" and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return False
+            return True
+
+    def record(self, latency_seconds: float, ok: bool) -> None:
+        """Records the outcome of a full-pipeline turn."""
+        now = time.time()
+        with self._lock:
+            if self.state == "half-open" and self.probe_in_flight:
+                self.probe_in_flight = False
+                if ok and latency_seconds <= DEGRADED_LATENCY_P95_SECONDS:
+                    print("✅ LLM latency recovered, leaving degraded mode")
+                    self.state = "closed"
+                    self._samples.clear()
+                else:
+                    self._open(now)
+                return
+
+            self._samples.append((now, latency_seconds, ok))
+            self._trim(now)
+            if self.state == "closed" and self._should_open():
+                self._open(now)
+
+    def cancel_probe(self) -> None:
+        """Frees the probe slot when a probe turn ended without an outcome."""
+        with self._lock:
+            self.probe_in_flight = False
+
+    def _should_open(self) -> bool:
+        if len(self._samples) < DEGRADED_MIN_SAMPLES:
+            return False
+        latencies = sorted(sample[1] for sample in self._samples)
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        error_rate = sum(1 for sample in self._samples if not sample[2]) / len(self._samples)
+        return p95 > DEGRADED_LATENCY_P95_SECONDS or error_rate > DEGRADED_ERROR_RATE
+
+    def _open(self, now: float) -> None:
+        print("⚠️ LLM path slow or failing, switching to degraded mode")
+        self.state = "open"
+        self.opened_at = now
+        self.times_opened += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "samples": len(self._samples),
+                "times_opened": self.times_opened,
+            }
+
+
+_breaker = LatencyBreaker()
+
+
+def get_breaker() -> LatencyBreaker:
+    return _breaker
+
+
+def answer_degraded(message: str) -> Tuple[str, List[Dict[str, str]]]:
+    """
+    Builds a retrieval-only answer for a raw user message.
+
+    Blocking (may call the embedding API and Pinecone); run it in a thread.
+
+    Returns:
+        tuple: (answer text, sources in the chat stream's compact format)
+    """
+    lang = "ko" if is_korean(message) else "en"
+    found = _from_fact_store(message) or _from_vector_search(message)
+    if not found:
+        return NOT_FOUND[lang], []
+
+    body, source = found
+    answer = TEMPLATES[lang].format(body=body, source=source["source"])
+    return answer, [source]
+
+
+def _from_fact_store(message: str) -> Optional[Tuple[str, Dict[str, str]]]:
+    store = get_fact_store()
+    institutions = match_institutions(message, store.institutions())
+    sections = detect_sections(message)
+    if len(institutions) != 1 or not sections:
+        return None
+
+    institution = institutions[0]
+    texts = [store.section_text(institution, section) for section in sections]
+    texts = [text for text in texts if text]
+    if not texts:
+        return None
+    source = {
+        "institution": institution,
+        "section": sections[0],
+        "academic_year": store.latest_year(institution) or "N/A",
+        "source": store.source_of(institution) or "N/A",
+    }
+    return "\n\n".join(texts), source
+
+
+def _from_vector_search(message: str) -> Optional[Tuple[str, Dict[str, str]]]:
+    # Imported lazily: the tool module pulls in the Pinecone client
+    from app.agents.sub_agents.college_agent.tools.query_pinecone import search_chunks
+
+    try:
+        chunks = search_chunks(message, top_k=1)
+    except Exception as e:
+        print(f"❌ Degraded retrieval failed: {e}")
+        return None
+    if not chunks:
+        return None
+
+    top = chunks[0]
+    source = {
+        "institution": top["institution_name"],
+        "section": top["section"],
+        "field_group": top.get("field_group"),
+        "academic_year": top.get("academic_year", "N/A"),
+        "source": top["source_file"],
+    }
+    return top["text"], source
@@ -0,0 +1,442 @@
+"""
+Embedding Providers.
+
+One interface for turning text into vectors, selected by EMBEDDING_PROVIDER
+(or per call site, e.g. the indexer's --provider):
+
+- gemini:  gemini-embedding-001 over REST (768 dims), the production default
+- local:   a sentence-transformers model on CPU, no network after the model
+           download (optional dependency: pip install sentence-transformers)
+- hashing: deterministic bag-of-words hashing, for tests and benchmarks
+
+Vectors from different providers are not comparable, so each provider other
+than gemini reads and writes its own Pinecone namespace.
+
+The Gemini provider is built to keep retrieval tail latency bounded:
+
+- cache:     an LRU of text -> vector is checked before any network call
+             (query_pinecone also fills it from the shared cache, see
+             app/services/cache.py)
+- retries:   429, 5xx, timeouts and connection errors are retried with
+             full-jitter exponential backoff (Retry-After is honoured, capped)
+- hedging:   when a single-text attempt is still running after the recent p95
+             attempt latency, a duplicate request is sent and the first answer wins
+- deadline:  the whole call, retries included, gives up after
+             EMBEDDING_DEADLINE_SECONDS instead of stalling for 30s
+- breaker:   after EMBEDDING_BREAKER_FAILURES failed calls in a row, calls
+             fail fast (cached vectors are still served) until a probe call
+             succeeds after the cooldown
+
+Every HTTP attempt is counted in college_embedding_attempts_total{kind,
+outcome} and timed as the embedding.attempt stage.
+"""
+
+import hashlib
+import math
+import os
+import random
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from array import array
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional
+
+import httpx
+from cachetools import LRUCache
+
+from .env import get_env
+from .metrics import EMBEDDING_ATTEMPTS, EVENTS, observe_stage, register_collector
+
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "gemini")
+DEFAULT_GEMINI_API_BASE = "https://generativelanguage.googleapis.com"
+EMBEDDING_MODEL = "gemini-embedding-001"
+EMBEDDING_DIMENSION = 768
+# batchEmbedContents accepts at most 100 requests
+GEMINI_BATCH_SIZE = 100
+LOCAL_EMBEDDING_MODEL = os.getenv("LOCAL_EMBEDDING_MODEL", "sentence-transformers/paraphrase-multilingual-mpnet-base-v2")
+LOCAL_EMBEDDING_DIMENSION = int(os.getenv("LOCAL_EMBEDDING_DIMENSION", "768"))
+
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+EMBEDDING_ATTEMPT_TIMEOUT_SECONDS = float(os.getenv("EMBEDDING_ATTEMPT_TIMEOUT_SECONDS", "5"))
+EMBEDDING_DEADLINE_SECONDS = float(os.getenv("EMBEDDING_DEADLINE_SECONDS", "12"))
+EMBEDDING_MAX_ATTEMPTS = int(os.getenv("EMBEDDING_MAX_ATTEMPTS", "3"))
+EMBEDDING_BACKOFF_BASE_SECONDS = float(os.getenv("EMBEDDING_BACKOFF_BASE_SECONDS", "0.2"))
+EMBEDDING_BACKOFF_MAX_SECONDS = float(os.getenv("EMBEDDING_BACKOFF_MAX_SECONDS", "2"))
+EMBEDDING_HEDGE_ENABLED = os.getenv("EMBEDDING_HEDGE_ENABLED", "true").lower() in ("1", "true", "yes")
+# Hedge delay = p95 of recent attempts, never below the floor; the default is used until enough samples exist
+EMBEDDING_HEDGE_DEFAULT_SECONDS = float(os.getenv("EMBEDDING_HEDGE_DEFAULT_SECONDS", "1"))
+EMBEDDING_HEDGE_MIN_SECONDS = float(os.getenv("EMBEDDING_HEDGE_MIN_SECONDS", "0.1"))
+EMBEDDING_HEDGE_MIN_SAMPLES = 20
+EMBEDDING_BREAKER_FAILURES = int(os.getenv("EMBEDDING_BREAKER_FAILURES", "5"))
+EMBEDDING_BREAKER_COOLDOWN_SECONDS = float(os.getenv("EMBEDDING_BREAKER_COOLDOWN_SECONDS", "30"))
+EMBEDDING_MAX_PARALLEL_ATTEMPTS = int(os.getenv("EMBEDDING_MAX_PARALLEL_ATTEMPTS", "32"))
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class EmbeddingUnavailable(Exception):
+    """Raised when no embedding could be produced (breaker open, deadline hit, provider not installed, ...)."""
+
+
+class _RetryableError(Exception):
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    try:
+        return float(response.headers.get("retry-after", ""))
+    except ValueError:
+        return None
+
+
+def hash_embedding(text: str, dim: int = EMBEDDING_DIMENSION) -> List[float]:
+    """Deterministic bag-of-words vector: each token is hashed into a signed bucket."""
+    vector = [0.0] * dim
+    for token in TOKEN_RE.findall(text.lower()):
+        digest = hashlib.md5(token.encode("utf-8")).digest()
+        bucket = int.from_bytes(digest[:4], "little") % dim
+        vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+class EmbeddingProvider(ABC):
+    """Turns text into vectors of a declared dimension."""
+
+    name = ""
+    # Recorded in index snapshots, so vectors are never restored under a different model
+    model = ""
+    dimension = EMBEDDING_DIMENSION
+
+    @property
+    def namespace(self) -> str:
+        """Pinecone namespace for this provider's vectors; Gemini vectors live in the default one."""
+        return "" if self.name == "gemini" else self.name
+
+    def embed(self, text: str) -> List[float]:
+        return self.embed_batch([text])[0]
+
+    @abstractmethod
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeds texts in order.
+
+        Raises:
+            EmbeddingUnavailable: No vectors could be produced.
+        """
+
+    def cached(self, text: str) -> Optional[List[float]]:
+        """Returns an already computed vector without doing any work, if the provider keeps one."""
+        return None
+
+    def remember(self, text: str, vector: List[float]) -> None:
+        """Keeps a vector computed elsewhere (e.g. found in the shared cache), if the provider caches vectors."""
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """Deterministic hashing vectors: no model, no network, similar texts get similar vectors."""
+
+    name = "hashing"
+    model = "hash_embedding"
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return [hash_embedding(text, self.dimension) for text in texts]
+
+
+class LocalEmbeddingProvider(EmbeddingProvider):
+    """A sentence-transformers model on CPU, loaded on first use."""
+
+    name = "local"
+
+    def __init__(self, model_name: str = LOCAL_EMBEDDING_MODEL, dimension: int = LOCAL_EMBEDDING_DIMENSION):
+        self.model_name = model_name
+        self.model = model_name
+        self.dimension = dimension
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _get_model(self):
+        with self._lock:
+            if self._model is None:
+                try:
+                    from sentence_transformers import SentenceTransformer
+                except ImportError as e:
+                    raise EmbeddingUnavailable(
+                        "EMBEDDING_PROVIDER=local needs sentence-transformers (pip install sentence-transformers)"
+                    ) from e
+                started = time.perf_counter()
+                model = SentenceTransformer(self.model_name, device="cpu")
+                model_dimension = model.get_sentence_embedding_dimension()
+                if model_dimension != self.dimension:
+                    raise EmbeddingUnavailable(
+                        f"{self.model_name} produces {model_dimension}-dim vectors; set LOCAL_EMBEDDING_DIMENSION"
+                    )
+                print(f"🧠 Loaded {self.model_name} in {time.perf_counter() - started:.1f}s")
+                self._model = model
+        return self._model
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        model = self._get_model()
+        started = time.perf_counter()
+        vectors = model.encode(texts, batch_size=32, normalize_embeddings=True, convert_to_numpy=True)
+        observe_stage("embedding.local", time.perf_counter() - started, texts=len(texts))
+        return vectors.tolist()
+
+
+class EmbeddingBreaker:
+    """
+    Consecutive-failure circuit breaker for the embedding API.
+
+    closed    -> calls go out; opens after EMBEDDING_BREAKER_FAILURES failures in a row
+    open      -> calls fail fast until the cooldown elapses
+    half-open -> one probe call goes out; success closes the breaker, failure re-opens it
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.times_opened = 0
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.time() - self.opened_at >= EMBEDDING_BREAKER_COOLDOWN_SECONDS:
+                self.state = "half-open"
+            if self.state == "half-open" and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return True
+            return False
+
+    def record(self, ok: bool) -> None:
+        with self._lock:
+            self.probe_in_flight = False
+            if ok:
+                if self.state != "closed":
+                    print("✅ Embedding API recovered, closing the circuit breaker")
+                self.state = "closed"
+                self.failures = 0
+                return
+            self.failures += 1
+            if self.state == "half-open" or (self.state == "closed" and self.failures >= EMBEDDING_BREAKER_FAILURES):
+                print(f"⚠️ Embedding API failing ({self.failures} in a row), opening the circuit breaker")
+                self.state = "open"
+                self.opened_at = time.time()
+                self.times_opened += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"state": self.state, "failures": self.failures, "times_opened": self.times_opened}
+
+
+class GeminiEmbeddingProvider(EmbeddingProvider):
+    """Gemini embedContent over REST with caching, retries, hedging and a circuit breaker."""
+
+    name = "gemini"
+    model = EMBEDDING_MODEL
+
+    def __init__(self, base_url: Optional[str] = None, api_key: Optional[str] = None):
+        # GEMINI_API_BASE is read when the provider is created (not at import) so
+        # benchmarks can point it at local stand-ins (see script/stand_ins.py)
+        self.base_url = base_url or get_env("GEMINI_API_BASE", DEFAULT_GEMINI_API_BASE)
+        self._api_key = api_key
+        self._http = httpx.Client()
+        self._pool = ThreadPoolExecutor(max_workers=EMBEDDING_MAX_PARALLEL_ATTEMPTS, thread_name_prefix="embedding")
+        # float32 arrays: about 3 KB per cached vector instead of ~25 KB as a list of floats
+        self._cache: LRUCache = LRUCache(maxsize=EMBEDDING_CACHE_SIZE)
+        self._cache_lock = threading.Lock()
+        self._latencies: deque = deque(maxlen=200)
+        self.breaker = EmbeddingBreaker()
+
+    def cached(self, text: str) -> Optional[List[float]]:
+        with self._cache_lock:
+            vector = self._cache.get(text)
+        if vector is None:
+            return None
+        EVENTS.inc(event="embedding_cache_hit")
+        return list(vector)
+
+    def remember(self, text: str, vector: List[float]) -> None:
+        with self._cache_lock:
+            self._cache[text] = array("f", vector)
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeds texts, from the cache when possible, in requests of up to 100 texts.
+
+        Raises:
+            EmbeddingUnavailable: The breaker is open or every attempt failed within the deadline.
+        """
+        vectors: List[Optional[List[float]]] = [self.cached(text) for text in texts]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        for start in range(0, len(missing), GEMINI_BATCH_SIZE):
+            positions = missing[start:start + GEMINI_BATCH_SIZE]
+            batch = [texts[i] for i in positions]
+            if not self.breaker.allow():
+                EVENTS.inc(event="embedding_breaker_rejected")
+                raise EmbeddingUnavailable("embedding circuit breaker is open")
+
+            ok = False
+            try:
+                values = self._embed_with_retries(batch)
+                ok = True
+            finally:
+                self.breaker.record(ok)
+            with self._cache_lock:
+                for text, vector in zip(batch, values):
+                    self._cache[text] = array("f", vector)
+            for i, vector in zip(positions, values):
+                vectors[i] = vector
+        return vectors
+
+    def hedge_delay(self) -> float:
+        with self._cache_lock:
+            latencies = sorted(self._latencies)
+        if len(latencies) < EMBEDDING_HEDGE_MIN_SAMPLES:
+            return EMBEDDING_HEDGE_DEFAULT_SECONDS
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        return max(EMBEDDING_HEDGE_MIN_SECONDS, p95)
+
+    def _embed_with_retries(self, texts: List[str]) -> List[List[float]]:
+        deadline = time.monotonic() + EMBEDDING_DEADLINE_SECONDS
+        last_error: Optional[_RetryableError] = None
+        attempts = 0
+        for attempt in range(EMBEDDING_MAX_ATTEMPTS):
+            if time.monotonic() >= deadline:
+                break
+            attempts += 1
+            try:
+                return self._hedged_attempt(texts, deadline, "retry" if attempt else "primary")
+            except _RetryableError as e:
+                last_error = e
+            if attempt == EMBEDDING_MAX_ATTEMPTS - 1:
+                break
+            delay = random.uniform(0, min(EMBEDDING_BACKOFF_MAX_SECONDS, EMBEDDING_BACKOFF_BASE_SECONDS * 2 ** attempt))
+            if last_error.retry_after:
+                delay = max(delay, min(last_error.retry_after, EMBEDDING_BACKOFF_MAX_SECONDS))
+            if time.monotonic() + delay >= deadline:
+                break
+            time.sleep(delay)
+        raise EmbeddingUnavailable(f"embedding failed after {attempts} attempts: {last_error or 'deadline exceeded'}")
+
+    def _hedged_attempt(self, texts: List[str], deadline: float, kind: str) -> List[List[float]]:
+        pending = {self._pool.submit(self._attempt, texts, deadline, kind)}
+        # Only single-text calls are hedged: that is the latency-sensitive query path
+        if EMBEDDING_HEDGE_ENABLED and len(texts) == 1:
+            done, _ = wait(pending, timeout=min(self.hedge_delay(), max(0.0, deadline - time.monotonic())))
+            if not done and time.monotonic() < deadline:
+                EVENTS.inc(event="embedding_hedged")
+                pending.add(self._pool.submit(self._attempt, texts, deadline, "hedge"))
+
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    # The slower duplicate, if any, finishes in the background within its own timeout
+                    return future.result()
+                except Exception as e:
+                    error = e
+        raise error
+
+    def _attempt(self, texts: List[str], deadline: float, kind: str) -> List[List[float]]:
+        api_key = self._api_key or get_env("GOOGLE_API_KEY")
+        if len(texts) == 1:
+            url = f"{self.base_url}/v1beta/models/{EMBEDDING_MODEL}:embedContent?key={api_key}"
+            payload: Dict[str, Any] = {
+                "content": {"parts": [{"text": texts[0]}]},
+                "output_dimensionality": self.dimension,
+            }
+        else:
+            url = f"{self.base_url}/v1beta/models/{EMBEDDING_MODEL}:batchEmbedContents?key={api_key}"
+            payload = {"requests": [
+                {
+                    "model": f"models/{EMBEDDING_MODEL}",
+                    "content": {"parts": [{"text": text}]},
+                    "output_dimensionality": self.dimension,
+                }
+                for text in texts
+            ]}
+        timeout = max(0.05, min(EMBEDDING_ATTEMPT_TIMEOUT_SECONDS, deadline - time.monotonic()))
+        started = time.perf_counter()
+        outcome = "ok"
+        try:
+            try:
+                response = self._http.post(url, json=payload, timeout=timeout)
+            except httpx.TimeoutException as e:
+                outcome = "timeout"
+                raise _RetryableError(f"timed out after {timeout:.1f}s") from e
+            except httpx.TransportError as e:
+                outcome = "connection_error"
+                raise _RetryableError(str(e)) from e
+
+            if response.status_code == 429 or response.status_code >= 500:
+                outcome = f"http_{response.status_code}"
+                raise _RetryableError(f"HTTP {response.status_code}", retry_after=_retry_after(response))
+            if response.status_code >= 400:
+                outcome = f"http_{response.status_code}"
+                raise EmbeddingUnavailable(f"HTTP {response.status_code}: {response.text[:200]}")
+            try:
+                body = response.json()
+                if len(texts) == 1:
+                    values = [body["embedding"]["values"]]
+                else:
+                    values = [item["values"] for item in body["embeddings"]]
+                if len(values) != len(texts):
+                    raise ValueError(f"{len(values)} vectors for {len(texts)} texts")
+            except (ValueError, KeyError, TypeError) as e:
+                outcome = "bad_response"
+                raise EmbeddingUnavailable(f"unexpected embedding response: {e}") from e
+        finally:
+            elapsed = time.perf_counter() - started
+            EMBEDDING_ATTEMPTS.inc(kind=kind, outcome=outcome)
+            observe_stage("embedding.attempt", elapsed, ok=outcome == "ok", kind=kind, outcome=outcome, texts=len(texts))
+
+        if len(texts) == 1:
+            with self._cache_lock:
+                self._latencies.append(elapsed)
+        return values
+
+
+PROVIDERS = {
+    "gemini": GeminiEmbeddingProvider,
+    "local": LocalEmbeddingProvider,
+    "hashing": HashingEmbeddingProvider,
+}
+
+_providers: Dict[str, EmbeddingProvider] = {}
+_providers_lock = threading.Lock()
+
+
+def get_embedding_provider(name: Optional[str] = None) -> EmbeddingProvider:
+    """Returns the process-wide provider called name (default: EMBEDDING_PROVIDER)."""
+    name = name or EMBEDDING_PROVIDER
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown embedding provider '{name}'; expected one of {', '.join(PROVIDERS)}")
+    with _providers_lock:
+        if name not in _providers:
+            _providers[name] = PROVIDERS[name]()
+        return _providers[name]
+
+
+def _breaker_gauges():
+    gemini = _providers.get("gemini")
+    if gemini is None:
+        return []
+    state = gemini.breaker.snapshot()["state"]
+    return [(
+        "college_embedding_breaker",
+        "1 for the current embedding circuit breaker state.",
+        [({"state": name}, int(name == state)) for name in ("closed", "open", "half-open")],
+    )]
+
+
+register_collector(_breaker_gauges)
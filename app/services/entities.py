@@ -0,0 +1,196 @@
+"""
+Lightweight entity resolution for college queries.
+
+Maps free-text (English, already optimized) queries to the institutions,
+CDS schema sections and academic years they refer to, without calling an LLM. Used to reuse
+retrieval results across follow-up questions and to narrow vector searches.
+"""
+
+import re
+from typing import Dict, Iterable, List, Optional
+
+from .cds_records import known_institutions, normalize_academic_year
+
+# Section keys match the top-level keys of UniversityDataSchema
+SECTION_KEYWORDS: Dict[str, List[str]] = {
+    "general_info": [
+        "location", "located", "city", "website", "calendar", "semester",
+        "quarter", "public", "private", "liberal arts", "general information",
+    ],
+    "admission_factors": [
+        "admission factor", "factors", "essay", "interview", "recommendation",
+        "extracurricular", "rigor", "character", "legacy", "considered",
+    ],
+    "admissions_statistics": [
+        "acceptance rate", "admission rate", "admit rate", "selectivity", "applicants",
+        "admitted", "yield", "waitlist", "wait list", "enrolled", "cohort",
+    ],
+    "test_scores": [
+        "sat", "act", "test score", "test optional", "test-optional", "test required",
+        "standardized", "percentile", "ebrw",
+    ],
+    "high_school_profile": [
+        "gpa", "class rank", "top 10%", "top 10 percent", "top 25", "high school",
+    ],
+    "cost_and_financial_aid": [
+        "tuition", "cost", "fee", "fees", "expense", "room and board", "housing",
+        "financial aid", "need-based", "need based", "scholarship", "price", "afford",
+    ],
+    "student_life_and_faculty": [
+        "student-faculty", "student faculty", "faculty ratio", "class size",
+        "international student", "demographic", "out-of-state", "undergraduate enrollment",
+        "student body",
+    ],
+    "deadlines": [
+        "deadline", "due date", "early decision", "early action", "regular decision",
+        "notification", "transfer", "ed1", "ed2", "apply by",
+    ],
+}
+
+# Korean section keywords, for raw (untranslated) user messages
+SECTION_KEYWORDS_KO: Dict[str, List[str]] = {
+    "general_info": ["위치", "어디에", "홈페이지", "학기제"],
+    "admission_factors": ["평가 요소", "입학 요소", "에세이", "인터뷰", "추천서", "비교과"],
+    "admissions_statistics": ["합격률", "경쟁률", "지원자", "합격자", "등록률", "대기자", "웨이팅"],
+    "test_scores": ["시험", "점수", "테스트 옵셔널"],
+    "high_school_profile": ["내신", "평점", "석차", "상위"],
+    "cost_and_financial_aid": ["학비", "등록금", "비용", "기숙사비", "생활비", "장학금", "재정 보조", "학자금"],
+    "student_life_and_faculty": ["유학생", "교수 비율", "학생 비율", "수업 규모", "재학생"],
+    "deadlines": ["마감", "마감일", "얼리", "정시", "발표일", "편입"],
+}
+
+# Common non-English names for institutions in the data set
+EXTRA_ALIASES: Dict[str, List[str]] = {
+    "Georgia Institute of Technology": ["georgia tech", "조지아 공대", "조지아텍", "조지아 테크"],
+    "Hamilton College": ["해밀턴"],
+    "Harvard University": ["하버드"],
+    "Rose-Hulman Institute of Technology": ["로즈헐만", "로즈 헐만", "로즈헐먼"],
+    "Stanford University": ["스탠포드", "스탠퍼드"],
+    "Swarthmore College": ["스워스모어", "스와스모어"],
+    "Williams College": ["윌리엄스"],
+}
+
+# Questions about change over time search every academic year on record
+TREND_KEYWORDS = [
+    "trend", "trends", "over the years", "over time", "historical", "history of",
+    "year over year", "year-over-year", "each year", "every year", "by year", "all years",
+]
+TREND_KEYWORDS_KO = ["추이", "변화", "연도별", "매년", "역대", "해마다", "몇 년간", "지난 몇 년"]
+# Comparisons with the previous year search the latest two years
+PREVIOUS_YEAR_KEYWORDS = ["last year", "previous year", "prior year", "compared to last", "작년", "전년", "지난해"]
+_RECENT_YEARS_PATTERN = re.compile(r"(?:last|past|previous|recent)\s+(\d+|two|three|four|five)\s+years|최근\s*(\d+)\s*년")
+_NUMBER_WORDS = {"two": 2, "three": 3, "four": 4, "five": 5}
+_SINGLE_YEAR_PATTERN = re.compile(r"(?<!\d)(20\d{2})(?!\d)")
+
+_INSTITUTION_PATTERN = re.compile(
+    r"\b(university|college|institute|school of|polytechnic)\b", re.IGNORECASE
+)
+_GENERIC_WORDS = {
+    "university", "college", "institute", "of", "the", "and", "at", "technology",
+    "school", "state", "polytechnic",
+}
+
+
+def _contains(text: str, phrase: str) -> bool:
+    return re.search(rf"(?<![a-z0-9]){re.escape(phrase)}(?![a-z0-9])", text) is not None
+
+
+def detect_sections(query: str) -> List[str]:
+    """
+    Returns the schema sections a query asks about, in schema order.
+
+    An empty list means the query is not specific to any section.
+    """
+    text = query.lower()
+    return [
+        section
+        for section, keywords in SECTION_KEYWORDS.items()
+        if any(_contains(text, keyword) for keyword in keywords)
+        or any(keyword in text for keyword in SECTION_KEYWORDS_KO.get(section, []))
+    ]
+
+
+def institution_aliases(name: str) -> List[str]:
+    """
+    Builds lowercase aliases for an institution name.
+
+    Example: "Georgia Institute of Technology" ->
+        ["georgia institute of technology", "georgia"]
+    """
+    full = name.lower().strip()
+    aliases = [full]
+    significant = [w for w in re.findall(r"[a-z0-9\-]+", full) if w not in _GENERIC_WORDS]
+    if significant:
+        short = " ".join(significant)
+        if short not in aliases:
+            aliases.append(short)
+        if significant[0] not in aliases and len(significant[0]) > 3:
+            aliases.append(significant[0])
+    # "rose-hulman" should also match "rose hulman"
+    aliases.extend(a.replace("-", " ") for a in list(aliases) if "-" in a)
+    aliases.extend(EXTRA_ALIASES.get(name, []))
+    return aliases
+
+
+def match_institutions(query: str, names: Iterable[str]) -> List[str]:
+    """Returns the names (from the given candidates) that the query mentions."""
+    text = query.lower()
+    return [
+        name for name in names
+        if any(_contains(text, alias) for alias in institution_aliases(name))
+    ]
+
+
+def is_korean(text: str) -> bool:
+    """True when the text contains Hangul."""
+    return re.search(r"[\uac00-\ud7a3]", text) is not None
+
+
+def mentions_institution(query: str) -> bool:
+    """True when the query appears to name some institution explicitly."""
+    if _INSTITUTION_PATTERN.search(query):
+        return True
+    return bool(match_institutions(query, known_institutions()))
+
+
+def detect_academic_years(query: str, known_years: List[str]) -> Optional[List[str]]:
+    """
+    Returns the academic years a query asks about, or None for "the latest".
+
+    - Academic years written out ("2022-2023", "2022-23") are returned as
+      given, even when not on record, so the caller can say so.
+    - A bare year ("2023", "2023학년도") is the known academic year starting
+      in it, else the one ending in it.
+    - "last 3 years" / "최근 3년" -> the latest three known years; "compared to
+      last year" -> the latest two; trend words -> every known year.
+
+    Args:
+        known_years: Academic years on record, oldest first.
+    """
+    text = query.lower()
+    explicit: List[str] = []
+    for match in re.finditer(r"20\d{2}\s*[-–/]\s*(?:20)?\d{2}(?!\d)", text):
+        year = normalize_academic_year(match.group(0))
+        if year and year not in explicit:
+            explicit.append(year)
+    stripped = re.sub(r"20\d{2}\s*[-–/]\s*(?:20)?\d{2}(?!\d)", " ", text)
+    for match in _SINGLE_YEAR_PATTERN.finditer(stripped):
+        start = int(match.group(1))
+        candidates = [f"{start}-{start + 1}", f"{start - 1}-{start}"]
+        year = next((c for c in candidates if c in known_years), None)
+        if year and year not in explicit:
+            explicit.append(year)
+    if explicit:
+        return explicit
+
+    dated = [year for year in known_years if normalize_academic_year(year)]
+    recent = _RECENT_YEARS_PATTERN.search(text)
+    if recent:
+        count = recent.group(1) or recent.group(2)
+        n = _NUMBER_WORDS.get(count) or int(count)
+        return dated[-n:] or None
+    if any(_contains(text, keyword) for keyword in TREND_KEYWORDS) or any(k in text for k in TREND_KEYWORDS_KO):
+        return dated or None
+    if any(k in text for k in PREVIOUS_YEAR_KEYWORDS):
+        return dated[-2:] or None
+    return None
@@ -0,0 +1,38 @@
+"""
+Environment Loading.
+
+app/.env is read once per process, on first use, instead of as a side effect
+of importing whichever module happens to need an API key first. Variables
+already set in the process environment win over the file.
+
+Entry points (app/main.py, the scripts) call load_env() before importing the
+modules that read their settings into constants at import time.
+"""
+
+import os
+from typing import Optional
+
+from dotenv import load_dotenv
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENV_PATH = os.path.join(BASE_DIR, ".env")
+
+_loaded = False
+
+
+def load_env() -> None:
+    """Loads app/.env into os.environ the first time it is called."""
+    global _loaded
+    if _loaded:
+        return
+    if os.path.exists(ENV_PATH):
+        load_dotenv(dotenv_path=ENV_PATH)
+    else:
+        load_dotenv(dotenv_path="app/.env")
+    _loaded = True
+
+
+def get_env(name: str, default: Optional[str] = None) -> Optional[str]:
+    """os.getenv after making sure app/.env has been loaded."""
+    load_env()
+    return os.getenv(name, default)
@@ -0,0 +1,123 @@
+"""
+Local Fact Store.
+
+In-memory view of the extracted CDS records, keyed by institution name and
+partitioned by academic year. Lets the backend answer simple lookups (one
+institution, one section) without an embedding call, a vector search or an
+LLM, and tells the vector search which year partitions to scan.
+
+Lookups default to each institution's latest year; older years are only read
+when asked for by name.
+"""
+
+import hashlib
+import json
+from functools import cached_property, lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from .cds_records import JSON_DIR, UNKNOWN_YEAR, format_section_to_text, load_records, record_year, year_sort_key
+
+# (academic year, institutions to restrict that year's search to, or None for all)
+SearchScope = List[Tuple[str, Optional[List[str]]]]
+
+
+class FactStore:
+    """Extracted CDS records indexed by institution name and academic year."""
+
+    def __init__(self, records: Dict[str, Dict[str, Any]]):
+        self._raw = records
+        self._records: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._sources: Dict[Tuple[str, str], str] = {}
+        for filename, record in records.items():
+            name = (record.get("general_info") or {}).get("institution_name")
+            if not name:
+                continue
+            year = record_year(filename, record)
+            self._records.setdefault(name, {})[year] = record
+            self._sources[(name, year)] = (record.get("metadata") or {}).get("source_file") or filename
+
+    @classmethod
+    def load(cls, json_dir: str = JSON_DIR) -> "FactStore":
+        return cls(load_records(json_dir))
+
+    @cached_property
+    def version(self) -> str:
+        """Digest of the loaded records; part of the shared cache keys of anything rendered from them."""
+        payload = json.dumps(self._raw, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
+
+    def institutions(self) -> List[str]:
+        return sorted(self._records)
+
+    def years(self, institution: Optional[str] = None) -> List[str]:
+        """Academic years on record, oldest first, for one institution or all of them."""
+        if institution is not None:
+            years = set(self._records.get(institution, {}))
+        else:
+            years = {year for by_year in self._records.values() for year in by_year}
+        return sorted(years, key=year_sort_key)
+
+    def latest_year(self, institution: str) -> Optional[str]:
+        years = self.years(institution)
+        return years[-1] if years else None
+
+    def get(self, institution: str, year: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """The institution's record for year, or for its latest year."""
+        year = year or self.latest_year(institution)
+        return self._records.get(institution, {}).get(year) if year else None
+
+    def source_of(self, institution: str, year: Optional[str] = None) -> Optional[str]:
+        year = year or self.latest_year(institution)
+        return self._sources.get((institution, year)) if year else None
+
+    def section_text(self, institution: str, section: str, year: Optional[str] = None) -> Optional[str]:
+        """Renders one section exactly as it is indexed, or None if missing."""
+        record = self.get(institution, year)
+        if not record or not record.get(section):
+            return None
+        return format_section_to_text(institution, section, record[section]) or None
+
+    def search_scope(self, institutions: Optional[List[str]] = None, years: Optional[List[str]] = None) -> SearchScope:
+        """
+        Decides which year partitions a vector search has to scan.
+
+        Args:
+            institutions: Restrict to these institutions (None = all).
+            years: Explicit academic years (trend questions); None means each
+                institution's latest year.
+
+        Returns:
+            list: (year, institutions or None) pairs, newest year first. The
+                  latest-year scope is normally the newest partition alone,
+                  plus one filtered partition per older year that is still
+                  some institution's latest, so its cost does not grow with
+                  the number of years loaded.
+        """
+        if years:
+            known = set(self.years())
+            return [(year, institutions) for year in sorted(set(years), key=year_sort_key, reverse=True) if year in known]
+
+        targets = [name for name in (institutions or self.institutions()) if name in self._records]
+        latest: Dict[str, List[str]] = {}
+        for name in targets:
+            latest.setdefault(self.latest_year(name), []).append(name)
+        if not latest:
+            # Institutions we hold no records for: their newest data is most likely in the newest partition
+            known = self.years()
+            return [(known[-1], institutions)] if known else []
+
+        ordered = sorted(latest, key=year_sort_key, reverse=True)
+        scope: SearchScope = [(ordered[0], institutions)]
+        # Institutions whose newest CDS is older (or undated) are searched in that year's partition only
+        scope += [(year, latest[year]) for year in ordered[1:]]
+        return scope
+
+
+@lru_cache(maxsize=1)
+def get_fact_store() -> FactStore:
+    """Returns the process-wide fact store, loading it on first use."""
+    store = FactStore.load()
+    years = [year for year in store.years() if year != UNKNOWN_YEAR]
+    span = f", {years[0]}..{years[-1]}" if years else ""
+    print(f"📚 Fact store loaded: {len(store.institutions())} institutions{span}")
+    return store
@@ -0,0 +1,416 @@
+"""
+Admission Control and Load Shedding for LLM Traffic.
+
+A single ConcurrencyGovernor per process caps how much expensive work runs
+at once and sheds the rest quickly instead of letting everything slow down
+together until it times out:
+
+- Lanes: separate in-flight caps for chat turns, extraction jobs and
+  embedding calls, each with a bounded wait queue and a queue timeout.
+- Rate limits: token buckets per user (per client address while user ids
+  are placeholders) and per session.
+- Rejections raise AdmissionRejected, which the app turns into a 429 (rate
+  limited) or 503 (overloaded) response with a Retry-After header.
+
+Queue depth, in-flight counts and rejection counters are exposed through
+snapshot() for the debug and metrics routes.
+"""
+
+import asyncio
+import json
+import math
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Dict, Optional
+
+from cachetools import TTLCache
+from starlette.responses import JSONResponse
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+# Lane configuration: (max in flight, max queued, queue timeout seconds)
+LANE_CONFIG = {
+    "chat": (
+        _env_int("CHAT_MAX_IN_FLIGHT", 8),
+        _env_int("CHAT_MAX_QUEUE", 16),
+        _env_float("CHAT_QUEUE_TIMEOUT_SECONDS", 10.0),
+    ),
+    "extraction": (
+        _env_int("EXTRACTION_MAX_IN_FLIGHT", 2),
+        _env_int("EXTRACTION_MAX_QUEUE", 4),
+        _env_float("EXTRACTION_QUEUE_TIMEOUT_SECONDS", 30.0),
+    ),
+    "embedding": (
+        _env_int("EMBEDDING_MAX_IN_FLIGHT", 16),
+        _env_int("EMBEDDING_MAX_QUEUE", 64),
+        _env_float("EMBEDDING_QUEUE_TIMEOUT_SECONDS", 5.0),
+    ),
+}
+# Lanes used from worker threads (sync tools) rather than the event loop
+THREAD_LANES = {"embedding"}
+
+# Token buckets: requests per minute and burst size
+USER_RATE_PER_MINUTE = _env_float("USER_RATE_PER_MINUTE", 30)
+USER_RATE_BURST = _env_int("USER_RATE_BURST", 10)
+SESSION_RATE_PER_MINUTE = _env_float("SESSION_RATE_PER_MINUTE", 12)
+SESSION_RATE_BURST = _env_int("SESSION_RATE_BURST", 4)
+# Fixed user ids used until there is authentication (chat "user", upload "admin");
+# the per-user bucket is keyed on the client address instead, so one busy visitor
+# does not throttle everyone. Behind a proxy, run uvicorn with --proxy-headers.
+PLACEHOLDER_USER_IDS = {"user", "admin"}
+
+# ADK endpoints that start a full pipeline run
+ADK_RUN_PATHS = {"/run", "/run_sse"}
+# Lane per ADK app for those runs; other apps (college_agent) use the chat lane.
+# /upload/ starts its root_agent extraction through /run or /run_sse, so it is admitted here
+APP_LANES = {"root_agent": "extraction"}
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is rate limited (429) or shed for overload (503)."""
+
+    def __init__(self, status_code: int, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+    def to_response(self) -> JSONResponse:
+        return JSONResponse(
+            status_code=self.status_code,
+            content={"detail": self.reason},
+            headers={"Retry-After": str(self.retry_after)},
+        )
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at rate_per_second."""
+
+    def __init__(self, rate_per_second: float, capacity: int):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_take(self) -> float:
+        """
+        Takes one token.
+
+        Returns:
+            float: 0 when admitted, otherwise seconds until a token is available.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Keyed token buckets; idle keys are forgotten after an hour."""
+
+    def __init__(self, name: str, per_minute: float, burst: int, max_keys: int = 10000):
+        self.name = name
+        self.rate = per_minute / 60.0
+        self.burst = burst
+        self.rejected = 0
+        self._buckets: TTLCache = TTLCache(maxsize=max_keys, ttl=3600)
+        self._lock = threading.Lock()
+
+    def check(self, key: str) -> None:
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.burst)
+            self._buckets[key] = bucket
+        wait = bucket.try_take()
+        if wait:
+            with self._lock:
+                self.rejected += 1
+            raise AdmissionRejected(429, f"Too many requests for this {self.name}", wait)
+
+
+class _Lane:
+    """Shared bookkeeping for an in-flight cap with a bounded wait queue."""
+
+    def __init__(self, name: str, capacity: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.capacity = capacity
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.avg_hold_seconds = 1.0
+        self._stats_lock = threading.Lock()
+
+    def _retry_after(self) -> float:
+        # Time for the current queue to drain at the observed service time
+        return self.avg_hold_seconds * (self.waiting + 1) / max(1, self.capacity)
+
+    def _reject_full(self) -> AdmissionRejected:
+        with self._stats_lock:
+            self.rejected_queue_full += 1
+        return AdmissionRejected(503, f"Server busy ({self.name} queue full)", self._retry_after())
+
+    def _reject_timeout(self) -> AdmissionRejected:
+        with self._stats_lock:
+            self.rejected_timeout += 1
+        return AdmissionRejected(503, f"Server busy ({self.name} queue timeout)", self._retry_after())
+
+    def _on_admitted(self) -> float:
+        with self._stats_lock:
+            self.in_flight += 1
+            self.admitted += 1
+        return time.monotonic()
+
+    def _on_released(self, started_at: float) -> None:
+        with self._stats_lock:
+            self.in_flight -= 1
+            held = time.monotonic() - started_at
+            self.avg_hold_seconds = 0.8 * self.avg_hold_seconds + 0.2 * held
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "capacity": self.capacity,
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "avg_hold_seconds": round(self.avg_hold_seconds, 3),
+        }
+
+
+class AsyncLane(_Lane):
+    """Lane for coroutines running on the event loop."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _sem(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.capacity)
+        return self._semaphore
+
+    async def acquire(self) -> float:
+        semaphore = self._sem()
+        if semaphore.locked():
+            if self.waiting >= self.max_queue:
+                raise self._reject_full()
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(semaphore.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise self._reject_timeout()
+            finally:
+                self.waiting -= 1
+        else:
+            await semaphore.acquire()
+        return self._on_admitted()
+
+    def release(self, started_at: float) -> None:
+        self._on_released(started_at)
+        self._sem().release()
+
+
+class ThreadLane(_Lane):
+    """Lane for blocking calls made from worker threads."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._semaphore = threading.BoundedSemaphore(self.capacity)
+
+    def acquire(self) -> float:
+        if not self._semaphore.acquire(blocking=False):
+            with self._stats_lock:
+                if self.waiting >= self.max_queue:
+                    full = True
+                else:
+                    full = False
+                    self.waiting += 1
+            if full:
+                raise self._reject_full()
+            try:
+                if not self._semaphore.acquire(timeout=self.queue_timeout):
+                    raise self._reject_timeout()
+            finally:
+                with self._stats_lock:
+                    self.waiting -= 1
+        return self._on_admitted()
+
+    def release(self, started_at: float) -> None:
+        self._on_released(started_at)
+        self._semaphore.release()
+
+
+def rate_key(user_id: Optional[str], client: Optional[str]) -> Optional[str]:
+    """The per-user bucket's key: the user id, or the client address for placeholder ids."""
+    if user_id and user_id not in PLACEHOLDER_USER_IDS:
+        return user_id
+    return f"client:{client}" if client else None
+
+
+class ConcurrencyGovernor:
+    """Process-wide admission control for chat, extraction and embedding work."""
+
+    def __init__(self):
+        self.lanes: Dict[str, _Lane] = {
+            name: (ThreadLane if name in THREAD_LANES else AsyncLane)(name, *config)
+            for name, config in LANE_CONFIG.items()
+        }
+        self.user_limiter = RateLimiter("user", USER_RATE_PER_MINUTE, USER_RATE_BURST)
+        self.session_limiter = RateLimiter("session", SESSION_RATE_PER_MINUTE, SESSION_RATE_BURST)
+
+    def check_rate(
+        self, user_id: Optional[str] = None, session_id: Optional[str] = None, client: Optional[str] = None
+    ) -> None:
+        """
+        Raises AdmissionRejected(429) when the user or session is over its rate.
+
+        Args:
+            client: The client's address, which stands in for placeholder user ids.
+        """
+        user_key = rate_key(user_id, client)
+        if user_key:
+            self.user_limiter.check(user_key)
+        if session_id:
+            self.session_limiter.check(session_id)
+
+    async def acquire(
+        self,
+        lane: str,
+        user_id: Optional[str] = None,
+        session_id: Optional[str] = None,
+        client: Optional[str] = None,
+    ) -> float:
+        """
+        Admits one unit of async work, waiting in the bounded queue if needed.
+
+        Returns:
+            float: Admission timestamp to pass back to release().
+        """
+        self.check_rate(user_id, session_id, client)
+        return await self.lanes[lane].acquire()
+
+    def release(self, lane: str, started_at: float) -> None:
+        self.lanes[lane].release(started_at)
+
+    @asynccontextmanager
+    async def admit(
+        self, lane: str, user_id: Optional[str] = None, session_id: Optional[str] = None, client: Optional[str] = None
+    ):
+        started_at = await self.acquire(lane, user_id, session_id, client)
+        try:
+            yield
+        finally:
+            self.release(lane, started_at)
+
+    @contextmanager
+    def admit_sync(self, lane: str):
+        """Blocking variant for thread lanes such as 'embedding'."""
+        started_at = self.lanes[lane].acquire()
+        try:
+            yield
+        finally:
+            self.lanes[lane].release(started_at)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "lanes": {name: lane.snapshot() for name, lane in self.lanes.items()},
+            "rate_limited": {
+                "user": self.user_limiter.rejected,
+                "session": self.session_limiter.rejected,
+            },
+        }
+
+
+_governor: Optional[ConcurrencyGovernor] = None
+
+
+def get_governor() -> ConcurrencyGovernor:
+    """Returns the process-wide governor."""
+    global _governor
+    if _governor is None:
+        _governor = ConcurrencyGovernor()
+    return _governor
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware that applies admission control to ADK's own run endpoints.
+
+    The request body is read once to find appName (which picks the lane, see
+    APP_LANES) and userId/sessionId for rate limiting, and then replayed to
+    the ADK handler; the slot is held until the (possibly streaming) response
+    has finished.
+    """
+
+    def __init__(self, app, paths=ADK_RUN_PATHS, lane: str = "chat", app_lanes=APP_LANES):
+        self.app = app
+        self.paths = paths
+        self.lane = lane
+        self.app_lanes = app_lanes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+        try:
+            payload = json.loads(body or b"{}")
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            payload = {}
+        if not isinstance(payload, dict):
+            payload = {}
+
+        replayed = False
+
+        async def replay_receive():
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        app_name = payload.get("appName") or payload.get("app_name")
+        lane = self.app_lanes.get(app_name, self.lane)
+        user_id = payload.get("userId") or payload.get("user_id")
+        session_id = payload.get("sessionId") or payload.get("session_id")
+        client = (scope.get("client") or (None,))[0]
+
+        governor = get_governor()
+        try:
+            started_at = await governor.acquire(lane, user_id, session_id, client)
+        except AdmissionRejected as e:
+            await e.to_response()(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, replay_receive, send)
+        finally:
+            governor.release(lane, started_at)
@@ -0,0 +1,279 @@
+"""
+Lexical (BM25) Index.
+
+A question that names a school and a metric ("Rose-Hulman room and board")
+is matched perfectly well by its words. This is an inverted index over the
+chunks the vector index holds (record_chunks: section and field-group texts),
+each extended with its institution's aliases ("rose hulman", "로즈헐만") and
+scored with BM25.
+
+script/indexer.py writes it to LEXICAL_INDEX_PATH on every run. The
+query_college_info tool fuses its ranking with the vector ranking by
+reciprocal-rank fusion (RRF), and when the lexical match is confident (see
+LexicalIndex.is_confident) it skips the embedding call and the vector query
+altogether. `script/eval_retrieval.py --configs local_hybrid` reports how
+often that fast path fires and what it does to recall.
+
+Pure Python: serving it needs neither numpy nor the network.
+"""
+
+import json
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from .cds_records import JSON_DIR, load_records, matches_filter, record_chunks
+from .entities import institution_aliases, match_institutions
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", os.path.join(BASE_DIR, "data", "index", "lexical.json"))
+# Share of the query's words (weighted by idf) the best chunk has to contain to skip the vector search
+LEXICAL_FAST_PATH_MIN_COVERAGE = float(os.getenv("LEXICAL_FAST_PATH_MIN_COVERAGE", "0.8"))
+# ...and how far it has to outscore the best chunk about another institution or section
+LEXICAL_FAST_PATH_MIN_MARGIN = float(os.getenv("LEXICAL_FAST_PATH_MIN_MARGIN", "1.2"))
+# Rank constant of reciprocal-rank fusion; larger values flatten the head of each ranking
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+|[\uac00-\ud7a3]+")
+STOPWORDS = {
+    "a", "about", "an", "and", "are", "at", "by", "can", "do", "does", "for", "from", "how", "i",
+    "in", "is", "it", "me", "much", "my", "of", "on", "or", "tell", "than", "that", "the", "their",
+    "there", "this", "to", "was", "what", "whats", "when", "where", "which", "who", "with", "you",
+}
+
+
+def _stem(token: str) -> str:
+    """Folds plurals, so "scores" matches "Score" and "policies" matches "policy"."""
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word and Hangul tokens, plural-folded, without stopwords."""
+    return [_stem(token) for token in _TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+class LexicalIndex:
+    """BM25 over chunk texts, with the chunk metadata needed to return them like vector matches."""
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.metadata: List[Dict[str, Any]] = []
+        self.lengths: List[int] = []
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self._positions: Dict[str, int] = {}
+        self._institutions: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, chunks: List[Dict[str, Any]]) -> None:
+        """Indexes {"id", "text", "metadata"} chunks (record_chunks output) under their text and institution aliases."""
+        aliases: Dict[str, str] = {}
+        for chunk in chunks:
+            institution = chunk["metadata"].get("institution_name", "")
+            if institution not in aliases:
+                aliases[institution] = " ".join(institution_aliases(institution))
+            tokens = tokenize(f"{chunk['text']}\n{aliases[institution]}")
+            doc = len(self.ids)
+            self.ids.append(chunk["id"])
+            self.metadata.append(chunk["metadata"])
+            self.lengths.append(len(tokens))
+            self._positions[chunk["id"]] = doc
+            for token in tokens:
+                counts = self.postings.setdefault(token, {})
+                counts[doc] = counts.get(doc, 0) + 1
+        self._institutions = sorted({meta.get("institution_name", "") for meta in self.metadata} - {""})
+
+    @classmethod
+    def from_records(cls, records: Dict[str, Dict[str, Any]]) -> "LexicalIndex":
+        """Builds an index from {filename: record}, chunked exactly like the vector index."""
+        index = cls()
+        index.add([chunk for filename, record in records.items() for chunk in record_chunks(filename, record)])
+        return index
+
+    def idf(self, token: str) -> float:
+        df = len(self.postings.get(token, ()))
+        return math.log(1 + (len(self.ids) - df + 0.5) / (df + 0.5))
+
+    def search(
+        self, query: str, top_k: int = 5, metadata_filter: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[str, float, Dict[str, Any]]]:
+        """Returns (id, BM25 score, metadata) of the best top_k chunks matching the filter."""
+        if not self.ids:
+            return []
+        average_length = sum(self.lengths) / len(self.lengths)
+        scores: Dict[int, float] = {}
+        for token in set(tokenize(query)):
+            counts = self.postings.get(token)
+            if not counts:
+                continue
+            idf = self.idf(token)
+            for doc, tf in counts.items():
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[doc] / average_length)
+                scores[doc] = scores.get(doc, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+        ranked = sorted(scores.items(), key=lambda item: -item[1])
+        results = []
+        for doc, score in ranked:
+            if matches_filter(self.metadata[doc], metadata_filter):
+                results.append((self.ids[doc], score, self.metadata[doc]))
+                if len(results) >= top_k:
+                    break
+        return results
+
+    def query(
+        self, query: str, top_k: int = 5, metadata_filter: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """Same chunk format as the vector searches, scored by BM25."""
+        return [
+            {
+                "id": chunk_id,
+                "score": score,
+                "institution_name": meta.get("institution_name", "N/A"),
+                "section": meta.get("section", "N/A"),
+                "academic_year": meta.get("academic_year", "N/A"),
+                "source_file": meta.get("source_file", "N/A"),
+                "granularity": meta.get("granularity", "section"),
+                "field_group": meta.get("field_group"),
+                "parent_id": meta.get("parent_id"),
+                "text": meta.get("text", "N/A"),
+            }
+            for chunk_id, score, meta in self.search(query, top_k, metadata_filter)
+        ]
+
+    def is_confident(self, query: str, hits: List[Dict[str, Any]]) -> bool:
+        """
+        True when the best lexical hit can stand in for the vector search.
+
+        The query has to name the hit's institution, the hit has to contain
+        LEXICAL_FAST_PATH_MIN_COVERAGE of the query's words (weighted by idf;
+        words the index has never seen count against it with the highest
+        weight), and it has to outscore the best hit about another
+        institution or section by LEXICAL_FAST_PATH_MIN_MARGIN. Comparisons,
+        vague and Korean questions therefore go to the vector search.
+
+        Args:
+            hits: query() results for this query, best first.
+        """
+        if not hits or hits[0]["id"] not in self._positions:
+            return False
+        top = hits[0]
+        if top["institution_name"] not in match_institutions(query, self._institutions):
+            return False
+
+        terms = set(tokenize(query))
+        unseen_weight = self.idf("")
+        weights = {term: self.idf(term) if term in self.postings else unseen_weight for term in terms}
+        doc = self._positions[top["id"]]
+        covered = sum(weight for term, weight in weights.items() if doc in self.postings.get(term, {}))
+        if not weights or covered / sum(weights.values()) < LEXICAL_FAST_PATH_MIN_COVERAGE:
+            return False
+
+        topic = (top["institution_name"], top["section"])
+        runner_up = next((hit["score"] for hit in hits[1:] if (hit["institution_name"], hit["section"]) != topic), 0.0)
+        return top["score"] >= LEXICAL_FAST_PATH_MIN_MARGIN * runner_up
+
+    def save(self, path: str = LEXICAL_INDEX_PATH) -> None:
+        """Writes the index as one JSON file, replaced atomically so serving workers never read half of it."""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".lexical-", suffix=".json", dir=directory)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "ids": self.ids,
+                    "metadata": self.metadata,
+                    "lengths": self.lengths,
+                    "postings": {token: list(counts.items()) for token, counts in self.postings.items()},
+                },
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = LEXICAL_INDEX_PATH) -> "LexicalIndex":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls()
+        index.ids = data["ids"]
+        index.metadata = data["metadata"]
+        index.lengths = data["lengths"]
+        index.postings = {token: {doc: tf for doc, tf in counts} for token, counts in data["postings"].items()}
+        index._positions = {chunk_id: doc for doc, chunk_id in enumerate(index.ids)}
+        index._institutions = sorted({meta.get("institution_name", "") for meta in index.metadata} - {""})
+        return index
+
+
+def rescale(hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Lexical hits with their BM25 scores divided by the best one, for display as relevance."""
+    best = hits[0]["score"] if hits and hits[0]["score"] > 0 else 1.0
+    return [dict(hit, score=hit["score"] / best) for hit in hits]
+
+
+def reciprocal_rank_fusion(rankings: List[List[Dict[str, Any]]], k: int = RRF_K) -> List[Dict[str, Any]]:
+    """
+    Merges rankings of the same chunks by reciprocal-rank fusion.
+
+    Each chunk scores sum(1 / (k + rank)) over the rankings it appears in,
+    divided by the score of a chunk ranked first everywhere, so scores stay
+    within 0-1. Chunk fields come from the first ranking that has the chunk.
+    """
+    fused: Dict[str, List[Any]] = {}
+    for ranking in rankings:
+        for rank, chunk in enumerate(ranking, 1):
+            entry = fused.setdefault(chunk["id"], [0.0, chunk])
+            entry[0] += 1 / (k + rank)
+    best = len(rankings) / (k + 1)
+    merged = [dict(chunk, score=total / best) for total, chunk in fused.values()]
+    merged.sort(key=lambda chunk: -chunk["score"])
+    return merged
+
+
+def build_lexical_index(json_dir: str = JSON_DIR, path: str = LEXICAL_INDEX_PATH) -> LexicalIndex:
+    """Indexes every extracted record in json_dir and writes the index to path (run by script/indexer.py)."""
+    started = time.perf_counter()
+    index = LexicalIndex.from_records(load_records(json_dir))
+    index.save(path)
+    print(f"🔤 Wrote lexical index ({len(index)} chunks, {len(index.postings)} terms) to {path} in {time.perf_counter() - started:.2f}s")
+    return index
+
+
+_index: Optional[LexicalIndex] = None
+_index_mtime: Optional[int] = None
+_index_lock = threading.Lock()
+
+
+def get_lexical_index() -> Optional[LexicalIndex]:
+    """
+    The index at LEXICAL_INDEX_PATH, re-read after the indexer rewrote it.
+
+    Returns:
+        LexicalIndex, or None when the indexer has not built one yet.
+    """
+    global _index, _index_mtime
+    try:
+        mtime = os.stat(LEXICAL_INDEX_PATH).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    if mtime == _index_mtime:
+        return _index
+    with _index_lock:
+        if mtime != _index_mtime:
+            try:
+                _index = LexicalIndex.load(LEXICAL_INDEX_PATH)
+                print(f"🔤 Loaded lexical index ({len(_index)} chunks) from {LEXICAL_INDEX_PATH}")
+            except (OSError, ValueError, KeyError) as e:
+                print(f"❌ Failed to read the lexical index from {LEXICAL_INDEX_PATH}: {e}")
+            _index_mtime = mtime
+        return _index
@@ -0,0 +1,252 @@
+"""
+Pipeline Instrumentation.
+
+Per-stage latency histograms, token counters and gauges, exposed in the
+Prometheus text format by the /metrics route, plus one structured (JSON) log
+line per timed span so slow requests can be traced after the fact.
+
+Stages use short dotted names, e.g.:
+    llm.query_analysis_agent, llm.college_agent, llm.extract_pdf_agent,
+    embedding, embedding.attempt, vector_query, format_results,
+    pdf_extraction, chat.turn, indexer.embed, indexer.upsert
+
+Metrics are per process; with several uvicorn workers each worker serves
+its own values and Prometheus aggregates across scrape targets.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+logger = logging.getLogger("college_consultant.metrics")
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(os.getenv("METRICS_LOG_LEVEL", "INFO"))
+    logger.propagate = False
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    inner = ",".join(f'{k}="{v.replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for k, v in pairs)
+    return "{" + inner + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelKey, List[float]] = {}  # bucket counts..., sum, count
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_format_labels(key, ('le', str(bound)))} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {series[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {series[-1]}")
+        return lines
+
+
+# Collectors return (name, help, [(labels, value), ...]) gauges at scrape time
+GaugeCollector = Callable[[], List[Tuple[str, str, List[Tuple[Dict[str, Any], float]]]]]
+_collectors: List[GaugeCollector] = []
+
+STAGE_LATENCY = Histogram(
+    "college_stage_duration_seconds", "Latency of each pipeline stage in seconds."
+)
+STAGE_ERRORS = Counter("college_stage_errors_total", "Pipeline stage failures.")
+TOKENS = Counter(
+    "college_llm_tokens_total", "Gemini tokens by agent and kind (prompt, candidates, thoughts)."
+)
+LLM_CALLS = Counter("college_llm_calls_total", "Gemini model calls by agent.")
+EVENTS = Counter("college_events_total", "Notable pipeline events (cache hits, fallbacks, ...).")
+EMBEDDING_ATTEMPTS = Counter(
+    "college_embedding_attempts_total", "Embedding HTTP attempts by kind (primary, hedge, retry) and outcome."
+)
+CACHE_REQUESTS = Counter(
+    "college_cache_requests_total", "Shared cache lookups and failed writes by namespace and outcome (hit, miss, error)."
+)
+
+
+def register_collector(collector: GaugeCollector) -> None:
+    """Registers a callback that reports gauges when /metrics is scraped."""
+    _collectors.append(collector)
+
+
+def log_event(event: str, **fields) -> None:
+    """Writes one structured log line."""
+    logger.info(json.dumps({"event": event, "ts": round(time.time(), 3), **fields}, ensure_ascii=False, default=str))
+
+
+@contextmanager
+def span(stage: str, **fields):
+    """
+    Times a block as one pipeline stage.
+
+    Usable around sync or async code (the block may contain awaits).
+    """
+    started = time.perf_counter()
+    ok = True
+    try:
+        yield
+    except BaseException:
+        ok = False
+        raise
+    finally:
+        observe_stage(stage, time.perf_counter() - started, ok=ok, **fields)
+
+
+def observe_stage(stage: str, duration_seconds: float, ok: bool = True, **fields) -> None:
+    """Records a stage duration measured elsewhere."""
+    STAGE_LATENCY.observe(duration_seconds, stage=stage)
+    if not ok:
+        STAGE_ERRORS.inc(stage=stage)
+    log_event("span", stage=stage, duration_ms=round(duration_seconds * 1000, 2), ok=ok, **fields)
+
+
+def record_usage(agent: str, usage: Any) -> None:
+    """
+    Adds Gemini usage metadata to the token counters.
+
+    Accepts the GenerateContentResponseUsageMetadata object or the camelCase
+    dict found in recorded ADK event JSON.
+    """
+    if usage is None:
+        return
+    if isinstance(usage, dict):
+        counts = {
+            "prompt": usage.get("promptTokenCount"),
+            "candidates": usage.get("candidatesTokenCount"),
+            "thoughts": usage.get("thoughtsTokenCount"),
+        }
+    else:
+        counts = {
+            "prompt": usage.prompt_token_count,
+            "candidates": usage.candidates_token_count,
+            "thoughts": usage.thoughts_token_count,
+        }
+    for kind, value in counts.items():
+        if value:
+            TOKENS.inc(value, agent=agent, kind=kind)
+
+
+# --- ADK model callbacks: time every LLM call and count its tokens ---
+
+# A model call that raises never reaches after_model_callback, so its start
+# time is dropped once it is this old or the table is full
+LLM_SPAN_MAX_AGE_SECONDS = 900.0
+LLM_SPAN_MAX_ENTRIES = 4096
+
+_llm_started: Dict[Tuple[str, str], float] = {}
+_llm_started_lock = threading.Lock()
+
+
+def start_llm_span(callback_context, llm_request):
+    """before_model_callback: remembers when this agent's model call started."""
+    key = (callback_context.invocation_id, callback_context.agent_name)
+    now = time.perf_counter()
+    with _llm_started_lock:
+        # Re-inserted so the dict stays ordered by start time, oldest first
+        _llm_started.pop(key, None)
+        _llm_started[key] = now
+        while len(_llm_started) > LLM_SPAN_MAX_ENTRIES or now - next(iter(_llm_started.values())) > LLM_SPAN_MAX_AGE_SECONDS:
+            del _llm_started[next(iter(_llm_started))]
+    return None
+
+
+def end_llm_span(callback_context, llm_response):
+    """after_model_callback: records latency and token usage of the model call."""
+    if llm_response.partial:
+        return None
+    agent = callback_context.agent_name
+    with _llm_started_lock:
+        started = _llm_started.pop((callback_context.invocation_id, agent), None)
+    LLM_CALLS.inc(agent=agent)
+    if started is not None:
+        observe_stage(f"llm.{agent}", time.perf_counter() - started, invocation_id=callback_context.invocation_id)
+    record_usage(agent, llm_response.usage_metadata)
+    return None
+
+
+def stage_summary() -> Dict[str, Dict[str, float]]:
+    """Count, total and mean latency per stage, for CLI scripts that have no /metrics."""
+    summary = {}
+    with STAGE_LATENCY._lock:
+        for key, series in STAGE_LATENCY._series.items():
+            stage = dict(key).get("stage", "")
+            count, total = series[-1], series[-2]
+            summary[stage] = {
+                "count": int(count),
+                "total_seconds": round(total, 3),
+                "mean_ms": round(total / count * 1000, 2) if count else 0.0,
+            }
+    return summary
+
+
+def render_prometheus() -> str:
+    """Renders every metric in the Prometheus text exposition format."""
+    lines: List[str] = []
+    for metric in (STAGE_LATENCY, STAGE_ERRORS, TOKENS, LLM_CALLS, EVENTS, EMBEDDING_ATTEMPTS, CACHE_REQUESTS):
+        lines.extend(metric.render())
+    for collector in _collectors:
+        try:
+            gauges = collector()
+        except Exception as e:
+            print(f"❌ Metrics collector failed: {e}")
+            continue
+        for name, help_text, samples in gauges:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(_label_key(labels))} {value}")
+    return "\n".join(lines) + "\n"
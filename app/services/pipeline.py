@@ -0,0 +1,32 @@
+"""
+In-process College Consulting Pipeline Runner.
+
+Runs the college_agent pipeline directly inside the API process instead of
+looping back over HTTP to ADK's /run_sse. The runner shares the session
+service registered with the ADK web server, so sessions created through
+either path are visible to both.
+"""
+
+from typing import Optional
+
+from google.adk.runners import Runner
+
+from .sessions import get_session_service
+
+APP_NAME = "college_agent"
+
+_runner: Optional[Runner] = None
+
+
+def get_runner() -> Runner:
+    """Returns the process-wide runner for the college consulting pipeline."""
+    global _runner
+    if _runner is None:
+        from app.agents.college_agent.agent import get_root_agent
+
+        _runner = Runner(
+            app_name=APP_NAME,
+            agent=get_root_agent(),
+            session_service=get_session_service(),
+        )
+    return _runner
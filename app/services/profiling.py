@@ -0,0 +1,273 @@
+"""
+On-demand Request Profiling.
+
+Opt-in, per request: set PROFILING_ADMIN_TOKEN on the server and send the
+same token in an X-Profile header. A query parameter is not accepted: URLs
+end up in access logs and proxies, and the token would leak with them.
+While that request is handled, including a streamed response body:
+
+- a sampling profiler records the Python stack of every thread at a fixed
+  interval (event loop thread and worker threads alike), written as a
+  speedscope file (https://www.speedscope.app);
+- a task sampler on the event loop records which asyncio tasks are alive and
+  how late the loop wakes up, written in the Chrome trace event format
+  (open in https://ui.perfetto.dev). Gaps and lag spikes there mean blocking
+  code held the loop.
+
+Sampling is process-wide, so concurrent requests show up in the same profile;
+only one profile runs at a time. Files go to PROFILES_DIR and only the newest
+PROFILES_MAX_KEPT profiles are kept. The response carries X-Profile-Id.
+"""
+
+import asyncio
+import glob
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROFILING_ADMIN_TOKEN = os.getenv("PROFILING_ADMIN_TOKEN", "")
+PROFILES_DIR = os.getenv("PROFILES_DIR", os.path.join(BASE_DIR, "data", "profiles"))
+PROFILES_MAX_KEPT = int(os.getenv("PROFILES_MAX_KEPT", "20"))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+TASK_SAMPLE_INTERVAL_MS = float(os.getenv("TASK_SAMPLE_INTERVAL_MS", "10"))
+MAX_STACK_DEPTH = 128
+
+
+class StackSampler:
+    """Samples sys._current_frames() from a daemon thread."""
+
+    def __init__(self, interval_ms: float = PROFILE_SAMPLE_INTERVAL_MS):
+        self.interval = interval_ms / 1000
+        self.frames: List[Dict[str, Any]] = []
+        self._frame_index: Dict[Tuple[str, str, int], int] = {}
+        self.samples: Dict[int, List[Tuple[float, List[int]]]] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self.started = 0.0
+        self.stopped = 0.0
+
+    def _frame_id(self, code) -> int:
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        index = self._frame_index.get(key)
+        if index is None:
+            index = len(self.frames)
+            self._frame_index[key] = index
+            self.frames.append({"name": code.co_name, "file": code.co_filename, "line": code.co_firstlineno})
+        return index
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            weight = (now - last) * 1000
+            last = now
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    stack.append(self._frame_id(frame.f_code))
+                    frame = frame.f_back
+                stack.reverse()
+                self.samples.setdefault(thread_id, []).append((weight, stack))
+
+    def start(self) -> None:
+        self.started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.stopped = time.perf_counter()
+
+    def to_speedscope(self, name: str) -> Dict[str, Any]:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        profiles = []
+        for thread_id, samples in self.samples.items():
+            total = sum(weight for weight, _ in samples)
+            profiles.append({
+                "type": "sampled",
+                "name": f"{names.get(thread_id, 'thread')} ({thread_id})",
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": round(total, 3),
+                "samples": [stack for _, stack in samples],
+                "weights": [round(weight, 3) for weight, _ in samples],
+            })
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "college-consultant",
+            "shared": {"frames": self.frames},
+            "profiles": profiles,
+        }
+
+
+class TaskSampler:
+    """Records live asyncio tasks and event loop lag from a task on the loop itself."""
+
+    def __init__(self, interval_ms: float = TASK_SAMPLE_INTERVAL_MS):
+        self.interval = interval_ms / 1000
+        self.origin = time.perf_counter()
+        self.tasks: Dict[int, Dict[str, Any]] = {}
+        self.lag: List[Tuple[float, float]] = []
+        self._task: Optional[asyncio.Task] = None
+        self._expected = 0.0
+
+    def _us(self, t: float) -> int:
+        return int((t - self.origin) * 1e6)
+
+    async def _run(self) -> None:
+        me = asyncio.current_task()
+        while True:
+            self._expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            self.lag.append((now, max(0.0, now - self._expected) * 1000))
+            for task in asyncio.all_tasks():
+                if task is me:
+                    continue
+                entry = self.tasks.get(id(task))
+                if entry is None:
+                    coro = task.get_coro()
+                    self.tasks[id(task)] = {
+                        "name": task.get_name(),
+                        "coro": getattr(coro, "__qualname__", repr(coro)),
+                        "first": now,
+                        "last": now,
+                    }
+                else:
+                    entry["last"] = now
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._run(), name="request-profiler-tasks")
+
+    async def stop(self) -> None:
+        if self._task:
+            # A wake-up that is overdue when the request ends still counts as lag
+            now = time.perf_counter()
+            if now > self._expected:
+                self.lag.append((now, (now - self._expected) * 1000))
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def to_trace_events(self) -> Dict[str, Any]:
+        events: List[Dict[str, Any]] = []
+        for i, task in enumerate(sorted(self.tasks.values(), key=lambda t: t["first"])):
+            events.append({
+                "name": task["coro"],
+                "cat": "asyncio.task",
+                "ph": "X",
+                "ts": self._us(task["first"]),
+                "dur": max(1, self._us(task["last"]) - self._us(task["first"])),
+                "pid": 1,
+                "tid": task["name"],
+                "args": {"task": task["name"]},
+            })
+        for at, lag_ms in self.lag:
+            events.append({
+                "name": "event_loop_lag_ms",
+                "ph": "C",
+                "ts": self._us(at),
+                "pid": 1,
+                "args": {"lag_ms": round(lag_ms, 3)},
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+class RequestProfile:
+    """Runs both samplers for one request and writes the result files."""
+
+    def __init__(self, label: str):
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        self.label = label
+        self.stacks = StackSampler()
+        self.tasks = TaskSampler()
+
+    def start(self) -> None:
+        self.stacks.start()
+        self.tasks.start()
+
+    async def finish(self) -> List[str]:
+        self.stacks.stop()
+        await self.tasks.stop()
+        os.makedirs(PROFILES_DIR, exist_ok=True)
+        paths = [
+            (os.path.join(PROFILES_DIR, f"{self.id}.speedscope.json"), self.stacks.to_speedscope(self.label)),
+            (os.path.join(PROFILES_DIR, f"{self.id}.tasks.trace.json"), self.tasks.to_trace_events()),
+        ]
+        for path, payload in paths:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(payload, f)
+        prune_profiles()
+        duration = self.stacks.stopped - self.stacks.started
+        print(f"🔬 Profiled {self.label} in {duration:.2f}s -> {PROFILES_DIR}/{self.id}.*")
+        return [path for path, _ in paths]
+
+
+def prune_profiles(max_kept: int = PROFILES_MAX_KEPT) -> None:
+    """Keeps only the newest max_kept profiles (each profile is a pair of files)."""
+    speedscope_files = sorted(glob.glob(os.path.join(PROFILES_DIR, "*.speedscope.json")), key=os.path.getmtime)
+    for path in speedscope_files[:-max_kept] if max_kept > 0 else speedscope_files:
+        profile_id = os.path.basename(path).split(".")[0]
+        for stale in glob.glob(os.path.join(PROFILES_DIR, f"{profile_id}.*")):
+            os.remove(stale)
+
+
+def _requested_token(scope) -> str:
+    for name, value in scope.get("headers", []):
+        if name == b"x-profile":
+            return value.decode("latin-1")
+    return ""
+
+
+def _token_bytes(token: str) -> bytes:
+    return token.encode("utf-8", "surrogatepass")
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles requests carrying the admin profiling token."""
+
+    def __init__(self, app):
+        self.app = app
+        self._busy = threading.Lock()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not PROFILING_ADMIN_TOKEN:
+            await self.app(scope, receive, send)
+            return
+        token = _requested_token(scope)
+        # Compared as bytes: compare_digest raises TypeError on non-ASCII str
+        if not token or not hmac.compare_digest(_token_bytes(token), _token_bytes(PROFILING_ADMIN_TOKEN)):
+            await self.app(scope, receive, send)
+            return
+        if not self._busy.acquire(blocking=False):
+            print("⚠️ A profile is already running; serving this request unprofiled")
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(f"{scope['method']} {scope['path']}")
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", profile.id.encode())]}
+            await send(message)
+
+        try:
+            profile.start()
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            try:
+                await profile.finish()
+            finally:
+                self._busy.release()
@@ -0,0 +1,471 @@
+"""
+Local Repair of Extracted CDS Records.
+
+UniversityDataSchema keeps many numeric facts as free-form strings
+("percent_need_met": "100%", "student_faculty_ratio": "7:1"), and the model
+makes small format slips: a fraction where a percentage belongs (0.7336 for
+73.36%), "$59,076" in an integer field, "Jan 5" for an MM-DD deadline.
+Re-running the extraction for those is expensive, so every record goes
+through this stage when it is read (cds_records.load_record):
+
+1. normalize: parses each typed field and rewrites it in its canonical form
+   (percent strings "9.3%", ratios "7:1", deadlines "MM-DD" unless they carry
+   a qualifier like "(EA)", integers and booleans as JSON types), collecting
+   the parsed values as typed numbers for the checks below
+2. validate: range checks (percentages, SAT/ACT scales, GPA) and cross-field
+   consistency (admitted <= applicants, 25th <= 75th percentile, acceptance
+   rate = admitted / applicants); a rate stored as a fraction that matches
+   its counts once multiplied by 100 is repaired instead of reported
+
+Deadlines stay MM-DD in the record; the texts people and the index read
+render them with display_date() ("01-05" -> "January 5").
+
+Whatever still fails is listed in RepairResult.failures. script/extract_batch.py
+sends only those fields back to the LLM (repair_fields_agent), and the
+corrections it returns are appended to the event log and applied here on
+every read, before normalization.
+"""
+
+import copy
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+RECORD_REPAIR_ENABLED = os.getenv("RECORD_REPAIR_ENABLED", "true").lower() in ("1", "true", "yes")
+# Percentage points a stored rate may differ from the one computed from its counts
+RATE_TOLERANCE = 1.0
+# Author of the field-correction events script/extract_batch.py appends to an event log
+REPAIR_AUTHOR = "repair_fields_agent"
+
+PERCENT_FIELDS = [
+    "admissions_statistics.acceptance_rate",
+    "admissions_statistics.yield_rate",
+    "test_scores.submission_rate_sat",
+    "test_scores.submission_rate_act",
+    "high_school_profile.gpa_submission_rate",
+    "high_school_profile.class_rank_submission_rate",
+    "high_school_profile.percent_top_10",
+    "high_school_profile.percent_top_25",
+    "high_school_profile.percent_top_50",
+    "cost_and_financial_aid.financial_aid.percent_need_met",
+    "student_life_and_faculty.demographics.out_of_state_percent",
+    "student_life_and_faculty.demographics.international_percent",
+    "student_life_and_faculty.class_size_under_20_percent",
+]
+# Schema fields typed float; the others in PERCENT_FIELDS are strings like "45%"
+FLOAT_PERCENT_FIELDS = {"admissions_statistics.acceptance_rate", "admissions_statistics.yield_rate"}
+
+_COUNT_GROUPS = {
+    "admissions_statistics.applicants": ["total", "men", "women", "another_gender", "unknown_gender"],
+    "admissions_statistics.admitted": ["total", "men", "women", "another_gender", "unknown_gender"],
+    "admissions_statistics.enrolled": ["total", "full_time", "part_time"],
+    "admissions_statistics.waitlist": ["offered_spot", "accepted_spot", "admitted_from_waitlist"],
+    "test_scores.sat": ["composite_25th", "composite_50th", "composite_75th", "ebrw_25th", "ebrw_75th", "math_25th", "math_75th"],
+    "test_scores.act": ["composite_25th", "composite_50th", "composite_75th", "math_25th", "math_75th", "english_25th", "english_75th"],
+    "cost_and_financial_aid.expenses": [
+        "tuition_in_state", "tuition_out_of_state", "fees", "room_and_board", "books_and_supplies", "other_expenses",
+    ],
+}
+INT_FIELDS = [f"{group}.{name}" for group, names in _COUNT_GROUPS.items() for name in names] + [
+    "cost_and_financial_aid.financial_aid.average_need_based_package",
+    "student_life_and_faculty.undergraduate_enrollment",
+]
+_PLANS = ["early_decision_1", "early_decision_2", "early_action", "regular_decision"]
+BOOL_FIELDS = [
+    "admissions_statistics.waitlist.has_policy",
+    "cost_and_financial_aid.financial_aid.international_students_eligible",
+    "deadlines.transfer_admission.is_rolling",
+] + [f"deadlines.{plan}.is_binding" for plan in _PLANS]
+DEADLINE_FIELDS = [f"deadlines.{plan}.deadline" for plan in _PLANS] + ["deadlines.transfer_admission.deadline"]
+# Normalized to MM-DD when they hold a plain date; free text ("late March") is left alone
+NOTIFICATION_FIELDS = [f"deadlines.{plan}.notification_date" for plan in _PLANS]
+RATIO_FIELD = "student_life_and_faculty.student_faculty_ratio"
+GPA_FIELD = "high_school_profile.average_gpa"
+
+# (path prefix, low, high) for the SAT/ACT scales, first match wins
+SCORE_RANGES = [
+    ("test_scores.sat.composite_", 400, 1600),
+    ("test_scores.sat.", 200, 800),
+    ("test_scores.act.", 1, 36),
+]
+
+_MISSING = {"", "n/a", "na", "none", "null", "not reported", "not applicable", "unknown", "-", "—"}
+_NUMBER_RE = re.compile(r"[-+]?\d[\d,]*(?:\.\d+)?|[-+]?\.\d+")
+_MONTHS = {
+    name: number
+    for number, names in enumerate(
+        [
+            ("january", "jan"), ("february", "feb"), ("march", "mar"), ("april", "apr"), ("may",), ("june", "jun"),
+            ("july", "jul"), ("august", "aug"), ("september", "sep", "sept"), ("october", "oct"),
+            ("november", "nov"), ("december", "dec"),
+        ],
+        1,
+    )
+    for name in names
+}
+MONTH_NAMES = [
+    "January", "February", "March", "April", "May", "June",
+    "July", "August", "September", "October", "November", "December",
+]
+_MM_DD_RE = re.compile(r"^(\d{2})-(\d{2})$")
+_MONTH_NAME_RE = re.compile(r"\b([a-z]+)\.?\s+(\d{1,2})(?:st|nd|rd|th)?\b|\b(\d{1,2})(?:st|nd|rd|th)?\s+([a-z]+)\b")
+_ISO_DATE_RE = re.compile(r"^(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})$")
+_NUMERIC_DATE_RE = re.compile(r"^(\d{1,2})[-/.](\d{1,2})(?:[-/.](\d{2}|\d{4}))?$")
+# "Oct 15 / Nov 1", "Nov 1; Jan 1", "Nov 1 or Jan 1"; a slash without spaces is part of a date
+_DATE_LIST_SPLIT_RE = re.compile(r"\s+/\s+|\s*;\s*|\s+or\s+|\s+and\s+|,\s*(?=[a-z])")
+
+
+class RepairError(ValueError):
+    """A field value that cannot be parsed into its type."""
+
+
+def _is_missing(value: Any) -> bool:
+    return value is None or (isinstance(value, str) and value.strip().lower() in _MISSING) or value == []
+
+
+def parse_number(value: Any) -> Optional[float]:
+    """The one number in value ("$59,076", "1,234", "about 12"), None for missing values."""
+    if _is_missing(value):
+        return None
+    if isinstance(value, bool):
+        raise RepairError(f"expected a number, got {value!r}")
+    if isinstance(value, (int, float)):
+        return float(value)
+    numbers = _NUMBER_RE.findall(str(value))
+    if len(numbers) != 1:
+        raise RepairError(f"expected one number, got {value!r}")
+    return float(numbers[0].replace(",", ""))
+
+
+def parse_int(value: Any) -> Optional[int]:
+    number = parse_number(value)
+    if number is None:
+        return None
+    if abs(number - round(number)) > 0.01:
+        raise RepairError(f"expected a whole number, got {value!r}")
+    return int(round(number))
+
+
+def parse_percent(value: Any) -> Optional[float]:
+    """
+    A percentage as a number of percent: "45%", "45 percent", 45 -> 45.0.
+
+    A bare decimal fraction without a percent sign ("0.45") is read as 45%.
+    Numbers stored as JSON numbers are taken as they are; whether 0.7 means
+    0.7% or 70% is decided by validate() from the counts behind the rate.
+    """
+    number = parse_number(value)
+    if number is None:
+        return None
+    if isinstance(value, str) and "%" not in value and "percent" not in value.lower() and "." in value and 0 < number < 1:
+        number *= 100
+    return number
+
+
+def parse_ratio(value: Any) -> Optional[float]:
+    """Students per faculty member: "7:1", "7 to 1", "7" -> 7.0."""
+    if _is_missing(value):
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    numbers = [float(n.replace(",", "")) for n in _NUMBER_RE.findall(str(value))]
+    if len(numbers) == 1:
+        return numbers[0]
+    if len(numbers) == 2 and numbers[1] > 0:
+        return numbers[0] / numbers[1]
+    raise RepairError(f"expected a ratio like '7:1', got {value!r}")
+
+
+def parse_bool(value: Any) -> Optional[bool]:
+    if _is_missing(value):
+        return None
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in ("yes", "y", "true", "1"):
+        return True
+    if text in ("no", "n", "false", "0"):
+        return False
+    raise RepairError(f"expected yes or no, got {value!r}")
+
+
+def _month_day(month: int, day: int, original: str) -> str:
+    if not 1 <= month <= 12 or not 1 <= day <= 31:
+        raise RepairError(f"not a date: {original!r}")
+    return f"{month:02d}-{day:02d}"
+
+
+def _parse_one_date(text: str) -> str:
+    iso = _ISO_DATE_RE.match(text)
+    if iso:
+        return _month_day(int(iso.group(2)), int(iso.group(3)), text)
+    numeric = _NUMERIC_DATE_RE.match(text)
+    if numeric:
+        # CDS files are American: month first
+        return _month_day(int(numeric.group(1)), int(numeric.group(2)), text)
+    for match in _MONTH_NAME_RE.finditer(text):
+        name, day = (match.group(1), match.group(2)) if match.group(1) else (match.group(4), match.group(3))
+        if name in _MONTHS:
+            return _month_day(_MONTHS[name], int(day), text)
+    raise RepairError(f"expected a date like 'MM-DD', got {text!r}")
+
+
+def _qualifier(text: str) -> str:
+    """What a date says besides the month and day: "nov 1 (ea)" -> "(ea)", "jan 8, 2025" -> ""."""
+    if _ISO_DATE_RE.match(text) or _NUMERIC_DATE_RE.match(text):
+        return ""
+    for match in _MONTH_NAME_RE.finditer(text):
+        if (match.group(1) or match.group(4)) in _MONTHS:
+            rest = text[: match.start()] + text[match.end():]
+            return re.sub(r"(?<!\d)20\d{2}(?!\d)|[\s,.]", "", rest)
+    return ""
+
+
+def parse_deadline(value: Any) -> Optional[str]:
+    """
+    A deadline in the schema's MM-DD format.
+
+    "January 8", "Jan. 8th", "1/8", "2025-01-08" -> "01-08"; several dates
+    ("Oct 15 / Nov 1") -> "10-15 / 11-01"; "Rolling" stays "Rolling".
+    Values that say more than the dates ("Nov 1 (EA)", "January 1 (priority),
+    February 1 (final)") are checked but kept as written, qualifiers included.
+    """
+    if _is_missing(value):
+        return None
+    text = str(value).strip().lower()
+    if "rolling" in text:
+        return "Rolling"
+    parts = [part.strip() for part in _DATE_LIST_SPLIT_RE.split(text) if part.strip()]
+    dates = " / ".join(_parse_one_date(part) for part in parts)
+    if any(_qualifier(part) for part in parts):
+        return str(value).strip()
+    return dates
+
+
+def display_date(value: Any) -> Any:
+    """
+    Renders MM-DD dates for people: "01-05" -> "January 5",
+    "10-15 / 11-01" -> "October 15 / November 1". Anything else is returned as is.
+    """
+    if not isinstance(value, str):
+        return value
+    rendered = []
+    for part in value.split(" / "):
+        match = _MM_DD_RE.match(part.strip())
+        if not match or not 1 <= int(match.group(1)) <= 12:
+            return value
+        rendered.append(f"{MONTH_NAMES[int(match.group(1)) - 1]} {int(match.group(2))}")
+    return " / ".join(rendered)
+
+
+def display_deadlines(section: Any) -> Any:
+    """A copy of a deadlines section with its MM-DD dates rendered by display_date()."""
+    if not isinstance(section, dict):
+        return section
+    record = {"deadlines": copy.deepcopy(section)}
+    for path in DEADLINE_FIELDS + NOTIFICATION_FIELDS:
+        value = get_path(record, path)
+        if value is not None:
+            set_path(record, path, display_date(value))
+    return record["deadlines"]
+
+
+def format_percent(number: float) -> str:
+    return f"{round(number, 2):g}%"
+
+
+def format_ratio(number: float) -> str:
+    return f"{round(number, 1):g}:1"
+
+
+def get_path(record: Dict[str, Any], path: str) -> Any:
+    value: Any = record
+    for key in path.split("."):
+        value = value.get(key) if isinstance(value, dict) else None
+    return value
+
+
+def set_path(record: Dict[str, Any], path: str, value: Any) -> None:
+    *parents, last = path.split(".")
+    node = record
+    for key in parents:
+        if not isinstance(node.get(key), dict):
+            node[key] = {}
+        node = node[key]
+    node[last] = value
+
+
+@dataclass
+class RepairResult:
+    """A normalized record and what it took to get there."""
+
+    record: Dict[str, Any]
+    # {"path", "from", "to"} per rewritten field
+    changes: List[Dict[str, Any]] = field(default_factory=list)
+    # {"path", "value", "reason"} per field that is still wrong
+    failures: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def failing_paths(self) -> List[str]:
+        return sorted({failure["path"] for failure in self.failures})
+
+
+class _Repair:
+    def __init__(self, record: Dict[str, Any]):
+        self.record = copy.deepcopy(record)
+        self.numeric: Dict[str, float] = {}
+        self.result = RepairResult(self.record)
+
+    def fail(self, path: str, reason: str) -> None:
+        self.numeric.pop(path, None)
+        self.result.failures.append({"path": path, "value": get_path(self.record, path), "reason": reason})
+
+    def rewrite(self, path: str, value: Any) -> None:
+        current = get_path(self.record, path)
+        if current != value or type(current) is not type(value):
+            self.result.changes.append({"path": path, "from": current, "to": value})
+            set_path(self.record, path, value)
+
+    def normalize(self, path: str, parse, render=None, numeric: bool = True) -> None:
+        original = get_path(self.record, path)
+        if original is None:
+            return
+        try:
+            parsed = parse(original)
+        except RepairError as e:
+            self.fail(path, str(e))
+            return
+        self.rewrite(path, render(parsed) if render and parsed is not None else parsed)
+        if numeric and parsed is not None:
+            self.numeric[path] = parsed
+
+    def run(self) -> RepairResult:
+        for path in PERCENT_FIELDS:
+            self.normalize(path, parse_percent, None if path in FLOAT_PERCENT_FIELDS else format_percent)
+        for path in INT_FIELDS:
+            self.normalize(path, parse_int)
+        for path in BOOL_FIELDS:
+            self.normalize(path, parse_bool, numeric=False)
+        for path in DEADLINE_FIELDS:
+            self.normalize(path, parse_deadline, numeric=False)
+        for path in NOTIFICATION_FIELDS:
+            if _is_date_like(get_path(self.record, path)):
+                self.normalize(path, parse_deadline, numeric=False)
+        self.normalize(RATIO_FIELD, parse_ratio, format_ratio)
+        self.normalize(GPA_FIELD, parse_number)
+        self.validate()
+        return self.result
+
+    def validate(self) -> None:
+        n = self.numeric
+        for path in PERCENT_FIELDS:
+            if path in n and not 0 <= n[path] <= 100:
+                self.fail(path, f"percentage {n[path]:g} is outside 0-100")
+        for path in [p for p in n if p.startswith(("test_scores.sat.", "test_scores.act."))]:
+            low, high = next((low, high) for prefix, low, high in SCORE_RANGES if path.startswith(prefix))
+            if not low <= n[path] <= high:
+                self.fail(path, f"score {n[path]:g} is outside {low}-{high}")
+        if GPA_FIELD in n and not 0 < n[GPA_FIELD] <= 5:
+            self.fail(GPA_FIELD, f"GPA {n[GPA_FIELD]:g} is outside 0-5")
+        if RATIO_FIELD in n and n[RATIO_FIELD] <= 0:
+            self.fail(RATIO_FIELD, "ratio has to be positive")
+
+        stats = "admissions_statistics"
+        self._at_most(f"{stats}.admitted.total", f"{stats}.applicants.total")
+        self._at_most(f"{stats}.enrolled.total", f"{stats}.admitted.total")
+        self._at_most(f"{stats}.waitlist.accepted_spot", f"{stats}.waitlist.offered_spot")
+        self._at_most(f"{stats}.waitlist.admitted_from_waitlist", f"{stats}.waitlist.accepted_spot")
+        for group in ("applicants", "admitted"):
+            parts = [f"{stats}.{group}.{name}" for name in ("men", "women", "another_gender", "unknown_gender")]
+            total = f"{stats}.{group}.total"
+            if total in n and sum(n.get(part, 0) for part in parts) > n[total]:
+                self.fail(total, f"{group} by gender add up to more than the total {n[total]:g}")
+        for scores in ("test_scores.sat", "test_scores.act"):
+            for kind in ("composite", "ebrw", "math", "english"):
+                self._at_most(f"{scores}.{kind}_25th", f"{scores}.{kind}_50th")
+                self._at_most(f"{scores}.{kind}_50th", f"{scores}.{kind}_75th")
+                self._at_most(f"{scores}.{kind}_25th", f"{scores}.{kind}_75th")
+        self._rate(f"{stats}.acceptance_rate", f"{stats}.admitted.total", f"{stats}.applicants.total")
+        self._rate(f"{stats}.yield_rate", f"{stats}.enrolled.total", f"{stats}.admitted.total")
+
+    def _at_most(self, smaller: str, larger: str) -> None:
+        n = self.numeric
+        if smaller in n and larger in n and n[smaller] > n[larger]:
+            reason = f"{smaller} ({n[smaller]:g}) is larger than {larger} ({n[larger]:g})"
+            self.fail(smaller, reason)
+            self.fail(larger, reason)
+
+    def _rate(self, path: str, part: str, whole: str) -> None:
+        """Checks a rate against its counts; a fraction that matches once multiplied by 100 is repaired."""
+        n = self.numeric
+        if path not in n or not n.get(whole) or part not in n or n[part] > n[whole]:
+            return
+        expected = 100 * n[part] / n[whole]
+        if abs(n[path] - expected) <= RATE_TOLERANCE:
+            return
+        if abs(n[path] * 100 - expected) <= RATE_TOLERANCE:
+            self.rewrite(path, round(n[path] * 100, 4))
+            n[path] = get_path(self.record, path)
+            return
+        self.fail(path, f"{n[path]:g}% does not match {part} / {whole} = {expected:.2f}%")
+
+
+def _is_date_like(value: Any) -> bool:
+    if not isinstance(value, str):
+        return False
+    text = value.strip().lower()
+    return bool(_ISO_DATE_RE.match(text) or _NUMERIC_DATE_RE.match(text) or re.fullmatch(r"[a-z]+\.?\s+\d{1,2}(?:st|nd|rd|th)?", text))
+
+
+def repair_record(record: Dict[str, Any]) -> RepairResult:
+    """
+    Normalizes and validates one structured record (the input is not modified).
+
+    Returns:
+        RepairResult: The normalized record, the fields rewritten and the
+            fields that failed.
+    """
+    return _Repair(record).run()
+
+
+def extract_field_corrections(events: Any) -> List[Dict[str, Any]]:
+    """The {"path", "value"} corrections repair_fields_agent added to an event log, oldest first."""
+    corrections: List[Dict[str, Any]] = []
+    if not isinstance(events, list):
+        return corrections
+    for event in events:
+        if not isinstance(event, dict) or event.get("author") != REPAIR_AUTHOR:
+            continue
+        for part in (event.get("content") or {}).get("parts", []):
+            response = (part.get("functionResponse") or {}).get("response") or (part.get("functionCall") or {}).get("args")
+            text = part.get("text", "").strip()
+            if response is None and text.startswith("{") and not part.get("thought"):
+                try:
+                    response = json.loads(text)
+                except json.JSONDecodeError:
+                    continue
+            if isinstance(response, dict):
+                corrections.extend(c for c in response.get("corrections") or [] if isinstance(c, dict) and c.get("path"))
+    return corrections
+
+
+def apply_corrections(record: Dict[str, Any], corrections: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """A copy of record with the corrected values set (later corrections of a path win)."""
+    if not corrections:
+        return record
+    record = copy.deepcopy(record)
+    for correction in corrections:
+        set_path(record, correction["path"], correction.get("value"))
+    return record
+
+
+def describe_failures(failures: List[Dict[str, Any]]) -> str:
+    """The failing fields as a JSON list for the repair prompt."""
+    return json.dumps(
+        [{"path": f["path"], "extracted_value": f["value"], "problem": f["reason"]} for f in failures],
+        ensure_ascii=False,
+        indent=1,
+        default=str,
+    )
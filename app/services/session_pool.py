@@ -0,0 +1,147 @@
+"""
+Chat Session Pre-creation Pool.
+
+POST /chat/session used to create each session on demand, through a loopback
+HTTP call to the ADK server, before the first message could go out. Each
+worker now keeps SESSION_POOL_SIZE empty college_agent sessions ready in the
+shared session database:
+
+- acquire() hands out a ready session id at once and wakes the refiller;
+  when the pool is empty it creates the session directly (no HTTP)
+- the refiller tops the pool up in the background, one session at a time
+- ready sessions older than SESSION_POOL_MAX_AGE_SECONDS are deleted and
+  replaced, so unused ones never reach the idle-session sweep
+- on shutdown the sessions still in the pool are deleted
+
+Pooled sessions are ordinary empty sessions, so any worker can serve a
+session another worker handed out.
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+from .metrics import EVENTS, register_collector
+from .sessions import get_session_service
+
+SESSION_POOL_SIZE = int(os.getenv("SESSION_POOL_SIZE", "8"))
+SESSION_POOL_MAX_AGE_SECONDS = float(os.getenv("SESSION_POOL_MAX_AGE_SECONDS", "1800"))
+# The refiller also wakes up this often to expire old sessions
+SESSION_POOL_CHECK_INTERVAL_SECONDS = float(os.getenv("SESSION_POOL_CHECK_INTERVAL_SECONDS", "60"))
+# Wait after a failed refill before trying again
+SESSION_POOL_RETRY_SECONDS = 5.0
+
+APP_NAME = "college_agent"
+USER_ID = "user"  # Future: integrate with authentication
+
+
+class SessionPool:
+    """Empty sessions created ahead of time for one app and user."""
+
+    def __init__(
+        self,
+        app_name: str = APP_NAME,
+        user_id: str = USER_ID,
+        size: int = SESSION_POOL_SIZE,
+        max_age_seconds: float = SESSION_POOL_MAX_AGE_SECONDS,
+    ):
+        self.app_name = app_name
+        self.user_id = user_id
+        self.size = size
+        self.max_age_seconds = max_age_seconds
+        self._ready: Deque[Tuple[str, float]] = deque()
+        self._wake = asyncio.Event()
+        self.handed_out = 0
+        self.created_on_demand = 0
+
+    def __len__(self) -> int:
+        return len(self._ready)
+
+    async def _create(self) -> str:
+        session = await get_session_service().create_session(app_name=self.app_name, user_id=self.user_id)
+        return session.id
+
+    async def _delete(self, session_id: str) -> None:
+        try:
+            await get_session_service().delete_session(
+                app_name=self.app_name, user_id=self.user_id, session_id=session_id
+            )
+        except Exception as e:
+            print(f"❌ Failed to delete pooled session {session_id}: {e}")
+
+    async def acquire(self) -> str:
+        """Returns the id of a new, empty session: from the pool, else created now."""
+        self._wake.set()
+        # Newest first: expired sessions collect at the old end, where the refiller deletes them
+        if self._ready and time.time() - self._ready[-1][1] < self.max_age_seconds:
+            session_id, _ = self._ready.pop()
+            self.handed_out += 1
+            EVENTS.inc(event="session_pool_hit")
+            return session_id
+        self.created_on_demand += 1
+        EVENTS.inc(event="session_pool_miss")
+        return await self._create()
+
+    async def _expire(self) -> None:
+        cutoff = time.time() - self.max_age_seconds
+        while self._ready and self._ready[0][1] <= cutoff:
+            session_id, _ = self._ready.popleft()
+            await self._delete(session_id)
+
+    async def run(self) -> None:
+        """Background loop: expires old sessions and keeps the pool full."""
+        if self.size <= 0:
+            return
+        while True:
+            self._wake.clear()
+            try:
+                await self._expire()
+                while len(self._ready) < self.size:
+                    self._ready.append((await self._create(), time.time()))
+            except Exception as e:
+                print(f"❌ Failed to refill the session pool: {e}")
+                await asyncio.sleep(SESSION_POOL_RETRY_SECONDS)
+                continue
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=SESSION_POOL_CHECK_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def drain(self) -> int:
+        """Deletes the sessions still waiting in the pool (on shutdown)."""
+        drained = 0
+        while self._ready:
+            session_id, _ = self._ready.popleft()
+            await self._delete(session_id)
+            drained += 1
+        return drained
+
+    def snapshot(self) -> Dict[str, int]:
+        return {
+            "ready": len(self._ready),
+            "size": self.size,
+            "handed_out": self.handed_out,
+            "created_on_demand": self.created_on_demand,
+        }
+
+
+_pool: Optional[SessionPool] = None
+
+
+def get_session_pool() -> SessionPool:
+    """Returns the worker's session pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        _pool = SessionPool()
+    return _pool
+
+
+def _pool_gauges():
+    if _pool is None:
+        return []
+    return [("college_session_pool_ready", "Pre-created chat sessions ready to hand out.", [({}, len(_pool))])]
+
+
+register_collector(_pool_gauges)
@@ -0,0 +1,263 @@
+"""
+Persistent Session Service with History Compaction.
+
+Chat sessions are stored in a single SQLite database so they survive restarts
+and can be shared by every uvicorn worker on the host. To keep the per-turn
+prompt size flat, the history is compacted whenever a new user turn starts:
+
+1. Only the most recent turns are kept verbatim.
+2. Older turns are folded into a short extractive summary that is stored in
+   session state under 'conversation_summary' and injected into the agent
+   instructions via the {conversation_summary?} placeholder.
+3. Thought parts, thought signatures and oversized tool payloads are pruned
+   from previous turns (the current turn is never touched, because Gemini
+   validates thought signatures of the in-flight turn).
+
+Idle sessions are removed by expire_idle_sessions(), which the app runs
+periodically in the background.
+"""
+
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional
+
+from google.adk.cli.service_registry import get_service_registry
+from google.adk.events import Event
+from google.adk.sessions import Session
+from google.adk.sessions.sqlite_session_service import SqliteSessionService
+
+# Storage configuration
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SESSION_DB_PATH = os.getenv(
+    "SESSION_DB_PATH", os.path.join(BASE_DIR, "data", "sessions", "sessions.db")
+)
+SESSION_URI_SCHEME = "college-sqlite"
+SESSION_SERVICE_URI = f"{SESSION_URI_SCHEME}://{SESSION_DB_PATH}"
+
+# History bounds
+KEEP_RECENT_TURNS = int(os.getenv("SESSION_KEEP_RECENT_TURNS", "3"))
+SUMMARY_MAX_CHARS = int(os.getenv("SESSION_SUMMARY_MAX_CHARS", "1500"))
+TOOL_PAYLOAD_MAX_CHARS = int(os.getenv("SESSION_TOOL_PAYLOAD_MAX_CHARS", "800"))
+# Appended to a clipped tool payload; payloads ending with it are left alone on later turns
+PRUNED_MARKER = " …[pruned]"
+SESSION_IDLE_TTL_SECONDS = int(os.getenv("SESSION_IDLE_TTL_SECONDS", str(24 * 3600)))
+SESSION_SWEEP_INTERVAL_SECONDS = int(os.getenv("SESSION_SWEEP_INTERVAL_SECONDS", "600"))
+
+SUMMARY_STATE_KEY = "conversation_summary"
+ANSWER_AUTHOR = "college_agent"
+
+
+class CompactingSqliteSessionService(SqliteSessionService):
+    """
+    SQLite session service that bounds the stored history of each session.
+
+    Compaction runs when a user event is appended, i.e. once per turn and
+    before any agent of that turn builds its LLM request.
+    """
+
+    def __init__(self, db_path: str):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        super().__init__(db_path=db_path)
+        # WAL lets several worker processes read while one of them writes.
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        if not event.partial and event.author == "user" and event.content:
+            await self._compact_history(session, event)
+        return await super().append_event(session, event)
+
+    async def _compact_history(self, session: Session, user_event: Event) -> None:
+        """Summarizes old turns and prunes the turns that are kept verbatim."""
+        turns = _group_turns(session.events)
+        if not turns:
+            return
+
+        compacted = turns[:-KEEP_RECENT_TURNS] if len(turns) > KEEP_RECENT_TURNS else []
+        kept = turns[len(compacted):]
+
+        removed_ids = [e.id for turn in compacted for e in turn]
+        pruned_events: Dict[str, Event] = {}
+        for turn in kept:
+            for e in turn:
+                pruned = _prune_event(e)
+                if pruned is not None:
+                    pruned_events[e.id] = pruned
+
+        if compacted:
+            summary = _merge_summary(
+                session.state.get(SUMMARY_STATE_KEY, ""),
+                [_summarize_turn(turn) for turn in compacted],
+            )
+            user_event.actions.state_delta[SUMMARY_STATE_KEY] = summary
+
+        if not removed_ids and not pruned_events:
+            return
+
+        async with self._get_db_connection() as db:
+            if removed_ids:
+                placeholders = ",".join("?" for _ in removed_ids)
+                await db.execute(
+                    f"DELETE FROM events WHERE app_name=? AND user_id=? AND session_id=? AND id IN ({placeholders})",
+                    (session.app_name, session.user_id, session.id, *removed_ids),
+                )
+            for event_id, pruned in pruned_events.items():
+                await db.execute(
+                    "UPDATE events SET event_data=? WHERE app_name=? AND user_id=? AND session_id=? AND id=?",
+                    (
+                        pruned.model_dump_json(exclude_none=True),
+                        session.app_name,
+                        session.user_id,
+                        session.id,
+                        event_id,
+                    ),
+                )
+            await db.commit()
+
+        # Mirror the compaction on the in-memory session used by this turn
+        removed = set(removed_ids)
+        session.events = [
+            pruned_events.get(e.id, e) for e in session.events if e.id not in removed
+        ]
+
+    async def expire_idle_sessions(self, max_idle_seconds: int = SESSION_IDLE_TTL_SECONDS) -> int:
+        """
+        Delete sessions that have not been updated for max_idle_seconds.
+
+        Events are removed through the ON DELETE CASCADE foreign key.
+
+        Returns:
+            int: Number of sessions deleted.
+        """
+        cutoff = time.time() - max_idle_seconds
+        async with self._get_db_connection() as db:
+            cursor = await db.execute("DELETE FROM sessions WHERE update_time < ?", (cutoff,))
+            await db.commit()
+            return cursor.rowcount or 0
+
+
+def _group_turns(events: List[Event]) -> List[List[Event]]:
+    """Groups session events into turns, one per invocation."""
+    turns: List[List[Event]] = []
+    index: Dict[str, int] = {}
+    for e in events:
+        if e.invocation_id not in index:
+            index[e.invocation_id] = len(turns)
+            turns.append([])
+        turns[index[e.invocation_id]].append(e)
+    return turns
+
+
+def _text_of(event: Event) -> str:
+    """Returns the visible (non-thought) text of an event."""
+    if not event.content or not event.content.parts:
+        return ""
+    return "".join(p.text for p in event.content.parts if p.text and not p.thought).strip()
+
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[: limit - 1] + "…"
+
+
+def _summarize_turn(turn: List[Event]) -> str:
+    """Builds a one-entry extractive summary of a finished turn."""
+    question = next((_text_of(e) for e in turn if e.author == "user" and _text_of(e)), "")
+    answer = ""
+    for e in turn:
+        if e.author == ANSWER_AUTHOR and _text_of(e):
+            answer = _text_of(e)
+    return f"- User: {_clip(question, 160)}\n  Answer: {_clip(answer, 240) or 'N/A'}"
+
+
+def _merge_summary(previous: str, entries: List[str]) -> str:
+    """Appends new entries and keeps only the most recent SUMMARY_MAX_CHARS."""
+    lines = [previous] if previous else []
+    lines.extend(entries)
+    summary = "\n".join(lines)
+    if len(summary) <= SUMMARY_MAX_CHARS:
+        return summary
+    # Drop whole entries from the front so the summary stays readable
+    tail = summary[-SUMMARY_MAX_CHARS:]
+    cut = tail.find("\n- User:")
+    return tail[cut + 1:] if cut != -1 else tail
+
+
+def _clip_tool_payload(response: Dict[str, Any]) -> Optional[str]:
+    """
+    Clips an oversized tool response to TOOL_PAYLOAD_MAX_CHARS.
+
+    A {"result": "<text>"} response is clipped as text, anything else as its
+    JSON dump, so a payload pruned on an earlier turn is not wrapped again.
+
+    Returns:
+        The clipped text, or None when the response is small enough or already pruned.
+    """
+    result = response.get("result")
+    if len(response) == 1 and isinstance(result, str):
+        text = result
+    else:
+        text = json.dumps(response, ensure_ascii=False)
+    if text.endswith(PRUNED_MARKER) or len(text) <= TOOL_PAYLOAD_MAX_CHARS:
+        return None
+    return text[:TOOL_PAYLOAD_MAX_CHARS] + PRUNED_MARKER
+
+
+def _prune_event(event: Event) -> Optional[Event]:
+    """
+    Strips thoughts and oversized tool payloads from a past event.
+
+    Returns:
+        The pruned copy, or None when the event needs no change.
+    """
+    if not event.content or not event.content.parts:
+        return None
+
+    changed = False
+    pruned = event.model_copy(deep=True)
+    parts = []
+    for part in pruned.content.parts:
+        if part.thought:
+            changed = True
+            continue
+        if part.thought_signature is not None:
+            part.thought_signature = None
+            changed = True
+        if part.function_response is not None and part.function_response.response:
+            clipped = _clip_tool_payload(part.function_response.response)
+            if clipped is not None:
+                part.function_response.response = {"result": clipped}
+                changed = True
+        parts.append(part)
+
+    if not changed:
+        return None
+    pruned.content = pruned.content.model_copy(update={"parts": parts}) if parts else None
+    return pruned
+
+
+# Single instance shared by the ADK web server and our own routers
+_session_service: Optional[CompactingSqliteSessionService] = None
+
+
+def get_session_service() -> CompactingSqliteSessionService:
+    """Returns the process-wide session service, creating it on first use."""
+    global _session_service
+    if _session_service is None:
+        _session_service = CompactingSqliteSessionService(SESSION_DB_PATH)
+    return _session_service
+
+
+def register_session_service() -> str:
+    """
+    Register the compacting SQLite service with ADK's service registry.
+
+    Returns:
+        str: The session service URI to pass to get_fast_api_app.
+    """
+    get_service_registry().register_session_service(
+        SESSION_URI_SCHEME, lambda uri, **kwargs: get_session_service()
+    )
+    return SESSION_SERVICE_URI
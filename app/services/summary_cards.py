@@ -0,0 +1,417 @@
+"""
+Institution Summary Cards.
+
+"Tell me about Hamilton College" is one of the most common questions, and
+through the full pipeline it costs query analysis, a vector search over every
+section and a long generation. Instead, every institution gets a compact
+summary card per language (English and Korean), rendered from its latest
+UniversityDataSchema record with fixed templates, no LLM involved.
+
+Cards are stored in SUMMARY_CARD_PATH with a digest of the record (and of the
+templates) they were rendered from. update_cards() re-renders only the cards
+whose record changed; the indexer calls it after every run and the upload
+route after every extraction, and every worker once at startup (warm-up).
+get_card() serves the stored card and renders a missing one on first use.
+
+Overview questions are recognized by is_overview_question(); the chat stream
+answers them from the card directly, and college_agent can fetch a card with
+the get_institution_summary tool.
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from .cds_records import JSON_DIR, load_records, record_year
+from .entities import detect_academic_years, detect_sections, institution_aliases, match_institutions
+from .fact_store import FactStore, get_fact_store
+from .metrics import EVENTS
+from .record_repair import display_date
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SUMMARY_CARD_PATH = os.getenv("SUMMARY_CARD_PATH", os.path.join(BASE_DIR, "data", "cards", "summary_cards.json"))
+SUMMARY_CARDS_ENABLED = os.getenv("SUMMARY_CARDS_ENABLED", "true").lower() in ("1", "true", "yes")
+# Bump when the templates below change, so every stored card is re-rendered
+CARD_TEMPLATE_VERSION = "4"
+LANGUAGES = ("en", "ko")
+
+# Phrases that ask for a general picture of one school rather than a particular fact
+OVERVIEW_KEYWORDS = [
+    "tell me about", "overview", "summary of", "summarize", "introduce", "introduction to",
+    "what is it like", "information about", "info about", "info on", "learn about",
+]
+OVERVIEW_KEYWORDS_KO = ["알려줘", "알려 줘", "알려주세요", "소개", "어때", "어떤 학교", "요약", "정보", "대해"]
+# Words that may surround an overview phrase without naming a topic; anything
+# else left in the message ("computer science major", "기숙사") is a topic
+OVERVIEW_FILLER_WORDS = {
+    "a", "an", "the", "me", "us", "i", "you", "can", "could", "would", "will", "please",
+    "give", "want", "like", "to", "know", "some", "general", "quick", "brief", "short",
+    "about", "of", "on", "at", "for", "is", "it", "its", "what", "how", "and", "school",
+    "university", "college", "institute", "uni",
+}
+OVERVIEW_FILLER_WORDS_KO = {
+    "대학", "대학교", "학교", "좀", "간단히", "간단하게", "전반적으로", "전반적인", "전체적으로",
+    "해줘", "해", "줘", "주세요", "해주세요", "어떤", "곳", "곳이야", "뭐야", "궁금해",
+}
+# Particles and endings that attach to the word before them ("하버드는", "스탠퍼드에")
+_KO_PARTICLE_RE = re.compile(r"(?:에서|에게|으로|로|은|는|이|가|을|를|의|에|와|과|도|야|이야|서)$")
+
+LABELS = {
+    "en": {
+        "title": "{name} at a glance ({year} Common Data Set)",
+        "profile": "- Profile: {kind} in {location}",
+        "admissions": "- Admissions: {rate} acceptance rate ({admitted} admitted of {applicants} applicants), {yield_rate} yield",
+        "tests": "- Testing: {policy}; SAT middle 50% {sat}, ACT middle 50% {act}",
+        "gpa": "- Admitted students: average GPA {gpa}, {top10} in the top 10% of their class",
+        "cost": "- Cost: tuition {tuition}, fees {fees}, room and board {room}",
+        "aid": "- Financial aid: {need_met} of need met, average need-based package {package}, international students {intl_aid}",
+        "students": "- Students: {enrollment} undergraduates, {ratio} student-faculty ratio, {intl} international, {small} of classes under 20",
+        "deadlines": "- Deadlines: {deadlines}",
+        "source": "Source: {source}",
+        "yes": "eligible",
+        "no": "not eligible",
+        "rounds": {
+            "early_decision_1": "Early Decision I",
+            "early_decision_2": "Early Decision II",
+            "early_action": "Early Action",
+            "regular_decision": "Regular Decision",
+        },
+    },
+    "ko": {
+        "title": "{name} 한눈에 보기 ({year} Common Data Set 기준)",
+        "profile": "- 학교 유형: {location} 소재 {kind}",
+        "admissions": "- 입학: 합격률 {rate} (지원자 {applicants}명 중 {admitted}명 합격), 등록률 {yield_rate}",
+        "tests": "- 시험: {policy}; SAT 중간 50% {sat}, ACT 중간 50% {act}",
+        "gpa": "- 합격생: 평균 GPA {gpa}, 고교 석차 상위 10% 비율 {top10}",
+        "cost": "- 비용: 학비 {tuition}, 수수료 {fees}, 기숙사비 및 식비 {room}",
+        "aid": "- 재정 보조: 재정 필요 충족률 {need_met}, 평균 Need-based 지원액 {package}, 유학생 {intl_aid}",
+        "students": "- 재학생: 학부생 {enrollment}명, 학생 대 교수 비율 {ratio}, 유학생 비율 {intl}, 20명 미만 수업 비율 {small}",
+        "deadlines": "- 마감일: {deadlines}",
+        "source": "출처: {source}",
+        "yes": "지원 가능",
+        "no": "지원 불가",
+        "rounds": {
+            "early_decision_1": "Early Decision I",
+            "early_decision_2": "Early Decision II",
+            "early_action": "Early Action",
+            "regular_decision": "Regular Decision",
+        },
+    },
+}
+
+
+def _get(record: Dict[str, Any], path: str) -> Any:
+    value: Any = record
+    for key in path.split("."):
+        value = value.get(key) if isinstance(value, dict) else None
+    return None if value in (None, "", []) else value
+
+
+def _count(value: Any) -> Optional[str]:
+    return f"{value:,}" if isinstance(value, int) and not isinstance(value, bool) else None
+
+
+def _money(value: Any) -> Optional[str]:
+    return f"${value:,}" if isinstance(value, int) and not isinstance(value, bool) else None
+
+
+def _percent(value: Any) -> Optional[str]:
+    # Rates stored as fractions are fixed by record repair (record_repair._Repair._rate) before rendering
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f"{value:.1f}%"
+    return str(value) if value is not None else None
+
+
+def _school_kind(school_type: Any, category: Any) -> Optional[str]:
+    """Type and category, without the one the other already contains ("Private, nonprofit" / "Private, nonprofit university")."""
+    parts = [str(part) for part in (school_type, category) if part]
+    if len(parts) == 2:
+        first, second = (part.lower() for part in parts)
+        if first in second:
+            parts = parts[1:]
+        elif second in first:
+            parts = parts[:1]
+    return " ".join(parts) or None
+
+
+def _range(low: Any, high: Any) -> Optional[str]:
+    return f"{low}-{high}" if low is not None and high is not None else None
+
+
+def _line(template: str, **fields: Optional[str]) -> Optional[str]:
+    """Fills a template; None when none of its fields are known, N/A for the ones that are not."""
+    if all(value is None for value in fields.values()):
+        return None
+    return template.format(**{key: "N/A" if value is None else value for key, value in fields.items()})
+
+
+def render_card(record: Dict[str, Any], lang: str, year: Optional[str] = None) -> str:
+    """
+    Renders the summary card of one record in lang ("en" or "ko").
+
+    Lines whose fields are all missing are left out.
+    """
+    labels = LABELS[lang]
+    name = _get(record, "general_info.institution_name") or "Unknown institution"
+    city, state = _get(record, "general_info.city"), _get(record, "general_info.state")
+    location = ", ".join(part for part in (city, state) if part) or None
+    intl_aid = _get(record, "cost_and_financial_aid.financial_aid.international_students_eligible")
+    if isinstance(intl_aid, bool):
+        intl_aid = labels["yes"] if intl_aid else labels["no"]
+    deadlines = [
+        f"{round_label} {display_date(_get(record, f'deadlines.{round_key}.deadline'))}"
+        for round_key, round_label in labels["rounds"].items()
+        if _get(record, f"deadlines.{round_key}.deadline")
+    ]
+
+    lines = [
+        labels["title"].format(name=name, year=year or record_year("", record)),
+        _line(
+            labels["profile"],
+            kind=_school_kind(_get(record, "general_info.school_type"), _get(record, "general_info.school_category")),
+            location=location,
+        ),
+        _line(
+            labels["admissions"],
+            rate=_percent(_get(record, "admissions_statistics.acceptance_rate")),
+            admitted=_count(_get(record, "admissions_statistics.admitted.total")),
+            applicants=_count(_get(record, "admissions_statistics.applicants.total")),
+            yield_rate=_percent(_get(record, "admissions_statistics.yield_rate")),
+        ),
+        _line(
+            labels["tests"],
+            policy=_get(record, "test_scores.policy"),
+            sat=_range(_get(record, "test_scores.sat.composite_25th"), _get(record, "test_scores.sat.composite_75th")),
+            act=_range(_get(record, "test_scores.act.composite_25th"), _get(record, "test_scores.act.composite_75th")),
+        ),
+        _line(
+            labels["gpa"],
+            gpa=_get(record, "high_school_profile.average_gpa"),
+            top10=_get(record, "high_school_profile.percent_top_10"),
+        ),
+        _line(
+            labels["cost"],
+            tuition=_money(_get(record, "cost_and_financial_aid.expenses.tuition_in_state")),
+            fees=_money(_get(record, "cost_and_financial_aid.expenses.fees")),
+            room=_money(_get(record, "cost_and_financial_aid.expenses.room_and_board")),
+        ),
+        _line(
+            labels["aid"],
+            need_met=_get(record, "cost_and_financial_aid.financial_aid.percent_need_met"),
+            package=_money(_get(record, "cost_and_financial_aid.financial_aid.average_need_based_package")),
+            intl_aid=intl_aid,
+        ),
+        _line(
+            labels["students"],
+            enrollment=_count(_get(record, "student_life_and_faculty.undergraduate_enrollment")),
+            ratio=_get(record, "student_life_and_faculty.student_faculty_ratio"),
+            intl=_get(record, "student_life_and_faculty.demographics.international_percent"),
+            small=_get(record, "student_life_and_faculty.class_size_under_20_percent"),
+        ),
+        _line(labels["deadlines"], deadlines=", ".join(deadlines) or None),
+    ]
+    source = _get(record, "metadata.source_file")
+    if source:
+        lines += ["", labels["source"].format(source=source)]
+    return "\n".join(line for line in lines if line is not None)
+
+
+def record_digest(record: Dict[str, Any]) -> str:
+    """Digest of a record and of the card templates; a card is current while it matches."""
+    payload = json.dumps(record, sort_keys=True, ensure_ascii=False, default=str) + CARD_TEMPLATE_VERSION
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def build_card(store: FactStore, institution: str) -> Optional[Dict[str, Any]]:
+    """The stored form of an institution's card: both languages rendered from its latest record."""
+    record = store.get(institution)
+    if not record:
+        return None
+    year = store.latest_year(institution)
+    return {
+        "institution": institution,
+        "academic_year": year,
+        "source": store.source_of(institution),
+        "record_digest": record_digest(record),
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "cards": {lang: render_card(record, lang, year) for lang in LANGUAGES},
+    }
+
+
+class SummaryCardStore:
+    """
+    Cards of every institution in one JSON file, shared by all processes.
+
+    The file is re-read when another process (the indexer, another worker)
+    has rewritten it, and replaced atomically on every update.
+    """
+
+    def __init__(self, path: str = SUMMARY_CARD_PATH):
+        self.path = path
+        self._cards: Dict[str, Dict[str, Any]] = {}
+        self._mtime: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _reload_if_changed(self) -> None:
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._cards = json.load(f)
+            self._mtime = mtime
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"❌ Failed to read summary cards from {self.path}: {e}")
+
+    def _write(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".cards-", suffix=".json", dir=os.path.dirname(self.path) or ".")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self._cards, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+        self._mtime = os.stat(self.path).st_mtime_ns
+
+    def institutions(self) -> List[str]:
+        with self._lock:
+            self._reload_if_changed()
+            return sorted(self._cards)
+
+    def get(self, institution: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._reload_if_changed()
+            return self._cards.get(institution)
+
+    def update(self, store: FactStore, institutions: Optional[List[str]] = None) -> List[str]:
+        """
+        Re-renders the cards whose record changed (or that do not exist yet).
+
+        Args:
+            store: Records to render from; each institution's latest year is used.
+            institutions: Limit the update to these institutions (None = all in store).
+
+        Returns:
+            list: Institutions whose card was (re)generated.
+        """
+        with self._lock:
+            self._reload_if_changed()
+            changed = []
+            for institution in institutions or store.institutions():
+                record = store.get(institution)
+                if not record:
+                    continue
+                current = self._cards.get(institution)
+                if current and current.get("record_digest") == record_digest(record):
+                    continue
+                self._cards[institution] = build_card(store, institution)
+                changed.append(institution)
+            if changed:
+                self._write()
+                EVENTS.inc(len(changed), event="summary_card_generated")
+            return changed
+
+
+_card_store: Optional[SummaryCardStore] = None
+
+
+def get_card_store() -> SummaryCardStore:
+    """Returns the process-wide card store."""
+    global _card_store
+    if _card_store is None:
+        _card_store = SummaryCardStore()
+    return _card_store
+
+
+def update_cards(records: Dict[str, Dict[str, Any]]) -> List[str]:
+    """Regenerates the cards of the institutions whose latest record changed (indexer and upload hook)."""
+    store = FactStore(records)
+    changed = get_card_store().update(store)
+    if changed:
+        print(f"🪪 Summary cards generated for {len(changed)} institutions: {', '.join(changed)}")
+    return changed
+
+
+def refresh_cards(json_dir: str = JSON_DIR) -> List[str]:
+    """Reloads the extracted records from disk and regenerates the cards that changed."""
+    return update_cards(load_records(json_dir))
+
+
+def get_card(institution: str, lang: str = "en") -> Optional[Dict[str, Any]]:
+    """
+    The summary card of an institution in lang, rendered now if it was never stored.
+
+    Returns:
+        dict: institution, academic_year, source, generated_at and text, or
+              None when there is no record for the institution.
+    """
+    cards = get_card_store()
+    entry = cards.get(institution)
+    if entry is None:
+        cards.update(get_fact_store(), [institution])
+        entry = cards.get(institution)
+    if entry is None:
+        return None
+    lang = lang if lang in LANGUAGES else "en"
+    return {
+        "institution": entry["institution"],
+        "academic_year": entry["academic_year"],
+        "source": entry["source"],
+        "generated_at": entry["generated_at"],
+        "lang": lang,
+        "text": entry["cards"][lang],
+    }
+
+
+def find_institution(name: str) -> Optional[str]:
+    """Resolves a free-text institution name or alias ("Georgia Tech", "하버드") to a known institution."""
+    names = sorted(set(get_card_store().institutions()) | set(get_fact_store().institutions()))
+    exact = [known for known in names if known.lower() == name.strip().lower()]
+    matches = exact or match_institutions(name, names)
+    return matches[0] if len(matches) == 1 else None
+
+
+def _topic_words(message: str, institution: str) -> List[str]:
+    """The words of a message left after removing the institution, overview phrases and filler."""
+    text = message.lower()
+    phrases = institution_aliases(institution) + OVERVIEW_KEYWORDS + OVERVIEW_KEYWORDS_KO
+    for phrase in sorted(phrases, key=len, reverse=True):
+        text = re.sub(rf"(?<![a-z0-9]){re.escape(phrase)}(?![a-z0-9])", " ", text)
+    words = []
+    for word in re.findall(r"[a-z0-9\-]+|[\uac00-\ud7a3]+", text):
+        if word in OVERVIEW_FILLER_WORDS or word in OVERVIEW_FILLER_WORDS_KO:
+            continue
+        stem = _KO_PARTICLE_RE.sub("", word) if re.match(r"[\uac00-\ud7a3]", word) else word
+        if stem and stem not in OVERVIEW_FILLER_WORDS_KO:
+            words.append(word)
+    return words
+
+
+def is_overview_question(message: str) -> Optional[str]:
+    """
+    The institution a message asks for a general overview of, or None.
+
+    Only unambiguous cases qualify: exactly one institution, an overview
+    phrase, and nothing else of substance once the institution, the phrase and
+    filler words are removed. "Tell me about Stanford computer science major"
+    or "하버드 캠퍼스 분위기 어때?" are left to the full pipeline.
+    """
+    text = message.lower()
+    if not any(keyword in text for keyword in OVERVIEW_KEYWORDS) and not any(k in message for k in OVERVIEW_KEYWORDS_KO):
+        return None
+    if detect_sections(message):
+        return None
+    store = get_fact_store()
+    # Any year at all, even one not on record: the card only shows the latest
+    if re.search(r"(?<!\d)20\d{2}(?!\d)", message) or detect_academic_years(message, store.years()):
+        return None
+    institutions = match_institutions(message, store.institutions())
+    if len(institutions) != 1 or _topic_words(message, institutions[0]):
+        return None
+    return institutions[0]
@@ -0,0 +1,233 @@
+"""
+Streaming PDF Upload Ingestion.
+
+Both upload handlers store the incoming PDF through store_upload(), which
+keeps the event loop free while a large file is written:
+
+- the upload is read in UPLOAD_CHUNK_BYTES chunks; each chunk is sniffed,
+  written and hashed (sha256) in a worker thread, so chat streams on the same
+  worker keep running
+- uploads over UPLOAD_MAX_BYTES are rejected with 413, and anything that is
+  not a PDF (no %PDF- header) with 415
+- the page count is sniffed from the bytes as they pass (best effort: pages
+  inside compressed object streams are not visible)
+- the client's filename is reduced to a safe base name, and the file only
+  appears in app/data/pdfs through an atomic rename of the finished temp file
+
+UploadSizeLimitMiddleware rejects oversized uploads from their Content-Length
+before the multipart body is read at all, and cuts off chunked uploads
+without one as soon as the bytes received pass the cap.
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import tempfile
+import unicodedata
+from typing import Any, Dict, Optional
+
+from fastapi import UploadFile
+from starlette.responses import JSONResponse
+
+from .metrics import span
+
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(50 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+# Multipart boundaries and part headers on top of the file itself
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+# A PDF header may follow some leading junk (PDF 1.7, 7.5.2)
+PDF_MAGIC_WINDOW = 1024
+MAX_FILENAME_LENGTH = 150
+
+UNSAFE_FILENAME_CHARS = re.compile(r"[^\w.\-()]+")
+
+
+class UploadRejected(Exception):
+    """Raised for uploads that are too large (413), not PDFs (415) or unnamed (400)."""
+
+    def __init__(self, status_code: int, reason: str):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+
+    def to_response(self) -> JSONResponse:
+        return JSONResponse(status_code=self.status_code, content={"error": self.reason})
+
+
+def safe_pdf_filename(filename: Optional[str]) -> str:
+    """
+    Reduces a client-supplied filename to a safe base name ending in .pdf.
+
+    Directory parts (either slash), control and shell characters and leading
+    dots are dropped, so the name can never leave the upload directory.
+    """
+    name = unicodedata.normalize("NFC", (filename or "").replace("\\", "/").rsplit("/", 1)[-1])
+    stem, ext = os.path.splitext(name)
+    if ext.lower() != ".pdf":
+        stem = name
+    stem = UNSAFE_FILENAME_CHARS.sub("_", stem).strip("._-")[:MAX_FILENAME_LENGTH]
+    if not stem:
+        raise UploadRejected(400, "No filename provided")
+    return f"{stem}.pdf"
+
+
+class PdfSniffer:
+    """Checks the PDF header and counts page objects across chunk boundaries."""
+
+    # "/Type /Page" followed by a delimiter, so "/Type /Pages" does not count
+    PAGE_RE = re.compile(rb"/Type\s*/Page(?=[^A-Za-z0-9])")
+    COUNT_RE = re.compile(rb"/Count\s+(\d+)")
+    CARRY = 64
+
+    def __init__(self):
+        self.head = b""
+        self.carry = b""
+        self.page_objects = 0
+        self.max_count = 0
+
+    def feed(self, chunk: bytes) -> None:
+        if len(self.head) < PDF_MAGIC_WINDOW:
+            self.head += chunk[: PDF_MAGIC_WINDOW - len(self.head)]
+            if len(self.head) >= PDF_MAGIC_WINDOW and not self.is_pdf:
+                raise UploadRejected(415, "Only PDF files can be uploaded")
+        data = self.carry + chunk
+        # A match ending before the carry boundary was already counted with the previous chunk
+        self.page_objects += sum(1 for m in self.PAGE_RE.finditer(data) if m.end() >= len(self.carry))
+        for m in self.COUNT_RE.finditer(data):
+            self.max_count = max(self.max_count, int(m.group(1)))
+        self.carry = data[-self.CARRY:]
+
+    @property
+    def is_pdf(self) -> bool:
+        return b"%PDF-" in self.head
+
+    @property
+    def pages(self) -> Optional[int]:
+        # Page objects inside compressed object streams are invisible; the page tree's /Count is the fallback
+        return self.page_objects or self.max_count or None
+
+
+def _write_chunk(out, digest, sniffer: PdfSniffer, chunk: bytes) -> None:
+    sniffer.feed(chunk)
+    out.write(chunk)
+    digest.update(chunk)
+
+
+def _finish(out, tmp_path: str, path: str) -> None:
+    out.flush()
+    os.fsync(out.fileno())
+    out.close()
+    os.replace(tmp_path, path)
+
+
+def _discard(out, tmp_path: str) -> None:
+    out.close()
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+
+async def store_upload(file: UploadFile, dest_dir: str, max_bytes: int = UPLOAD_MAX_BYTES) -> Dict[str, Any]:
+    """
+    Streams an uploaded PDF into dest_dir without blocking the event loop.
+
+    Returns:
+        dict: filename (sanitized), path, size_bytes, sha256 and pages (None when unknown).
+
+    Raises:
+        UploadRejected: For a missing filename, a non-PDF or an upload over max_bytes.
+    """
+    filename = safe_pdf_filename(file.filename)
+    path = os.path.join(dest_dir, filename)
+    os.makedirs(dest_dir, exist_ok=True)
+    # Same directory as the target, so the final rename is atomic
+    fd, tmp_path = tempfile.mkstemp(prefix=".upload-", suffix=".part", dir=dest_dir)
+    out = os.fdopen(fd, "wb")
+    digest = hashlib.sha256()
+    sniffer = PdfSniffer()
+    size = 0
+    with span("upload.store", filename=filename):
+        try:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadRejected(413, f"Upload is larger than {max_bytes // (1024 * 1024)} MB")
+                await asyncio.to_thread(_write_chunk, out, digest, sniffer, chunk)
+            if not sniffer.is_pdf:
+                raise UploadRejected(415, "Only PDF files can be uploaded")
+            await asyncio.to_thread(_finish, out, tmp_path, path)
+        except BaseException:
+            await asyncio.to_thread(_discard, out, tmp_path)
+            raise
+
+    return {
+        "filename": filename,
+        "path": path,
+        "size_bytes": size,
+        "sha256": digest.hexdigest(),
+        "pages": sniffer.pages,
+    }
+
+
+class UploadSizeLimitMiddleware:
+    """
+    ASGI middleware that answers 413 for uploads over the cap.
+
+    Runs before the multipart body is parsed: an upload whose Content-Length
+    is over the cap is rejected before its body is read, and a chunked upload
+    without one is counted as it arrives and cut off once it passes the cap,
+    so an oversized upload is never spooled to disk in full.
+    """
+
+    def __init__(self, app, path_prefix: str = "/upload", max_bytes: int = UPLOAD_MAX_BYTES):
+        self.app = app
+        self.path_prefix = path_prefix
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if not (scope["type"] == "http" and scope["method"] == "POST" and scope["path"].startswith(self.path_prefix)):
+            await self.app(scope, receive, send)
+            return
+        limit = self.max_bytes + MULTIPART_OVERHEAD_BYTES
+        rejected = UploadRejected(413, f"Upload is larger than {self.max_bytes // (1024 * 1024)} MB")
+        headers = dict(scope.get("headers") or [])
+        length = headers.get(b"content-length")
+        if length and length.isdigit() and int(length) > limit:
+            await rejected.to_response()(scope, receive, send)
+            return
+
+        received = 0
+        exceeded = False
+        response_started = False
+
+        async def counted_receive():
+            nonlocal received, exceeded
+            if exceeded:
+                raise rejected
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    exceeded = True
+                    raise rejected
+            return message
+
+        async def guarded_send(message):
+            nonlocal response_started
+            # Once the cap is passed, whatever the app answers (the form parser turns the
+            # error into a 400) is replaced by the 413 below
+            if exceeded and not response_started:
+                return
+            response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, counted_receive, guarded_send)
+        except Exception:
+            if not exceeded:
+                raise
+        if exceeded and not response_started:
+            await rejected.to_response()(scope, receive, send)
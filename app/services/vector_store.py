@@ -0,0 +1,448 @@
+"""
+Local Vector Index.
+
+An in-process alternative to the Pinecone index: section chunks and their
+embeddings held in a numpy matrix, searched by cosine similarity with the
+same metadata filter syntax Pinecone uses ($eq, $ne, $in, $nin, $and, $or).
+Used by the retrieval evaluation, the local stand-ins and offline runs.
+
+Indexes are saved as an .npz file (vectors) next to a .json file (ids and
+metadata), so they can be built once and reloaded without re-embedding.
+PartitionedVectorIndex keeps one LocalVectorIndex per namespace (one per
+academic year, see cds_records.partition_namespace), like Pinecone
+namespaces, so a search only scans the years it asks for.
+
+Two-stage search: Gemini embeddings are Matryoshka-trained, so the first N
+dimensions of a vector, renormalized, are a usable lower-dimensional
+embedding. With LOCAL_INDEX_FIRST_PASS_DIM set, a search first scans a
+compressed copy of the corpus (the first N dimensions, optionally stored as
+float16 or int8) and then reranks the best LOCAL_INDEX_RERANK_CANDIDATES rows
+exactly at full dimension. The compressed copy is derived from the full
+vectors, so nothing changes on disk. script/eval_vector_search.py reports
+recall and latency against the exact search.
+
+Loaded indexes memory-map the full vectors from the .npz file instead of
+reading them into memory, so with a first pass configured only the compressed
+copy is resident and the rerank pages in just the candidate rows.
+"""
+
+import json
+import os
+import struct
+import threading
+import zipfile
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .cds_records import matches_filter, partition_namespace, record_chunks, record_year
+
+# 0 (or >= the index dimension) disables the compressed first pass
+LOCAL_INDEX_FIRST_PASS_DIM = int(os.getenv("LOCAL_INDEX_FIRST_PASS_DIM", "0"))
+# none (float32), float16 or int8
+LOCAL_INDEX_QUANTIZATION = os.getenv("LOCAL_INDEX_QUANTIZATION", "none").lower()
+# Rows reranked at full dimension: max(this, top_k * LOCAL_INDEX_RERANK_FACTOR)
+LOCAL_INDEX_RERANK_CANDIDATES = int(os.getenv("LOCAL_INDEX_RERANK_CANDIDATES", "100"))
+LOCAL_INDEX_RERANK_FACTOR = int(os.getenv("LOCAL_INDEX_RERANK_FACTOR", "10"))
+
+QUANTIZATIONS = ("none", "float16", "int8")
+# Rows scored per block in the first pass, bounding the float32 temporaries
+FIRST_PASS_BLOCK_ROWS = 2048
+
+
+class FirstPass:
+    """
+    Compressed copy of the corpus for the cheap first scan.
+
+    Rows are the first `dimension` components of the full vectors,
+    renormalized, and stored as float32, float16 or int8. int8 rows keep one
+    scale per row (max |component| / 127), which is applied to the scores.
+    """
+
+    def __init__(self, dimension: int, quantization: str = "none"):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization {quantization!r}; expected one of {', '.join(QUANTIZATIONS)}")
+        self.dimension = dimension
+        self.quantization = quantization
+        self.rows = np.zeros((0, dimension), dtype=self._dtype)
+        self.scales: Optional[np.ndarray] = None
+
+    @property
+    def _dtype(self):
+        return {"none": np.float32, "float16": np.float16, "int8": np.int8}[self.quantization]
+
+    def encode(self, matrix: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Truncates, renormalizes and quantizes full-dimension rows."""
+        short = LocalVectorIndex._normalize(matrix[:, : self.dimension].astype(np.float32))
+        if self.quantization != "int8":
+            return short.astype(self._dtype), None
+        scales = np.abs(short).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        return np.round(short / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    def build(self, matrix: np.ndarray) -> "FirstPass":
+        self.rows, self.scales = self.encode(matrix)
+        return self
+
+    def scores(self, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Approximate cosine scores of the (full-dimension, normalized) query against all or some rows."""
+        short = query[: self.dimension]
+        short = short / (np.linalg.norm(short) or 1.0)
+        count = len(self.rows) if rows is None else len(rows)
+        out = np.empty(count, dtype=np.float32)
+        for start in range(0, count, FIRST_PASS_BLOCK_ROWS):
+            block = slice(start, start + FIRST_PASS_BLOCK_ROWS)
+            selected = block if rows is None else rows[block]
+            values = self.rows[selected].astype(np.float32, copy=False) @ short
+            if self.scales is not None:
+                values *= self.scales[selected]
+            out[block] = values
+        return out
+
+    @property
+    def nbytes(self) -> int:
+        return self.rows.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+
+def _map_vectors(path: str) -> np.ndarray:
+    """
+    The "vectors" array of an index .npz file, memory-mapped read-only.
+
+    save() writes the archive uncompressed, so the .npy member can be mapped
+    where it lies in the file. Compressed archives and other dtypes are read
+    into memory instead.
+    """
+    with zipfile.ZipFile(path) as archive:
+        info = archive.getinfo("vectors.npy")
+        if info.compress_type == zipfile.ZIP_STORED:
+            with archive.open(info) as member:
+                version = np.lib.format.read_magic(member)
+                if version == (1, 0):
+                    shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(member)
+                else:
+                    shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(member)
+                array_offset = member.tell()
+            if dtype == np.float32 and not fortran_order and len(shape) == 2:
+                # The member's data starts after its local file header, whose extra field may differ from the central one
+                with open(path, "rb") as f:
+                    f.seek(info.header_offset)
+                    name_length, extra_length = struct.unpack("<HH", f.read(30)[26:30])
+                data_offset = info.header_offset + 30 + name_length + extra_length
+                if shape[0] == 0:
+                    return np.zeros(shape, dtype=np.float32)
+                return np.memmap(path, dtype=np.float32, mode="r", offset=data_offset + array_offset, shape=shape)
+    return np.load(path)["vectors"].astype(np.float32)
+
+
+class LocalVectorIndex:
+    """Cosine-similarity index over unit-normalized float32 vectors."""
+
+    def __init__(
+        self,
+        dimension: int,
+        first_pass_dim: Optional[int] = None,
+        quantization: Optional[str] = None,
+        rerank_candidates: Optional[int] = None,
+    ):
+        self.dimension = dimension
+        self.ids: List[str] = []
+        self.metadata: List[Dict[str, Any]] = []
+        self._positions: Dict[str, int] = {}
+        self._matrix = np.zeros((0, dimension), dtype=np.float32)
+        self._lock = threading.Lock()
+        self.rerank_candidates = rerank_candidates or LOCAL_INDEX_RERANK_CANDIDATES
+        self._first_pass: Optional[FirstPass] = None
+        self._first_pass_stale = False
+        self.configure_first_pass(
+            LOCAL_INDEX_FIRST_PASS_DIM if first_pass_dim is None else first_pass_dim,
+            quantization or LOCAL_INDEX_QUANTIZATION,
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def upsert(self, vectors: List[Dict[str, Any]]) -> int:
+        """Adds or replaces {"id", "values", "metadata"} vectors."""
+        if not vectors:
+            return 0
+        values = self._normalize(np.asarray([v["values"] for v in vectors], dtype=np.float32))
+        with self._lock:
+            if not self._matrix.flags.writeable:
+                # Loaded memory-mapped and read-only; updates need an in-memory copy
+                self._matrix = np.array(self._matrix)
+            new_rows = []
+            stored = len(self._matrix)
+            for vector, row in zip(vectors, values):
+                position = self._positions.get(vector["id"])
+                if position is None:
+                    self._positions[vector["id"]] = len(self.ids)
+                    new_rows.append(row)
+                    self.ids.append(vector["id"])
+                    self.metadata.append(vector.get("metadata") or {})
+                else:
+                    # The id may repeat within this batch, before its row reaches the matrix
+                    if position < stored:
+                        self._matrix[position] = row
+                    else:
+                        new_rows[position - stored] = row
+                    self.metadata[position] = vector.get("metadata") or {}
+            if new_rows:
+                self._matrix = np.vstack([self._matrix, np.asarray(new_rows, dtype=np.float32)])
+            self._first_pass_stale = True
+        return len(vectors)
+
+    def configure_first_pass(self, dimension: int, quantization: str = "none") -> None:
+        """
+        Enables the compressed first pass over the first `dimension` components.
+
+        Args:
+            dimension: Leading dimensions scanned in the first pass; 0 or the
+                full dimension with quantization "none" disables it.
+            quantization: "none", "float16" or "int8".
+        """
+        dimension = min(dimension, self.dimension) if dimension > 0 else self.dimension
+        if dimension == self.dimension and quantization == "none":
+            first_pass = None
+        else:
+            first_pass = FirstPass(dimension, quantization)
+        with self._lock:
+            self._first_pass = first_pass
+            self._first_pass_stale = True
+
+    def _current_first_pass(self) -> Optional[FirstPass]:
+        """The first-pass copy, re-encoded after upserts. Called with the lock held."""
+        if self._first_pass is not None and self._first_pass_stale:
+            # A fresh instance, so concurrent searches keep a consistent rows/scales pair
+            self._first_pass = FirstPass(self._first_pass.dimension, self._first_pass.quantization).build(self._matrix)
+            self._first_pass_stale = False
+        return self._first_pass
+
+    def search(
+        self,
+        vector: List[float],
+        top_k: int = 5,
+        metadata_filter: Optional[Dict[str, Any]] = None,
+        exact: bool = False,
+    ) -> List[Tuple[str, float, Dict[str, Any]]]:
+        """
+        Finds the closest vectors.
+
+        With a first pass configured, scans the compressed copy and reranks
+        the best candidates at full dimension; exact=True skips the first
+        pass and scores every row at full dimension.
+
+        Returns:
+            list: (id, cosine score, metadata) tuples, best first.
+        """
+        with self._lock:
+            matrix, ids, metadata = self._matrix, list(self.ids), list(self.metadata)
+            first_pass = None if exact else self._current_first_pass()
+        if not ids:
+            return []
+
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        if metadata_filter:
+            rows = np.array([i for i, meta in enumerate(metadata) if matches_filter(meta, metadata_filter)], dtype=np.int64)
+            if rows.size == 0:
+                return []
+        else:
+            rows = None
+        count = len(ids) if rows is None else rows.size
+
+        candidates = max(self.rerank_candidates, top_k * LOCAL_INDEX_RERANK_FACTOR)
+        if first_pass is not None and candidates < count:
+            coarse = first_pass.scores(query, rows)
+            shortlist = np.argpartition(-coarse, candidates - 1)[:candidates]
+            rows = shortlist if rows is None else rows[shortlist]
+        if rows is None:
+            rows = np.arange(len(ids))
+            scores = matrix @ query
+        else:
+            scores = matrix[rows] @ query
+
+        k = min(top_k, scores.size)
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(ids[rows[i]], float(scores[i]), metadata[rows[i]]) for i in best]
+
+    def memory_bytes(self) -> Dict[str, int]:
+        """Bytes held in memory by the full vectors (0 while memory-mapped) and by the first-pass copy."""
+        with self._lock:
+            first_pass = self._current_first_pass()
+            return {
+                "full": 0 if isinstance(self._matrix, np.memmap) else self._matrix.nbytes,
+                "first_pass": first_pass.nbytes if first_pass is not None else 0,
+            }
+
+    def query(
+        self, vector: List[float], top_k: int = 5, metadata_filter: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """Same chunk format as the Pinecone search in the query_college_info tool."""
+        return [
+            {
+                "id": vector_id,
+                "score": score,
+                "institution_name": meta.get("institution_name", "N/A"),
+                "section": meta.get("section", "N/A"),
+                "academic_year": meta.get("academic_year", "N/A"),
+                "source_file": meta.get("source_file", "N/A"),
+                "granularity": meta.get("granularity", "section"),
+                "field_group": meta.get("field_group"),
+                "parent_id": meta.get("parent_id"),
+                "text": meta.get("text", "N/A"),
+            }
+            for vector_id, score, meta in self.search(vector, top_k, metadata_filter)
+        ]
+
+    @classmethod
+    def from_records(
+        cls,
+        records: Dict[str, Dict[str, Any]],
+        embed: Callable[[str], List[float]],
+        dimension: int = 768,
+        embed_batch: Optional[Callable[[List[str]], List[List[float]]]] = None,
+    ) -> "LocalVectorIndex":
+        """
+        Builds an index from {filename: record}, chunked exactly like script/indexer.py.
+
+        embed_batch, when given (e.g. EmbeddingProvider.embed_batch), embeds
+        all chunks of a record in one call instead of one call per chunk.
+        """
+        index = cls(dimension)
+        vectors = []
+        for filename, record in records.items():
+            chunks = record_chunks(filename, record)
+            texts = [chunk["text"] for chunk in chunks]
+            embedded = embed_batch(texts) if embed_batch else [embed(text) for text in texts]
+            for chunk, values in zip(chunks, embedded):
+                if values:
+                    vectors.append({"id": chunk["id"], "values": values, "metadata": chunk["metadata"]})
+        index.upsert(vectors)
+        return index
+
+    def save(self, path: str) -> None:
+        """Writes {path}.npz (vectors) and {path}.json (ids and metadata)."""
+        base = os.path.splitext(path)[0]
+        os.makedirs(os.path.dirname(os.path.abspath(base)), exist_ok=True)
+        with self._lock:
+            # Uncompressed: float vectors barely deflate, compressing made saves and loads ~7x
+            # slower, and load() memory-maps the vectors in place. Written aside and renamed,
+            # so an index mapped from the same file keeps reading the old one.
+            with open(f"{base}.npz.tmp", "wb") as f:
+                np.savez(f, vectors=self._matrix)
+            os.replace(f"{base}.npz.tmp", f"{base}.npz")
+            with open(f"{base}.json", "w", encoding="utf-8") as f:
+                json.dump({"dimension": self.dimension, "ids": self.ids, "metadata": self.metadata}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str) -> "LocalVectorIndex":
+        base = os.path.splitext(path)[0]
+        with open(f"{base}.json", "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        index = cls(manifest["dimension"])
+        index.ids = manifest["ids"]
+        index.metadata = manifest["metadata"]
+        index._positions = {vector_id: i for i, vector_id in enumerate(index.ids)}
+        index._matrix = _map_vectors(f"{base}.npz")
+        index._first_pass_stale = True
+        return index
+
+
+class PartitionedVectorIndex:
+    """
+    LocalVectorIndex partitions keyed by namespace, searched one namespace at a time.
+
+    A flat index saved before partitioning loads as the single partition "",
+    which then answers for every namespace.
+    """
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+        self.partitions: Dict[str, LocalVectorIndex] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return sum(len(index) for index in self.partitions.values())
+
+    def namespaces(self) -> List[str]:
+        return sorted(self.partitions)
+
+    def partition(self, namespace: str) -> Optional[LocalVectorIndex]:
+        index = self.partitions.get(namespace)
+        if index is None and list(self.partitions) == [""]:
+            return self.partitions[""]
+        return index
+
+    def upsert(self, vectors: List[Dict[str, Any]], namespace: str = "") -> int:
+        with self._lock:
+            index = self.partitions.setdefault(namespace, LocalVectorIndex(self.dimension))
+        return index.upsert(vectors)
+
+    def search(
+        self,
+        vector: List[float],
+        top_k: int = 5,
+        metadata_filter: Optional[Dict[str, Any]] = None,
+        namespace: str = "",
+    ) -> List[Tuple[str, float, Dict[str, Any]]]:
+        index = self.partition(namespace)
+        return index.search(vector, top_k, metadata_filter) if index is not None else []
+
+    def query(
+        self,
+        vector: List[float],
+        top_k: int = 5,
+        metadata_filter: Optional[Dict[str, Any]] = None,
+        namespace: str = "",
+    ) -> List[Dict[str, Any]]:
+        index = self.partition(namespace)
+        return index.query(vector, top_k, metadata_filter) if index is not None else []
+
+    @classmethod
+    def from_records(
+        cls,
+        records: Dict[str, Dict[str, Any]],
+        embed: Callable[[str], List[float]],
+        dimension: int = 768,
+        embed_batch: Optional[Callable[[List[str]], List[List[float]]]] = None,
+    ) -> "PartitionedVectorIndex":
+        """Builds one partition per academic year (a single "" partition with partitioning off)."""
+        by_namespace: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for filename, record in records.items():
+            by_namespace.setdefault(partition_namespace("", record_year(filename, record)), {})[filename] = record
+        index = cls(dimension)
+        for namespace, group in by_namespace.items():
+            index.partitions[namespace] = LocalVectorIndex.from_records(group, embed, dimension, embed_batch)
+        return index
+
+    def save(self, path: str) -> None:
+        """Writes {path}.partitions.json plus one {path}.{namespace}.npz/.json pair per partition."""
+        base = os.path.splitext(path)[0]
+        os.makedirs(os.path.dirname(os.path.abspath(base)), exist_ok=True)
+        for namespace, index in self.partitions.items():
+            index.save(f"{base}.{namespace or '_'}.npz")
+        with open(f"{base}.partitions.json", "w", encoding="utf-8") as f:
+            json.dump({"dimension": self.dimension, "namespaces": self.namespaces()}, f)
+
+    @classmethod
+    def load(cls, path: str) -> "PartitionedVectorIndex":
+        """Loads a partitioned index, or wraps a flat LocalVectorIndex file as partition ""."""
+        base = os.path.splitext(path)[0]
+        if not os.path.exists(f"{base}.partitions.json"):
+            flat = LocalVectorIndex.load(path)
+            index = cls(flat.dimension)
+            index.partitions[""] = flat
+            return index
+        with open(f"{base}.partitions.json", "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        index = cls(manifest["dimension"])
+        for namespace in manifest["namespaces"]:
+            index.partitions[namespace] = LocalVectorIndex.load(f"{base}.{namespace or '_'}.npz")
+        return index
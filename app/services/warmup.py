@@ -0,0 +1,187 @@
+"""
+Startup Warm-up.
+
+Runs once per worker in the background right after startup, so the first
+users after a deploy don't pay for cold clients, caches and indexes:
+
+1. pipeline:     builds the agents and the in-process runner
+2. fact_store:   loads the extracted CDS records into memory
+3. vector_index: loads the local vector index (LOCAL_VECTOR_INDEX_PATH) or
+                 opens the Pinecone connection pool, and loads the lexical index
+4. embeddings:   pre-embeds popular queries into the embedding cache, which
+                 also opens the Gemini connection pool
+5. summary_cards: regenerates the summary cards whose record changed since
+                 they were rendered
+
+GET /ready answers 503 until the warm-up has finished, so load balancers only
+route to warm workers. A failed step is reported but does not keep the worker
+out of rotation; the degraded answer mode covers backends that are really down.
+"""
+
+import asyncio
+import json
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .cds_records import known_institutions
+from .fact_store import get_fact_store
+from .metrics import observe_stage
+
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() in ("1", "true", "yes")
+# JSON list of query strings; replaces the default popular queries when set
+WARMUP_QUERIES_FILE = os.getenv("WARMUP_QUERIES_FILE", "")
+WARMUP_MAX_QUERIES = int(os.getenv("WARMUP_MAX_QUERIES", "64"))
+WARMUP_CONCURRENCY = int(os.getenv("WARMUP_CONCURRENCY", "4"))
+WARMUP_TIMEOUT_SECONDS = float(os.getenv("WARMUP_TIMEOUT_SECONDS", "120"))
+
+# Same defaults as script/query_test.py
+DEFAULT_QUERIES = [
+    "하버드 학비 얼마야?",
+    "스탠포드 합격률",
+    "윌리엄스 입학 마감일",
+]
+
+# Section phrasing in the style of query_analysis_agent's optimized queries
+SECTION_QUERIES = {
+    "general_info": "location campus public private general information",
+    "admission_factors": "admission factors very important considered",
+    "admissions_statistics": "acceptance rate admitted applicants statistics",
+    "test_scores": "SAT ACT scores 25th 75th percentile",
+    "high_school_profile": "high school GPA class rank",
+    "cost_and_financial_aid": "tuition fees cost of attendance financial aid",
+    "student_life_and_faculty": "student faculty ratio class size enrollment",
+    "deadlines": "application deadline early decision regular decision",
+}
+
+WarmupStep = Callable[[], Optional[Dict[str, Any]]]
+_steps: List[Tuple[str, WarmupStep]] = []
+
+
+def register_warmup_step(name: str, step: WarmupStep) -> None:
+    """
+    Adds a blocking warm-up step; steps run in a worker thread, in order.
+
+    The step may return a dict of details that /ready reports.
+    """
+    _steps.append((name, step))
+
+
+class WarmupState:
+    """Progress of the startup warm-up, as reported by /ready."""
+
+    def __init__(self):
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.timed_out = False
+        self.steps: Dict[str, Dict[str, Any]] = {}
+
+    @property
+    def ready(self) -> bool:
+        return self.finished_at is not None
+
+    def snapshot(self) -> Dict[str, Any]:
+        duration = None
+        if self.started_at is not None:
+            duration = round((self.finished_at or time.time()) - self.started_at, 3)
+        return {
+            "ready": self.ready,
+            "enabled": WARMUP_ENABLED,
+            "timed_out": self.timed_out,
+            "duration_seconds": duration,
+            "steps": self.steps,
+        }
+
+
+_state = WarmupState()
+
+
+def get_warmup_state() -> WarmupState:
+    return _state
+
+
+def popular_queries() -> List[str]:
+    """WARMUP_QUERIES_FILE if set, else the query_test defaults plus institution × section pairs."""
+    if WARMUP_QUERIES_FILE:
+        with open(WARMUP_QUERIES_FILE, "r", encoding="utf-8") as f:
+            queries = [q for q in json.load(f) if isinstance(q, str) and q.strip()]
+    else:
+        queries = list(DEFAULT_QUERIES)
+        for institution in known_institutions():
+            queries += [f"{institution} {phrase}" for phrase in SECTION_QUERIES.values()]
+    return list(dict.fromkeys(queries))[:WARMUP_MAX_QUERIES]
+
+
+def _warm_pipeline() -> Dict[str, Any]:
+    from .pipeline import get_runner
+
+    return {"agent": get_runner().agent.name}
+
+
+def _warm_fact_store() -> Dict[str, Any]:
+    store = get_fact_store()
+    return {"institutions": len(store.institutions()), "academic_years": store.years()}
+
+
+def _warm_vector_index() -> Dict[str, Any]:
+    # Imported lazily: the tool module pulls in the Pinecone client
+    from app.agents.sub_agents.college_agent.tools.query_pinecone import open_connections
+
+    return open_connections()
+
+
+def _warm_embeddings() -> Dict[str, Any]:
+    from concurrent.futures import ThreadPoolExecutor
+
+    from app.agents.sub_agents.college_agent.tools.query_pinecone import _get_embedding
+
+    queries = popular_queries()
+    with ThreadPoolExecutor(max_workers=max(1, WARMUP_CONCURRENCY)) as pool:
+        embedded = sum(1 for vector in pool.map(_get_embedding, queries) if vector)
+    if queries and not embedded:
+        raise RuntimeError(f"none of the {len(queries)} popular queries could be embedded")
+    return {"queries": len(queries), "embedded": embedded}
+
+
+def _warm_summary_cards() -> Dict[str, Any]:
+    from .summary_cards import get_card_store
+
+    # The fact store was just loaded from disk, so it holds the newest records
+    changed = get_card_store().update(get_fact_store())
+    return {"cards": len(get_card_store().institutions()), "regenerated": len(changed)}
+
+
+register_warmup_step("pipeline", _warm_pipeline)
+register_warmup_step("fact_store", _warm_fact_store)
+register_warmup_step("vector_index", _warm_vector_index)
+register_warmup_step("embeddings", _warm_embeddings)
+register_warmup_step("summary_cards", _warm_summary_cards)
+
+
+async def _run_steps() -> None:
+    for name, step in _steps:
+        started = time.perf_counter()
+        try:
+            details = await asyncio.to_thread(step) or {}
+            ok = True
+        except Exception as e:
+            details = {"error": str(e)}
+            ok = False
+        elapsed = time.perf_counter() - started
+        observe_stage(f"warmup.{name}", elapsed, ok=ok)
+        _state.steps[name] = {"ok": ok, "seconds": round(elapsed, 3), **details}
+        icon = "🔥" if ok else "❌"
+        print(f"{icon} Warm-up {name}: {_state.steps[name]}")
+
+
+async def run_warmup() -> None:
+    """Runs the registered warm-up steps and marks the worker ready."""
+    _state.started_at = time.time()
+    if WARMUP_ENABLED:
+        try:
+            await asyncio.wait_for(_run_steps(), timeout=WARMUP_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            _state.timed_out = True
+            print(f"⚠️ Warm-up did not finish within {WARMUP_TIMEOUT_SECONDS:.0f}s; marking ready anyway")
+    _state.finished_at = time.time()
+    print(f"✅ Ready after {_state.finished_at - _state.started_at:.2f}s of warm-up")
@@ -7,45 +7,35 @@ import { MessageProps } from './chat/Message';
 
 const BACKEND_URL = process.env.NEXT_PUBLIC_BACKEND_URL || 'http://localhost:8000';
 
-interface SessionInfo {
-    session_id: string;
-    user_id: string;
-    app_name: string;
-}
+type StreamEvent =
+    | { type: 'delta'; text: string }
+    | { type: 'sources'; sources: { institution: string; section: string; source: string }[] }
+    | { type: 'usage'; prompt: number; candidates: number; thoughts: number; total: number }
+    | { type: 'error'; message: string }
+    | { type: 'mode'; mode: 'degraded' }
+    | { type: 'done' };
 
 export function ChatInterface() {
     const [messages, setMessages] = useState<MessageProps[]>([]);
     const [isLoading, setIsLoading] = useState(false);
-    const [sessionInfo, setSessionInfo] = useState<SessionInfo | null>(null);
+    // Generated here; the backend creates the session with the first message
+    const [sessionId, setSessionId] = useState<string | null>(null);
+    const [sessionCreated, setSessionCreated] = useState(false);
     const [error, setError] = useState<string | null>(null);
 
-    // Create a new session when the component mounts
+    // Start a new session when the component mounts (client-side only, so SSR output stays stable)
     useEffect(() => {
-        createSession();
+        startSession();
     }, []);
 
-    const createSession = async () => {
-        try {
-            setError(null);
-            const response = await fetch(`${BACKEND_URL}/chat/session`, {
-                method: 'POST',
-            });
-
-            if (!response.ok) {
-                throw new Error(`Failed to create session: ${response.statusText}`);
-            }
-
-            const data: SessionInfo = await response.json();
-            setSessionInfo(data);
-            console.log('✅ Session created:', data.session_id);
-        } catch (err) {
-            console.error('❌ Failed to create session:', err);
-            setError('Failed to connect to the server. Please refresh the page.');
-        }
+    const startSession = () => {
+        setError(null);
+        setSessionId(crypto.randomUUID());
+        setSessionCreated(false);
     };
 
     const sendMessage = useCallback(async (content: string) => {
-        if (!sessionInfo) {
+        if (!sessionId) {
             setError('No active session. Please refresh the page.');
             return;
         }
@@ -57,29 +47,24 @@ export function ChatInterface() {
         setError(null);
 
         try {
-            // Prepare the request payload for ADK
-            const payload = {
-                appName: sessionInfo.app_name,
-                userId: sessionInfo.user_id,
-                sessionId: sessionInfo.session_id,
-                newMessage: {
-                    role: 'user',
-                    parts: [{ text: content }]
+            // Use the slim streaming endpoint: only text deltas, sources and usage.
+            // The first message also creates the session, saving a POST /chat/session round trip.
+            const create = sessionCreated ? '' : '&create=true';
+            const response = await fetch(
+                `${BACKEND_URL}/chat/${sessionId}/stream?compress=true${create}`,
+                {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': 'application/json',
+                    },
+                    body: JSON.stringify({ message: content }),
                 }
-            };
-
-            // Use SSE streaming endpoint
-            const response = await fetch(`${BACKEND_URL}/run_sse`, {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify(payload),
-            });
+            );
 
             if (!response.ok) {
                 throw new Error(`Request failed: ${response.statusText}`);
             }
+            setSessionCreated(true);
 
             // Process SSE stream
             const reader = response.body?.getReader();
@@ -88,54 +73,56 @@ export function ChatInterface() {
             }
 
             const decoder = new TextDecoder();
+            let buffer = '';
             let assistantContent = '';
             let hasAddedAssistantMessage = false;
 
+            const handleEvent = (data: StreamEvent) => {
+                if (data.type === 'sources') {
+                    console.log('📚 Sources:', data.sources);
+                } else if (data.type === 'usage') {
+                    console.log('📈 Usage:', data);
+                } else if (data.type === 'error') {
+                    throw new Error(data.message);
+                } else if (data.type === 'delta') {
+                    assistantContent += data.text;
+
+                    // Add or update assistant message
+                    if (!hasAddedAssistantMessage) {
+                        setMessages(prev => [
+                            ...prev,
+                            { role: 'assistant', content: assistantContent, isStreaming: true }
+                        ]);
+                        hasAddedAssistantMessage = true;
+                    } else {
+                        setMessages(prev => {
+                            const updated = [...prev];
+                            const lastIndex = updated.length - 1;
+                            if (updated[lastIndex]?.role === 'assistant') {
+                                updated[lastIndex] = {
+                                    ...updated[lastIndex],
+                                    content: assistantContent,
+                                    isStreaming: true
+                                };
+                            }
+                            return updated;
+                        });
+                    }
+                }
+            };
+
             while (true) {
                 const { done, value } = await reader.read();
                 if (done) break;
 
-                const chunk = decoder.decode(value, { stream: true });
-                const lines = chunk.split('\n');
-
-                for (const line of lines) {
-                    if (line.startsWith('data: ')) {
-                        try {
-                            const data = JSON.parse(line.slice(6));
-
-                            // Extract text content from the event
-                            if (data.content?.parts) {
-                                for (const part of data.content.parts) {
-                                    if (part.text) {
-                                        assistantContent += part.text;
-
-                                        // Add or update assistant message
-                                        if (!hasAddedAssistantMessage) {
-                                            setMessages(prev => [
-                                                ...prev,
-                                                { role: 'assistant', content: assistantContent, isStreaming: true }
-                                            ]);
-                                            hasAddedAssistantMessage = true;
-                                        } else {
-                                            setMessages(prev => {
-                                                const updated = [...prev];
-                                                const lastIndex = updated.length - 1;
-                                                if (updated[lastIndex]?.role === 'assistant') {
-                                                    updated[lastIndex] = {
-                                                        ...updated[lastIndex],
-                                                        content: assistantContent,
-                                                        isStreaming: true
-                                                    };
-                                                }
-                                                return updated;
-                                            });
-                                        }
-                                    }
-                                }
-                            }
-                        } catch {
-                            // Ignore JSON parse errors for incomplete chunks
-                        }
+                // Events are framed by a blank line; keep any partial frame for the next chunk
+                buffer += decoder.decode(value, { stream: true });
+                const frames = buffer.split('\n\n');
+                buffer = frames.pop() ?? '';
+
+                for (const frame of frames) {
+                    if (frame.startsWith('data: ')) {
+                        handleEvent(JSON.parse(frame.slice(6)));
                     }
                 }
             }
@@ -171,7 +158,7 @@ export function ChatInterface() {
         } finally {
             setIsLoading(false);
         }
-    }, [sessionInfo]);
+    }, [sessionId, sessionCreated]);
 
     return (
         <div className="flex h-screen flex-col bg-white">
@@ -190,13 +177,13 @@ export function ChatInterface() {
                     </div>
                 </div>
                 <div className="flex items-center gap-2">
-                    {sessionInfo && (
+                    {sessionId && (
                         <span className="text-xs text-slate-400">
-                            Session: {sessionInfo.session_id.slice(0, 8)}...
+                            Session: {sessionId.slice(0, 8)}...
                         </span>
                     )}
                     <button
-                        onClick={createSession}
+                        onClick={startSession}
                         className="rounded-lg p-2 text-slate-400 transition-colors hover:bg-slate-100 hover:text-slate-600"
                         title="New conversation"
                     >
@@ -218,7 +205,7 @@ export function ChatInterface() {
             <MessageList messages={messages} isLoading={isLoading} />
 
             {/* Input */}
-            <ChatInput onSend={sendMessage} disabled={isLoading || !sessionInfo} />
+            <ChatInput onSend={sendMessage} disabled={isLoading || !sessionId} />
         </div>
     );
 }
@@ -0,0 +1,321 @@
+"""
+Backend Load-testing Benchmark
+사용법: python script/benchmark.py --spawn --scenarios session,run_sse,stream,upload --concurrency 8 --requests 64
+
+Drives the backend's HTTP endpoints at a fixed concurrency and reports
+latency percentiles, time to first token and throughput as JSON:
+
+- session:  POST /chat/session
+- run_sse:  POST /run_sse (college_agent, streaming) on a fresh session
+- stream:   POST /chat/{session_id}/stream on a fresh session
+- upload:   POST /upload/ with a small generated PDF
+
+With --spawn the harness starts the local stand-ins (script/stand_ins.py) and
+a uvicorn backend wired to them, so no Google or Pinecone traffic leaves the
+machine. Without it, --base-url must point at a running backend; raise its
+USER_RATE_* / SESSION_RATE_* limits first or most requests will get 429s.
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from stand_ins import add_stand_in_arguments, stand_ins_from_args
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+
+# Multilingual questions, taken from the query_analysis_agent prompt examples
+QUESTIONS = [
+    "해밀턴 대학교의 유학생 비율은?",
+    "하버드 학비 얼마야?",
+    "What's Stanford's acceptance rate?",
+    "윌리엄스 칼리지 입학 마감일",
+    "What SAT scores do admitted students at Georgia Tech have?",
+    "스워스모어 대학 학생 대 교수 비율",
+]
+APP_NAME = "college_agent"
+USER_ID = "user"
+# Must survive safe_pdf_filename() (which strips leading "._-") so the cleanup glob finds the saved files
+UPLOAD_PREFIX = "bench_upload_"
+
+# Unthrottled limits for the spawned backend; the benchmark measures capacity, not quotas
+SPAWN_ENV = {
+    "USER_RATE_PER_MINUTE": "1000000",
+    "USER_RATE_BURST": "1000000",
+    "SESSION_RATE_PER_MINUTE": "1000000",
+    "SESSION_RATE_BURST": "1000000",
+}
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    """p50/p95/p99 (nearest rank), mean and max, in milliseconds."""
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    ordered = sorted(values)
+
+    def rank(q: float) -> float:
+        return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered) + 0.5)) - 1))]
+
+    return {
+        "p50": round(rank(0.50) * 1000, 2),
+        "p95": round(rank(0.95) * 1000, 2),
+        "p99": round(rank(0.99) * 1000, 2),
+        "mean": round(sum(ordered) / len(ordered) * 1000, 2),
+        "max": round(ordered[-1] * 1000, 2),
+    }
+
+
+def tiny_pdf() -> bytes:
+    """A one-page PDF, enough for the upload path and read_pdf."""
+    return (
+        b"%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n"
+        b"2 0 obj<</Type/Pages/Kids[3 0 R]/Count 1>>endobj\n"
+        b"3 0 obj<</Type/Page/Parent 2 0 R/MediaBox[0 0 612 792]>>endobj\n"
+        b"trailer<</Root 1 0 R>>\n%%EOF\n"
+    )
+
+
+class Sample:
+    __slots__ = ("ok", "status", "latency", "ttft")
+
+    def __init__(self, ok: bool, status: int, latency: float, ttft: Optional[float] = None):
+        self.ok = ok
+        self.status = status
+        self.latency = latency
+        self.ttft = ttft
+
+
+async def _create_session(client: httpx.AsyncClient) -> str:
+    response = await client.post("/chat/session")
+    response.raise_for_status()
+    return response.json()["session_id"]
+
+
+async def run_session(client: httpx.AsyncClient, i: int) -> Sample:
+    started = time.perf_counter()
+    response = await client.post("/chat/session")
+    return Sample(response.status_code == 200, response.status_code, time.perf_counter() - started)
+
+
+async def run_sse(client: httpx.AsyncClient, i: int) -> Sample:
+    session_id = await _create_session(client)
+    payload = {
+        "appName": APP_NAME,
+        "userId": USER_ID,
+        "sessionId": session_id,
+        "newMessage": {"role": "user", "parts": [{"text": QUESTIONS[i % len(QUESTIONS)]}]},
+        "streaming": True,
+    }
+    started = time.perf_counter()
+    ttft = None
+    ok = False
+    async with client.stream("POST", "/run_sse", json=payload) as response:
+        async for line in response.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            event = json.loads(line[6:])
+            if event.get("error"):
+                break
+            parts = (event.get("content") or {}).get("parts") or []
+            answer = event.get("author") == APP_NAME and any(p.get("text") and not p.get("thought") for p in parts)
+            if answer and ttft is None:
+                ttft = time.perf_counter() - started
+            ok = ok or answer
+        status = response.status_code
+    return Sample(ok and status == 200, status, time.perf_counter() - started, ttft)
+
+
+async def run_stream(client: httpx.AsyncClient, i: int) -> Sample:
+    session_id = await _create_session(client)
+    started = time.perf_counter()
+    ttft = None
+    ok = False
+    async with client.stream(
+        "POST", f"/chat/{session_id}/stream", json={"message": QUESTIONS[i % len(QUESTIONS)]}
+    ) as response:
+        async for line in response.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            event = json.loads(line[6:])
+            if event["type"] == "delta" and ttft is None:
+                ttft = time.perf_counter() - started
+            elif event["type"] == "error":
+                ok = False
+                break
+            elif event["type"] == "done":
+                ok = ttft is not None
+        status = response.status_code
+    return Sample(ok and status == 200, status, time.perf_counter() - started, ttft)
+
+
+async def run_upload(client: httpx.AsyncClient, i: int) -> Sample:
+    filename = f"{UPLOAD_PREFIX}{uuid.uuid4().hex[:8]}.pdf"
+    started = time.perf_counter()
+    response = await client.post("/upload/", files={"file": (filename, tiny_pdf(), "application/pdf")})
+    ok = response.status_code == 200 and "error" not in response.json()
+    return Sample(ok, response.status_code, time.perf_counter() - started)
+
+
+SCENARIOS = {
+    "session": run_session,
+    "run_sse": run_sse,
+    "stream": run_stream,
+    "upload": run_upload,
+}
+
+
+async def run_scenario(base_url: str, name: str, requests: int, concurrency: int, timeout: float) -> Dict[str, Any]:
+    """Runs one scenario with a fixed number of concurrent workers."""
+    samples: List[Sample] = []
+    counter = iter(range(requests))
+
+    async def worker(client: httpx.AsyncClient):
+        for i in counter:
+            try:
+                samples.append(await SCENARIOS[name](client, i))
+            except Exception as e:
+                status = e.response.status_code if isinstance(e, httpx.HTTPStatusError) else 0
+                samples.append(Sample(False, status, 0.0))
+
+    limits = httpx.Limits(max_connections=concurrency * 2, max_keepalive_connections=concurrency * 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    status_codes: Dict[str, int] = {}
+    for sample in samples:
+        status_codes[str(sample.status)] = status_codes.get(str(sample.status), 0) + 1
+    ok = [sample for sample in samples if sample.ok]
+    return {
+        "requests": len(samples),
+        "ok": len(ok),
+        "errors": len(samples) - len(ok),
+        "status_codes": status_codes,
+        "concurrency": concurrency,
+        "duration_seconds": round(elapsed, 3),
+        "rps": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": percentiles([sample.latency for sample in ok]),
+        "ttft_ms": percentiles([sample.ttft for sample in ok if sample.ttft is not None]),
+    }
+
+
+def spawn_backend(port: int, extra_env: Dict[str, str], session_dir: str) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        **SPAWN_ENV,
+        **extra_env,
+        "ADK_SERVER_URL": f"http://127.0.0.1:{port}",
+        "SESSION_DB_PATH": os.path.join(session_dir, "sessions.db"),
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=project_root,  # read_pdf resolves app/data/pdfs from the working directory
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_until_up(base_url: str, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/debug/routes", timeout=2.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"Backend at {base_url} did not come up within {timeout:.0f}s")
+
+
+def remove_benchmark_uploads() -> int:
+    """Deletes the PDFs and event logs written by the upload scenario."""
+    patterns = [
+        os.path.join(project_root, "app", "data", "pdfs", f"{UPLOAD_PREFIX}*"),
+        os.path.join(project_root, "app", "data", "json", f"{UPLOAD_PREFIX}*"),
+    ]
+    paths = [path for pattern in patterns for path in glob.glob(pattern)]
+    for path in paths:
+        os.remove(path)
+    return len(paths)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the college consultant backend")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--scenarios", default="session,run_sse,stream,upload")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=32, help="Requests per scenario")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    parser.add_argument("--spawn", action="store_true", help="Start stand-ins and a backend on --base-url's port")
+    parser.add_argument("--keep-uploads", action="store_true", help="Keep files written by the upload scenario")
+    add_stand_in_arguments(parser)
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scenarios: {unknown}; choose from {sorted(SCENARIOS)}")
+
+    stand_ins = backend = None
+    session_dir = tempfile.mkdtemp(prefix="bench_sessions_")
+    try:
+        if args.spawn:
+            stand_ins = stand_ins_from_args(args).start()
+            port = httpx.URL(args.base_url).port or 8000
+            backend = spawn_backend(port, stand_ins.environment(), session_dir)
+            wait_until_up(args.base_url)
+
+        report: Dict[str, Any] = {
+            "base_url": args.base_url,
+            "spawned": args.spawn,
+            "stand_ins": {
+                "embedding_latency": args.embedding_latency,
+                "llm_latency": args.llm_latency,
+                "pinecone_latency": args.pinecone_latency,
+                "error_rates": {
+                    "embedding": args.embedding_error_rate,
+                    "llm": args.llm_error_rate,
+                    "pinecone": args.pinecone_error_rate,
+                },
+            } if args.spawn else None,
+            "scenarios": {},
+        }
+        for name in scenarios:
+            print(f"🏁 {name}: {args.requests} requests at concurrency {args.concurrency}", file=sys.stderr)
+            report["scenarios"][name] = asyncio.run(
+                run_scenario(args.base_url, name, args.requests, args.concurrency, args.timeout)
+            )
+    finally:
+        if backend:
+            backend.terminate()
+            backend.wait(timeout=30)
+        if stand_ins:
+            stand_ins.stop()
+        if not args.keep_uploads and "upload" in scenarios:
+            remove_benchmark_uploads()
+        shutil.rmtree(session_dir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
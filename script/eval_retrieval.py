@@ -0,0 +1,291 @@
+"""
+Retrieval Quality and Latency Evaluation
+사용법: python script/eval_retrieval.py --configs local,local_filtered --embedder hashing
+
+Runs the golden question set (script/retrieval_golden_set.json) against one or
+more retrieval configurations and reports recall@k, MRR and per-query latency:
+
+- pinecone           the Pinecone index (the embedder's namespace, latest academic year)
+- pinecone_filtered  Pinecone narrowed to the institutions named in the query
+- local              a LocalVectorIndex built from app/data/json
+- local_filtered     the local index narrowed the same way
+- local_hybrid       the local index fused with a BM25 index over the same records,
+                     as query_college_info searches (local_hybrid_filtered: narrowed)
+
+Hybrid configs also report fast_path_rate: the share of questions answered
+from the lexical index alone, whose latency then excludes the embedding.
+
+Each question is asked as its optimized English search_query (what
+query_college_info receives) and/or as the raw user question. A hit is a
+retrieved chunk with the expected institution and section; context_chars is
+the text the agent would receive per question.
+
+Results are compared with a saved baseline (--baseline); any drop in recall or
+MRR beyond --tolerance exits non-zero, so a latency optimisation that costs
+accuracy gets caught. Use --save-baseline to accept the current numbers.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from app.services.cds_records import known_institutions, load_records
+from app.services.embeddings import PROVIDERS, EmbeddingProvider, EmbeddingUnavailable, get_embedding_provider
+from app.services.entities import match_institutions
+from app.services.lexical_index import LexicalIndex, reciprocal_rank_fusion, rescale
+from app.services.vector_store import LocalVectorIndex
+
+from benchmark import percentiles
+
+GOLDEN_SET = os.path.join(current_dir, "retrieval_golden_set.json")
+# One baseline per embedder, e.g. script/retrieval_baseline_hashing.json
+BASELINE = os.path.join(current_dir, "retrieval_baseline_{embedder}.json")
+CONFIGS = ["pinecone", "pinecone_filtered", "local", "local_filtered", "local_hybrid", "local_hybrid_filtered"]
+QUERY_FIELDS = ["search_query", "question"]
+
+Searcher = Callable[[List[float], int, Optional[Dict[str, Any]]], List[Dict[str, Any]]]
+# (query text, its embedding, k, filter) -> (chunks, answered by the lexical fast path)
+HybridSearcher = Callable[[str, List[float], int, Optional[Dict[str, Any]]], Tuple[List[Dict[str, Any]], bool]]
+
+
+def get_local_index(provider: EmbeddingProvider, path: Optional[str], rebuild: bool) -> LocalVectorIndex:
+    if path and not rebuild and os.path.exists(os.path.splitext(path)[0] + ".npz"):
+        index = LocalVectorIndex.load(path)
+        print(f"📦 Loaded local index ({len(index)} vectors) from {path}", file=sys.stderr)
+        return index
+    started = time.perf_counter()
+    index = LocalVectorIndex.from_records(load_records(), provider.embed, provider.dimension, provider.embed_batch)
+    print(f"🔨 Built local index ({len(index)} vectors) in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    if path:
+        index.save(path)
+    return index
+
+
+def get_searchers(
+    configs: List[str], provider: EmbeddingProvider, local_index: Optional[LocalVectorIndex]
+) -> Dict[str, Union[Searcher, HybridSearcher]]:
+    # Imported lazily: the tool module pulls in the Pinecone client and ADK
+    from app.agents.sub_agents.college_agent.tools.query_pinecone import (
+        FIELD_CANDIDATE_FACTOR,
+        resolve_granularity,
+        search_scoped,
+    )
+
+    searchers: Dict[str, Union[Searcher, HybridSearcher]] = {}
+    if any(config.startswith("pinecone") for config in configs):
+        searchers["pinecone"] = lambda vector, k, flt: search_scoped(
+            vector, top_k=k, metadata_filter=flt, namespace=provider.namespace
+        )
+    if local_index is not None:
+        searchers["local"] = lambda vector, k, flt: resolve_granularity(
+            local_index.query(vector, top_k=k * FIELD_CANDIDATE_FACTOR, metadata_filter=flt), k
+        )
+    if local_index is not None and any(config.startswith("local_hybrid") for config in configs):
+        lexical_index = LexicalIndex.from_records(load_records())
+
+        def hybrid(text: str, vector: List[float], k: int, flt: Optional[Dict[str, Any]]):
+            lexical = lexical_index.query(text, top_k=k * FIELD_CANDIDATE_FACTOR, metadata_filter=flt)
+            if lexical and lexical_index.is_confident(text, lexical):
+                return resolve_granularity(rescale(lexical), k), True
+            candidates = local_index.query(vector, top_k=k * FIELD_CANDIDATE_FACTOR, metadata_filter=flt)
+            return resolve_granularity(reciprocal_rank_fusion([candidates, lexical]), k), False
+
+        searchers["local_hybrid"] = hybrid
+    return searchers
+
+
+def institution_filter(text: str) -> Optional[Dict[str, Any]]:
+    """The filter query_college_info would use once these institutions are known."""
+    institutions = match_institutions(text, known_institutions())
+    return {"institution_name": {"$in": institutions}} if institutions else None
+
+
+def evaluate(
+    golden: List[Dict[str, Any]],
+    configs: List[str],
+    query_fields: List[str],
+    ks: List[int],
+    embed: Callable[[str], List[float]],
+    searchers: Dict[str, Union[Searcher, HybridSearcher]],
+) -> Dict[str, Any]:
+    max_k = max(ks)
+    results: Dict[str, Any] = {}
+    for field in query_fields:
+        embedded = []
+        for item in golden:
+            text = item.get(field) or item["question"]
+            started = time.perf_counter()
+            try:
+                vector = embed(text)
+            except EmbeddingUnavailable as e:
+                print(f"❌ Embedding failed for {item['id']}: {e}", file=sys.stderr)
+                vector = []
+            embedded.append((item, text, vector, time.perf_counter() - started))
+
+        for config in configs:
+            search = searchers[config.replace("_filtered", "")]
+            filtered = config.endswith("_filtered")
+            hybrid = "_hybrid" in config
+            fast_paths = 0
+            ranks: List[Optional[int]] = []
+            search_seconds: List[float] = []
+            total_seconds: List[float] = []
+            context_chars: List[int] = []
+            per_query = []
+            for item, text, vector, embed_seconds in embedded:
+                rank = None
+                fast_path = False
+                if vector:
+                    flt = institution_filter(text) if filtered else None
+                    started = time.perf_counter()
+                    try:
+                        if hybrid:
+                            chunks, fast_path = search(text, vector, max_k, flt)
+                        else:
+                            chunks = search(vector, max_k, flt)
+                    except Exception as e:
+                        print(f"❌ {config} failed for {item['id']}: {e}", file=sys.stderr)
+                        chunks = []
+                    elapsed = time.perf_counter() - started
+                    fast_paths += fast_path
+                    search_seconds.append(elapsed)
+                    # The fast path answers before the query would have been embedded
+                    total_seconds.append(elapsed if fast_path else embed_seconds + elapsed)
+                    context_chars.append(sum(len(chunk["text"]) for chunk in chunks))
+                    for position, chunk in enumerate(chunks, 1):
+                        if chunk["institution_name"] == item["institution"] and chunk["section"] == item["section"]:
+                            rank = position
+                            break
+                ranks.append(rank)
+                per_query.append({"id": item["id"], "rank": rank, **({"fast_path": fast_path} if hybrid else {})})
+
+            n = len(ranks) or 1
+            metrics: Dict[str, Any] = {
+                f"recall@{k}": round(sum(1 for r in ranks if r is not None and r <= k) / n, 4) for k in ks
+            }
+            metrics[f"mrr@{max_k}"] = round(sum(1 / r for r in ranks if r is not None) / n, 4)
+            metrics["latency_ms"] = {
+                "embedding": percentiles([e[3] for e in embedded]),
+                "search": percentiles(search_seconds),
+                "total": percentiles(total_seconds),
+            }
+            # Text handed to college_agent per question at the largest k
+            metrics["context_chars"] = round(sum(context_chars) / len(context_chars)) if context_chars else 0
+            if hybrid:
+                metrics["fast_path_rate"] = round(fast_paths / n, 4)
+            metrics["misses"] = [q["id"] for q in per_query if q["rank"] is None]
+            metrics["per_query"] = per_query
+            results[f"{config}/{field}"] = metrics
+    return results
+
+
+def diff_against_baseline(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Prints metric deltas and returns the accuracy regressions."""
+    regressions = []
+    for name, metrics in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            print(f"🆕 {name}: no baseline", file=sys.stderr)
+            continue
+        for metric, value in metrics.items():
+            if not metric.startswith(("recall@", "mrr@")) or metric not in previous:
+                continue
+            delta = value - previous[metric]
+            marker = "🔻" if delta < -tolerance else ("🔺" if delta > 0 else "  ")
+            print(f"{marker} {name} {metric}: {previous[metric]:.4f} -> {value:.4f} ({delta:+.4f})", file=sys.stderr)
+            if delta < -tolerance:
+                regressions.append(f"{name} {metric} {previous[metric]:.4f} -> {value:.4f}")
+        old_p95 = (previous.get("latency_ms") or {}).get("total", {}).get("p95")
+        new_p95 = metrics["latency_ms"]["total"]["p95"]
+        if old_p95 and new_p95:
+            print(f"   {name} total p95: {old_p95}ms -> {new_p95}ms", file=sys.stderr)
+        if "fast_path_rate" in metrics:
+            print(f"   {name} fast path: {previous.get('fast_path_rate', 0):.0%} -> {metrics['fast_path_rate']:.0%}", file=sys.stderr)
+        if previous.get("context_chars"):
+            print(f"   {name} context: {previous['context_chars']} -> {metrics['context_chars']} chars", file=sys.stderr)
+        newly_missed = sorted(set(metrics["misses"]) - set(previous.get("misses", [])))
+        if newly_missed:
+            print(f"   {name} newly missed: {', '.join(newly_missed)}", file=sys.stderr)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate retrieval quality and latency")
+    parser.add_argument("--golden", default=GOLDEN_SET)
+    parser.add_argument("--configs", default="local,local_filtered", help=f"Comma-separated: {', '.join(CONFIGS)}")
+    parser.add_argument("--query-fields", default="search_query,question", help="search_query and/or question")
+    parser.add_argument("--k", default="1,3,5", help="Comma-separated cut-offs for recall@k")
+    parser.add_argument("--embedder", choices=list(PROVIDERS), default="gemini", help="Embedding provider")
+    parser.add_argument("--local-index", help="Load the local index from (or save it to) this .npz path")
+    parser.add_argument("--rebuild-local-index", action="store_true")
+    parser.add_argument("--baseline", help="Baseline file (default: script/retrieval_baseline_<embedder>.json)")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.0, help="Allowed drop in recall/MRR")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    configs = [c.strip() for c in args.configs.split(",") if c.strip()]
+    query_fields = [f.strip() for f in args.query_fields.split(",") if f.strip()]
+    ks = sorted(int(k) for k in args.k.split(","))
+    if any(c not in CONFIGS for c in configs) or any(f not in QUERY_FIELDS for f in query_fields):
+        parser.error(f"configs must be in {CONFIGS} and query fields in {QUERY_FIELDS}")
+
+    args.baseline = args.baseline or BASELINE.format(embedder=args.embedder)
+
+    with open(args.golden, "r", encoding="utf-8") as f:
+        golden = json.load(f)
+
+    provider = get_embedding_provider(args.embedder)
+    local_index = None
+    if any(c.startswith("local") for c in configs):
+        local_index = get_local_index(provider, args.local_index, args.rebuild_local_index)
+    searchers = get_searchers(configs, provider, local_index)
+
+    results = evaluate(golden, configs, query_fields, ks, provider.embed, searchers)
+    report = {
+        "settings": {
+            "golden_set": os.path.relpath(args.golden, project_root),
+            "questions": len(golden),
+            "embedder": args.embedder,
+            "k": ks,
+        },
+        "results": results,
+    }
+
+    exit_code = 0
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"💾 Baseline saved to {args.baseline}", file=sys.stderr)
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = diff_against_baseline(results, baseline, args.tolerance)
+        report["regressions"] = regressions
+        if regressions:
+            print(f"❌ {len(regressions)} accuracy regressions against the baseline", file=sys.stderr)
+            exit_code = 1
+
+    summary = {
+        name: {k: v for k, v in metrics.items() if k not in ("per_query",)}
+        for name, metrics in results.items()
+    }
+    print(json.dumps({**report, "results": summary}, indent=2, ensure_ascii=False))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Two-stage Vector Search Evaluation (recall and latency against exact search)
+사용법: python script/eval_vector_search.py --embedder hashing --sizes 0,20000,100000 --first-pass 768:int8,256:float16,128:int8
+
+Compares LocalVectorIndex's compressed first pass plus full-dimension rerank
+(see app/services/vector_store.py) with the exact full scan, for each
+--first-pass setting given as <dimensions>:<none|float16|int8>:
+
+- recall@k: overlap of the two-stage top k with the exact top k
+- search latency p50/p95/p99 of both, and the speed-up at p50
+- memory held by the full vectors and by the first-pass copy
+
+The corpus is the local index built from app/data/json (or --local-index).
+--sizes grows it with synthetic vectors, perturbed copies of the real ones
+tagged with earlier academic years, to see how the numbers hold up at
+thousands of institutions across many years; 0 means the real corpus only.
+Queries are the golden set's search queries plus perturbed corpus vectors.
+
+Recall here is measured against the exact search, not against the golden
+answers; to check answer quality, run script/eval_retrieval.py with
+LOCAL_INDEX_FIRST_PASS_DIM and LOCAL_INDEX_QUANTIZATION set.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+import numpy as np
+
+from app.services.embeddings import PROVIDERS, EmbeddingUnavailable, get_embedding_provider
+from app.services.vector_store import QUANTIZATIONS, LocalVectorIndex
+
+from benchmark import percentiles
+from eval_retrieval import GOLDEN_SET, get_local_index
+
+
+def parse_first_pass(spec: str) -> List[Tuple[int, str]]:
+    settings = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        dimension, _, quantization = item.partition(":")
+        quantization = quantization or "none"
+        if quantization not in QUANTIZATIONS:
+            raise SystemExit(f"Unknown quantization in {item!r}; expected one of {', '.join(QUANTIZATIONS)}")
+        settings.append((int(dimension), quantization))
+    return settings
+
+
+def scaled_index(base: LocalVectorIndex, size: int, noise: float, rng: np.random.Generator) -> LocalVectorIndex:
+    """A copy of base grown to `size` vectors with perturbed copies of its rows."""
+    index = LocalVectorIndex(base.dimension, first_pass_dim=0)
+    vectors = [
+        {"id": vector_id, "values": row, "metadata": meta}
+        for vector_id, row, meta in zip(base.ids, base._matrix, base.metadata)
+    ]
+    for n in range(max(0, size - len(base))):
+        source = n % len(base)
+        meta = dict(base.metadata[source])
+        meta["academic_year"] = f"synthetic-{n // len(base) + 1}"
+        row = base._matrix[source] + rng.normal(0, noise, base.dimension).astype(np.float32)
+        vectors.append({"id": f"{base.ids[source]}#s{n}", "values": row, "metadata": meta})
+    index.upsert(vectors)
+    return index
+
+
+def build_queries(
+    index: LocalVectorIndex, golden_vectors: List[List[float]], sampled: int, noise: float, rng: np.random.Generator
+) -> List[np.ndarray]:
+    queries = [np.asarray(vector, dtype=np.float32) for vector in golden_vectors]
+    for row in rng.choice(len(index), size=min(sampled, len(index)), replace=False):
+        queries.append(index._matrix[row] + rng.normal(0, noise, index.dimension).astype(np.float32))
+    return queries
+
+
+def timed_search(index: LocalVectorIndex, queries: List[np.ndarray], top_k: int, exact: bool):
+    results, seconds = [], []
+    index.search(queries[0], top_k, exact=exact)  # builds the first-pass copy outside the timings
+    for query in queries:
+        started = time.perf_counter()
+        hits = index.search(query, top_k, exact=exact)
+        seconds.append(time.perf_counter() - started)
+        results.append([vector_id for vector_id, _, _ in hits])
+    return results, seconds
+
+
+def evaluate(
+    index: LocalVectorIndex, queries: List[np.ndarray], settings: List[Tuple[int, str]], top_k: int
+) -> Dict[str, Any]:
+    exact_ids, exact_seconds = timed_search(index, queries, top_k, exact=True)
+    exact_latency = percentiles(exact_seconds)
+    report: Dict[str, Any] = {
+        "vectors": len(index),
+        "queries": len(queries),
+        "exact": {"latency_ms": exact_latency, "memory_mb": round(index._matrix.nbytes / 2**20, 2)},
+        "first_pass": {},
+    }
+    for dimension, quantization in settings:
+        index.configure_first_pass(dimension, quantization)
+        approx_ids, seconds = timed_search(index, queries, top_k, exact=False)
+        overlaps = [
+            len(set(approx) & set(exact)) / (len(exact) or 1) for approx, exact in zip(approx_ids, exact_ids)
+        ]
+        latency = percentiles(seconds)
+        memory = index.memory_bytes()
+        report["first_pass"][f"{dimension}:{quantization}"] = {
+            f"recall@{top_k}": round(sum(overlaps) / len(overlaps), 4),
+            "min_recall": round(min(overlaps), 4),
+            "latency_ms": latency,
+            "speedup_p50": round(exact_latency["p50"] / latency["p50"], 2) if latency["p50"] else None,
+            "first_pass_memory_mb": round(memory["first_pass"] / 2**20, 2),
+        }
+    index.configure_first_pass(0)
+    return report
+
+
+def render_markdown(reports: List[Dict[str, Any]], top_k: int, candidates: int) -> str:
+    lines = [f"## Two-stage vector search vs exact (top {top_k}, {candidates} rerank candidates)", ""]
+    for report in reports:
+        exact = report["exact"]
+        lines += [
+            f"### {report['vectors']} vectors, {report['queries']} queries",
+            "",
+            f"Exact: p50 {exact['latency_ms']['p50']}ms, p95 {exact['latency_ms']['p95']}ms, "
+            f"{exact['memory_mb']}MB of full vectors",
+            "",
+            f"| First pass | Recall@{top_k} | Min recall | p50 (ms) | p95 (ms) | Speed-up | First-pass MB |",
+            "|---|---:|---:|---:|---:|---:|---:|",
+        ]
+        for name, row in report["first_pass"].items():
+            lines.append(
+                f"| {name} | {row[f'recall@{top_k}']} | {row['min_recall']} | {row['latency_ms']['p50']} | "
+                f"{row['latency_ms']['p95']} | {row['speedup_p50']}x | {row['first_pass_memory_mb']} |"
+            )
+        lines.append("")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall and latency of the two-stage local vector search")
+    parser.add_argument("--embedder", choices=list(PROVIDERS), default="gemini", help="Embedding provider")
+    parser.add_argument("--local-index", help="Load the local index from (or save it to) this .npz path")
+    parser.add_argument("--rebuild-local-index", action="store_true")
+    parser.add_argument("--sizes", default="0,20000", help="Comma-separated corpus sizes; 0 = real corpus only")
+    parser.add_argument("--first-pass", default="768:float16,768:int8,256:none,256:int8,128:int8,64:int8")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--candidates", type=int, help="Rerank candidates (default: LOCAL_INDEX_RERANK_CANDIDATES)")
+    parser.add_argument("--sampled-queries", type=int, default=200, help="Perturbed corpus vectors used as queries")
+    parser.add_argument("--noise", type=float, default=0.02, help="Per-component noise of synthetic vectors and queries")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    settings = parse_first_pass(args.first_pass)
+    provider = get_embedding_provider(args.embedder)
+    base = get_local_index(provider, args.local_index, args.rebuild_local_index)
+    if not len(base):
+        raise SystemExit("❌ The local index is empty; extract some CDS records first")
+
+    with open(GOLDEN_SET, "r", encoding="utf-8") as f:
+        golden = json.load(f)
+    golden_vectors = []
+    for item in golden:
+        try:
+            golden_vectors.append(provider.embed(item.get("search_query") or item["question"]))
+        except EmbeddingUnavailable as e:
+            print(f"❌ Embedding failed for {item['id']}: {e}", file=sys.stderr)
+
+    rng = np.random.default_rng(args.seed)
+    reports = []
+    for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+        index = scaled_index(base, size, args.noise, rng) if size > len(base) else base
+        if args.candidates:
+            index.rerank_candidates = args.candidates
+        queries = build_queries(index, golden_vectors, args.sampled_queries, args.noise, rng)
+        print(f"🔎 {len(index)} vectors, {len(queries)} queries", file=sys.stderr)
+        reports.append(evaluate(index, queries, settings, args.top_k))
+
+    candidates = args.candidates or base.rerank_candidates
+    print(render_markdown(reports, args.top_k, candidates))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"embedder": args.embedder, "top_k": args.top_k, "candidates": candidates, "reports": reports}, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,498 @@
+"""
+Batch CDS Extraction
+사용법: python script/extract_batch.py [--workers 2] [--rpm 30] [--only harvard,stanford] [--force] [--dry-run] [--no-llm-repair] [--check]
+
+Extracts every PDF in app/data/pdfs with the same extraction pipeline the
+/upload/ endpoint uses (root_agent -> extract_pdf_agent), but in-process and
+across a pool of workers instead of one HTTP request per file. The event logs
+are written to app/data/json/<pdf>_full_response.json, the layout the
+indexer and the backend already read.
+
+- Skips PDFs whose extraction is current: the output holds a structured
+  record and was made from the same PDF bytes (or, for outputs this script
+  did not write, such as the committed ones, simply holds a record).
+  --force re-extracts anyway.
+- Rate-limit aware: --rpm caps Gemini requests per minute across all workers,
+  and a 429 / RESOURCE_EXHAUSTED pauses every worker for the Retry-After /
+  retryDelay the API sent (or an exponential backoff) before retrying.
+- Resumable: each finished PDF is appended to
+  app/data/json/_extraction_progress.jsonl, so an interrupted run picks up
+  where it stopped. Re-extracted files are dropped from the indexer's
+  processed lists so the next indexer run embeds the new record.
+- Repairs locally first: each new record goes through
+  app/services/record_repair.py (numbers, percentages, deadlines,
+  cross-field checks). Only the fields that still fail are sent back to the
+  model, in one repair_fields_agent call, and its corrections are appended to
+  the event log. --no-llm-repair skips that call; --check reports what local
+  repair does to the existing outputs without calling the model at all.
+
+Ends with a throughput and token report (--output writes it as JSON).
+"""
+
+import argparse
+import asyncio
+import glob
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from app.services.env import load_env
+
+# Before the app imports below, which read their settings at import time
+load_env()
+
+from google.adk.plugins.base_plugin import BasePlugin
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from app.agents.root_agent.agent import get_root_agent
+from app.agents.sub_agents.extract_pdf_agent import create_repair_fields_agent
+from app.services.cds_records import JSON_DIR, extract_structured_data, load_record
+from app.services.governor import TokenBucket
+from app.services.metrics import observe_stage
+from app.services.record_repair import (
+    RECORD_REPAIR_ENABLED,
+    RepairResult,
+    apply_corrections,
+    describe_failures,
+    extract_field_corrections,
+    repair_record,
+)
+
+from benchmark import percentiles
+
+PDF_DIR = os.path.join(project_root, "app", "data", "pdfs")
+APP_NAME = "root_agent"
+USER_ID = "admin"
+# Not .json: load_records() would read a .json progress file as a CDS record
+PROGRESS_FILE = "_extraction_progress.jsonl"
+# Same file names as script/indexer.py's processed_list_file()
+PROCESSED_LISTS = "_processed_cds_lists*.txt"
+
+RETRY_DELAY_RE = re.compile(r"retryDelay['\"]?\s*:\s*['\"]?(\d+(?:\.\d+)?)s")
+TOKEN_KINDS = {
+    "prompt": "prompt_token_count",
+    "candidates": "candidates_token_count",
+    "thoughts": "thoughts_token_count",
+    "total": "total_token_count",
+}
+
+
+def output_name(pdf_name: str) -> str:
+    return f"{pdf_name}_full_response.json"
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_progress(json_dir: str) -> Dict[str, Dict[str, Any]]:
+    """Latest progress entry per PDF; a torn last line from a crash is ignored."""
+    progress: Dict[str, Dict[str, Any]] = {}
+    path = os.path.join(json_dir, PROGRESS_FILE)
+    if not os.path.exists(path):
+        return progress
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            progress[entry["pdf"]] = entry
+    return progress
+
+
+def append_progress(json_dir: str, entry: Dict[str, Any]) -> None:
+    with open(os.path.join(json_dir, PROGRESS_FILE), "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def is_current(pdf_path: str, sha256: str, json_dir: str, progress: Dict[str, Dict[str, Any]]) -> bool:
+    """
+    True when the saved output holds a record extracted from these PDF bytes.
+
+    An output without a progress entry (extracted through /upload/, before
+    progress was tracked, or checked out with the repository) counts as
+    current whenever it holds a record: file times say nothing after a git
+    checkout. --force re-extracts those.
+    """
+    name = os.path.basename(pdf_path)
+    output = os.path.join(json_dir, output_name(name))
+    if not os.path.exists(output) or load_record(output) is None:
+        return False
+    entry = progress.get(name)
+    if entry is not None:
+        return entry.get("status") == "done" and entry.get("sha256") == sha256
+    return True
+
+
+def forget_indexed(json_dir: str, output: str) -> None:
+    """Removes a re-extracted output from the indexer's processed lists."""
+    for list_file in glob.glob(os.path.join(json_dir, PROCESSED_LISTS)):
+        with open(list_file, "r", encoding="utf-8") as f:
+            names = [line.strip() for line in f if line.strip()]
+        if output in names:
+            with open(list_file, "w", encoding="utf-8") as f:
+                f.writelines(name + "\n" for name in names if name != output)
+
+
+def rate_limit_delay(error: Exception) -> Optional[float]:
+    """Seconds to pause for a 429 / RESOURCE_EXHAUSTED error, or None for other errors."""
+    text = str(error)
+    if getattr(error, "code", None) != 429 and "RESOURCE_EXHAUSTED" not in text:
+        return None
+    match = RETRY_DELAY_RE.search(text)
+    return float(match.group(1)) if match else 0.0
+
+
+def is_transient(error: Exception) -> bool:
+    code = getattr(error, "code", None)
+    return (isinstance(code, int) and code >= 500) or isinstance(error, (asyncio.TimeoutError, ConnectionError))
+
+
+class RequestPacer(BasePlugin):
+    """Holds every Gemini request until the shared rate limit and any 429 pause allow it."""
+
+    def __init__(self, requests_per_minute: float):
+        super().__init__(name="request_pacer")
+        self.bucket = TokenBucket(requests_per_minute / 60.0, 1) if requests_per_minute > 0 else None
+        self.paused_until = 0.0
+        self.requests = 0
+        self.waited_seconds = 0.0
+
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    async def wait(self) -> None:
+        started = time.monotonic()
+        while True:
+            delay = self.paused_until - time.monotonic()
+            if delay <= 0 and self.bucket is not None:
+                delay = self.bucket.try_take()
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+        self.waited_seconds += time.monotonic() - started
+
+    async def before_model_callback(self, *, callback_context, llm_request):
+        await self.wait()
+        self.requests += 1
+        return None
+
+
+class BatchExtractor:
+    """Runs the extraction pipeline for a queue of PDFs on a pool of asyncio workers."""
+
+    def __init__(
+        self, json_dir: str, workers: int, pacer: RequestPacer, max_attempts: int, timeout: float, llm_repair: bool = True
+    ):
+        self.json_dir = json_dir
+        self.workers = workers
+        self.pacer = pacer
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.llm_repair = llm_repair
+        session_service = InMemorySessionService()
+        self.runner = Runner(
+            app_name=APP_NAME,
+            agent=get_root_agent(),
+            session_service=session_service,
+            plugins=[pacer],
+        )
+        self.repair_runner = Runner(
+            app_name=APP_NAME,
+            agent=create_repair_fields_agent(),
+            session_service=session_service,
+            plugins=[pacer],
+        )
+        self.results: List[Dict[str, Any]] = []
+
+    async def _run_agent(self, runner: Runner, text: str) -> Dict[str, Any]:
+        session_id = str(uuid.uuid4())
+        session_service = runner.session_service
+        await session_service.create_session(app_name=APP_NAME, user_id=USER_ID, session_id=session_id)
+        message = types.Content(role="user", parts=[types.Part(text=text)])
+        events = []
+        tokens = dict.fromkeys(TOKEN_KINDS, 0)
+        try:
+            async for event in runner.run_async(user_id=USER_ID, session_id=session_id, new_message=message):
+                # Same serialisation as ADK's /run_sse, which /upload/ saves
+                events.append(json.loads(event.model_dump_json(exclude_none=True, by_alias=True)))
+                if event.usage_metadata and not event.partial:
+                    for kind, attr in TOKEN_KINDS.items():
+                        tokens[kind] += getattr(event.usage_metadata, attr, None) or 0
+        finally:
+            await session_service.delete_session(app_name=APP_NAME, user_id=USER_ID, session_id=session_id)
+        return {"events": events, "tokens": tokens}
+
+    async def _extract_once(self, pdf_name: str) -> Dict[str, Any]:
+        return await self._run_agent(self.runner, f"Extract data from PDF: {pdf_name}")
+
+    async def _repair(self, pdf_name: str, run: Dict[str, Any], entry: Dict[str, Any]) -> None:
+        """
+        Repairs the extracted record locally and re-asks the model for the fields that still fail.
+
+        The repair agent's events are appended to run["events"] (load_record()
+        applies their corrections); the field counts go into the progress entry.
+        """
+        record = extract_structured_data(run["events"], entry["output"])
+        if not isinstance(record, dict):
+            return
+        result = repair_record(record)
+        entry["repaired_fields"] = len(result.changes)
+        if result.failures and self.llm_repair:
+            entry["llm_repair_fields"] = result.failing_paths
+            text = f"Re-check these fields in PDF: {pdf_name}\n{describe_failures(result.failures)}"
+            try:
+                fix = await asyncio.wait_for(self._run_agent(self.repair_runner, text), timeout=self.timeout)
+            except Exception as e:
+                # The record is kept either way; its failing fields are reported below
+                print(f"⚠️ Field repair for {pdf_name} failed: {e}")
+            else:
+                run["events"].extend(fix["events"])
+                for kind, count in fix["tokens"].items():
+                    run["tokens"][kind] += count
+                result = repair_record(apply_corrections(record, extract_field_corrections(fix["events"])))
+        entry["failing_fields"] = result.failing_paths
+
+    async def extract(self, pdf_path: str, sha256: str) -> Dict[str, Any]:
+        """Extracts one PDF with retries and writes its event log; returns the progress entry."""
+        pdf_name = os.path.basename(pdf_path)
+        output = output_name(pdf_name)
+        started = time.perf_counter()
+        error = None
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                run = await asyncio.wait_for(self._extract_once(pdf_name), timeout=self.timeout)
+                break
+            except Exception as e:
+                error = e
+                delay = rate_limit_delay(e)
+                if attempt == self.max_attempts or (delay is None and not is_transient(e)):
+                    run = None
+                    break
+                backoff = min(60.0, 2.0 ** attempt) * (0.5 + random.random() / 2)
+                if delay is not None:
+                    # Quota errors affect every worker, so all of them back off
+                    self.pacer.pause(max(delay, backoff))
+                    print(f"⏳ Rate limited on {pdf_name}; pausing all workers for {max(delay, backoff):.1f}s")
+                else:
+                    print(f"🔁 {pdf_name} attempt {attempt} failed ({e}); retrying in {backoff:.1f}s")
+                    await asyncio.sleep(backoff)
+
+        elapsed = time.perf_counter() - started
+        entry: Dict[str, Any] = {
+            "pdf": pdf_name,
+            "sha256": sha256,
+            "output": output,
+            "attempts": attempt,
+            "seconds": round(elapsed, 2),
+            "finished_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        }
+        record = None
+        if run is not None:
+            if RECORD_REPAIR_ENABLED:
+                await self._repair(pdf_name, run, entry)
+            path = os.path.join(self.json_dir, output)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(run["events"], f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, path)
+            record = load_record(path)
+            entry["tokens"] = run["tokens"]
+            forget_indexed(self.json_dir, output)
+        if record is None:
+            entry["status"] = "failed"
+            entry["error"] = str(error) if run is None else "no structured record in the agent output"
+        else:
+            entry["status"] = "done"
+            entry["institution"] = (record.get("general_info") or {}).get("institution_name")
+        observe_stage("extraction.batch", elapsed, ok=entry["status"] == "done", pdf=pdf_name)
+        return entry
+
+    async def _worker(self, queue: "asyncio.Queue") -> None:
+        while True:
+            try:
+                pdf_path, sha256 = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            entry = await self.extract(pdf_path, sha256)
+            append_progress(self.json_dir, entry)
+            self.results.append(entry)
+            icon = "✅" if entry["status"] == "done" else "❌"
+            detail = entry.get("institution") or entry.get("error")
+            print(f"{icon} [{len(self.results)}] {entry['pdf']} in {entry['seconds']}s ({detail})")
+
+    async def run(self, jobs: List[tuple]) -> None:
+        queue: asyncio.Queue = asyncio.Queue()
+        for job in jobs:
+            queue.put_nowait(job)
+        await asyncio.gather(*(self._worker(queue) for _ in range(min(self.workers, len(jobs)))))
+
+
+def check_outputs(json_dir: str) -> Dict[str, RepairResult]:
+    """Runs local repair over every saved event log (corrections applied, as load_record() does)."""
+    results: Dict[str, RepairResult] = {}
+    for path in sorted(glob.glob(os.path.join(json_dir, "*.json"))):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                events = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"❌ Failed to read {path}: {e}")
+            continue
+        record = extract_structured_data(events, os.path.basename(path))
+        if isinstance(record, dict):
+            results[os.path.basename(path)] = repair_record(apply_corrections(record, extract_field_corrections(events)))
+    return results
+
+
+def print_check(results: Dict[str, RepairResult]) -> None:
+    for name, result in results.items():
+        icon = "⚠️" if result.failures else "✅"
+        print(f"{icon} {name}: {len(result.changes)} fields repaired, {len(result.failures)} failing")
+        for change in result.changes:
+            print(f"    ✏️ {change['path']}: {change['from']!r} -> {change['to']!r}")
+        for failure in result.failures:
+            print(f"    ❌ {failure['path']} = {failure['value']!r}: {failure['reason']}")
+
+
+def build_report(results: List[Dict[str, Any]], skipped: List[str], wall_seconds: float, pacer: RequestPacer) -> Dict[str, Any]:
+    done = [r for r in results if r["status"] == "done"]
+    llm_repaired = [r for r in done if r.get("llm_repair_fields")]
+    tokens = {kind: sum((r.get("tokens") or {}).get(kind, 0) for r in results) for kind in TOKEN_KINDS}
+    minutes = wall_seconds / 60 or 1
+    return {
+        "extracted": len(done),
+        "failed": [{"pdf": r["pdf"], "error": r.get("error")} for r in results if r["status"] != "done"],
+        "skipped": len(skipped),
+        "wall_seconds": round(wall_seconds, 2),
+        "files_per_minute": round(len(done) / minutes, 2),
+        "ms_per_file": percentiles([r["seconds"] for r in results]),
+        "retries": sum(r["attempts"] - 1 for r in results),
+        "gemini_requests": pacer.requests,
+        "rate_limit_wait_seconds": round(pacer.waited_seconds, 2),
+        "tokens": tokens,
+        "tokens_per_file": round(tokens["total"] / len(done)) if done else None,
+        "tokens_per_minute": round(tokens["total"] / minutes),
+        "locally_repaired_fields": sum(r.get("repaired_fields", 0) for r in done),
+        "llm_repair_files": len(llm_repaired),
+        "llm_repair_fields": sum(len(r["llm_repair_fields"]) for r in llm_repaired),
+        "still_failing": {r["pdf"]: r["failing_fields"] for r in done if r.get("failing_fields")},
+    }
+
+
+def render_markdown(report: Dict[str, Any]) -> str:
+    per_file = report["ms_per_file"]
+    tokens = report["tokens"]
+    lines = [
+        "## Batch extraction",
+        "",
+        f"{report['extracted']} extracted, {len(report['failed'])} failed, {report['skipped']} already current, "
+        f"in {report['wall_seconds']}s ({report['files_per_minute']} files/min)",
+        "",
+        "| Metric | Value |",
+        "|---|---:|",
+        f"| Time per file p50 / p95 / max (ms) | {per_file['p50']} / {per_file['p95']} / {per_file['max']} |",
+        f"| Retries | {report['retries']} |",
+        f"| Gemini requests | {report['gemini_requests']} |",
+        f"| Waiting on rate limits (s, summed over workers) | {report['rate_limit_wait_seconds']} |",
+        f"| Tokens prompt / output / thoughts | {tokens['prompt']} / {tokens['candidates']} / {tokens['thoughts']} |",
+        f"| Tokens total | {tokens['total']} |",
+        f"| Tokens per file | {report['tokens_per_file']} |",
+        f"| Tokens per minute | {report['tokens_per_minute']} |",
+        f"| Fields repaired locally | {report['locally_repaired_fields']} |",
+        f"| Fields re-asked of the model (files) | {report['llm_repair_fields']} ({report['llm_repair_files']}) |",
+    ]
+    for failure in report["failed"]:
+        lines.append(f"\n❌ {failure['pdf']}: {failure['error']}")
+    for pdf, paths in report["still_failing"].items():
+        lines.append(f"\n⚠️ {pdf} still fails validation: {', '.join(paths)}")
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract every CDS PDF in app/data/pdfs with a worker pool")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("EXTRACTION_MAX_IN_FLIGHT", "2")))
+    parser.add_argument("--rpm", type=float, default=float(os.getenv("EXTRACTION_REQUESTS_PER_MINUTE", "30")),
+                        help="Gemini requests per minute across all workers (0 = unlimited)")
+    parser.add_argument("--max-attempts", type=int, default=4)
+    parser.add_argument("--timeout", type=float, default=600.0, help="Seconds per extraction attempt")
+    parser.add_argument("--only", help="Comma-separated substrings; only PDFs whose name contains one of them")
+    parser.add_argument("--force", action="store_true", help="Re-extract PDFs that are already current")
+    parser.add_argument("--dry-run", action="store_true", help="List what would be extracted and exit")
+    parser.add_argument("--no-llm-repair", action="store_true",
+                        help="Only repair records locally; do not re-ask the model for fields that still fail")
+    parser.add_argument("--check", action="store_true",
+                        help="Report what local repair changes and which fields fail in the existing outputs, then exit")
+    parser.add_argument("--json-dir", default=JSON_DIR, help="Where the event logs go (default: app/data/json)")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+    # read_pdf resolves app/data/pdfs against the working directory
+    os.chdir(project_root)
+    os.makedirs(args.json_dir, exist_ok=True)
+
+    if args.check:
+        print_check(check_outputs(args.json_dir))
+        return
+
+    pdfs = sorted(glob.glob(os.path.join(PDF_DIR, "*.pdf")) + glob.glob(os.path.join(PDF_DIR, "*.PDF")))
+    if args.only:
+        needles = [n.strip().lower() for n in args.only.split(",") if n.strip()]
+        pdfs = [p for p in pdfs if any(n in os.path.basename(p).lower() for n in needles)]
+
+    progress = load_progress(args.json_dir)
+    jobs, skipped = [], []
+    for pdf_path in pdfs:
+        sha256 = file_sha256(pdf_path)
+        if not args.force and is_current(pdf_path, sha256, args.json_dir, progress):
+            skipped.append(os.path.basename(pdf_path))
+        else:
+            jobs.append((pdf_path, sha256))
+
+    print(f"📚 {len(pdfs)} PDFs: {len(jobs)} to extract, {len(skipped)} already current")
+    if args.dry_run:
+        for pdf_path, _ in jobs:
+            print(f"  - {os.path.basename(pdf_path)}")
+        return
+    if not jobs:
+        return
+
+    pacer = RequestPacer(args.rpm)
+    extractor = BatchExtractor(args.json_dir, max(1, args.workers), pacer, max(1, args.max_attempts), args.timeout,
+                               llm_repair=not args.no_llm_repair)
+    started = time.perf_counter()
+    try:
+        asyncio.run(extractor.run(jobs))
+    except KeyboardInterrupt:
+        print("\n⏹️ Interrupted; finished PDFs are saved and will be skipped next time")
+    report = build_report(extractor.results, skipped, time.perf_counter() - started, pacer)
+    print(render_markdown(report))
+    if report["extracted"]:
+        print("➡️ Run script/indexer.py to index the new records")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+    if report["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
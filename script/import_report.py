@@ -0,0 +1,155 @@
+"""
+Import-time Report and Startup Budget Check
+사용법: python script/import_report.py --module app.main --repeat 3 --budget-ms 5000
+
+Imports a module (app.main by default) in fresh interpreters with
+`python -X importtime` and summarises where the time goes:
+
+- wall time of the import (median over --repeat runs)
+- packages by total self time (google, pydantic, fastapi, ...)
+- the slowest individual modules by self time
+- this repo's own modules (app.*) by cumulative time, which shows which of
+  our imports pull in the expensive dependencies
+
+Exits non-zero when the median import time is over --budget-ms, so worker
+boot and --reload regressions can be caught in CI. The default budget is the
+server's STARTUP_BUDGET_SECONDS.
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+from typing import Any, Dict, List
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", "5"))
+FIRST_PARTY = ("app",)
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def run_import(module: str, env: Dict[str, str]) -> Dict[str, Any]:
+    """Imports the module in a fresh interpreter and returns its wall time and -X importtime rows."""
+    code = (
+        "import time; started = time.perf_counter(); "
+        f"import {module}; "
+        "print(time.perf_counter() - started)"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=project_root,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append({
+                "module": name,
+                "self_us": int(self_us),
+                "cumulative_us": int(cumulative_us),
+                "depth": len(indent) // 2,
+            })
+    return {"wall_seconds": float(result.stdout.strip().splitlines()[-1]), "rows": rows}
+
+
+def summarize(runs: List[Dict[str, Any]], top: int) -> Dict[str, Any]:
+    """Aggregates the fastest run's rows (least noise) and the wall times of all runs."""
+    walls = [run["wall_seconds"] for run in runs]
+    rows = min(runs, key=lambda run: run["wall_seconds"])["rows"]
+
+    by_package: Dict[str, int] = defaultdict(int)
+    for row in rows:
+        by_package[row["module"].split(".")[0]] += row["self_us"]
+
+    first_party = [row for row in rows if row["module"].split(".")[0] in FIRST_PARTY]
+    return {
+        "wall_ms": {
+            "median": round(statistics.median(walls) * 1000, 1),
+            "min": round(min(walls) * 1000, 1),
+            "max": round(max(walls) * 1000, 1),
+        },
+        "modules_imported": len(rows),
+        "packages": [
+            {"package": name, "self_ms": round(us / 1000, 1)}
+            for name, us in sorted(by_package.items(), key=lambda item: -item[1])[:top]
+        ],
+        "slowest_modules": [
+            {"module": row["module"], "self_ms": round(row["self_us"] / 1000, 1)}
+            for row in sorted(rows, key=lambda row: -row["self_us"])[:top]
+        ],
+        "first_party": [
+            {"module": row["module"], "cumulative_ms": round(row["cumulative_us"] / 1000, 1)}
+            for row in sorted(first_party, key=lambda row: -row["cumulative_us"])[:top]
+        ],
+    }
+
+
+def render_markdown(module: str, summary: Dict[str, Any], budget_ms: float) -> str:
+    wall = summary["wall_ms"]
+    status = "over budget" if wall["median"] > budget_ms else "within budget"
+    lines = [
+        f"## Import time: `{module}`",
+        "",
+        f"{wall['median']}ms median (min {wall['min']}ms, max {wall['max']}ms), "
+        f"{summary['modules_imported']} modules, budget {budget_ms:.0f}ms: {status}",
+        "",
+        "| Package | Self (ms) |",
+        "|---|---:|",
+    ]
+    lines += [f"| {p['package']} | {p['self_ms']} |" for p in summary["packages"]]
+    lines += ["", "| Slowest module | Self (ms) |", "|---|---:|"]
+    lines += [f"| {m['module']} | {m['self_ms']} |" for m in summary["slowest_modules"]]
+    lines += ["", "| Our module | Cumulative (ms) |", "|---|---:|"]
+    lines += [f"| {m['module']} | {m['cumulative_ms']} |" for m in summary["first_party"]]
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise -X importtime output and check the startup budget")
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_SECONDS * 1000)
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="import-report-") as tmp:
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [project_root, env.get("PYTHONPATH")]))
+        # Importing app.main opens the session database; keep the real one untouched
+        env.setdefault("SESSION_DB_PATH", os.path.join(tmp, "sessions.db"))
+        runs = []
+        for i in range(args.repeat):
+            run = run_import(args.module, env)
+            print(f"⏱️ Run {i + 1}: {run['wall_seconds'] * 1000:.0f}ms", file=sys.stderr)
+            runs.append(run)
+
+    summary = summarize(runs, args.top)
+    print(render_markdown(args.module, summary, args.budget_ms))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"module": args.module, "budget_ms": args.budget_ms, **summary}, f, indent=2)
+            f.write("\n")
+
+    if summary["wall_ms"]["median"] > args.budget_ms:
+        print(f"❌ Import of {args.module} is over the {args.budget_ms:.0f}ms budget", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,189 +1,153 @@
+"""
+CDS Indexer
+사용법: python script/indexer.py [--provider gemini|local|hashing] [--local-index app/data/index/local]
+
+Chunks the extracted CDS records in app/data/json, embeds them with the
+chosen embedding provider and upserts them into Pinecone (in the provider's
+namespace, one namespace per academic year with PARTITION_BY_ACADEMIC_YEAR),
+skipping files already listed as processed. With --local-index the vectors go
+to a PartitionedVectorIndex file instead, which the backend serves with
+LOCAL_VECTOR_INDEX_PATH and no network access.
+
+Each record is indexed as section chunks plus smaller field-group chunks
+(FIELD_VECTORS, see app/services/cds_records.py). After a change to the
+chunking, run with --reindex to re-embed records already processed.
+
+Every run also rebuilds the BM25 lexical index over all records
+(LEXICAL_INDEX_PATH, see app/services/lexical_index.py), which the
+query_college_info tool fuses with the vector search, and regenerates the
+summary card of each institution whose latest record changed (see
+app/services/summary_cards.py).
+
+The year-partitioned layout keeps its own processed list, so the first run
+after enabling it re-upserts every record into its year namespace. The old
+un-partitioned vectors are no longer searched and can be deleted from the
+provider's base namespace.
+"""
+
+import argparse
 import os
-import json
+import sys
 import glob
 import time
 from typing import List, Dict, Any
 
-from dotenv import load_dotenv
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from pinecone import Pinecone
 
-# Load environment variables
-# Assuming the script is run from the project root, so app/.env is checking there.
-# We also try to load from adjacent app/.env if run from script folder
 current_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.dirname(current_dir)
-env_path = os.path.join(project_root, 'app', '.env')
 
-if os.path.exists(env_path):
-    load_dotenv(dotenv_path=env_path)
-else:
-    # Fallback to just .env or app/.env relative to cwd
-    load_dotenv(dotenv_path="app/.env")
+# Make the backend package importable when run as `python script/indexer.py`
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from app.services.env import load_env
+
+# Before the imports below, which read PARTITION_BY_ACADEMIC_YEAR and friends at import time
+load_env()
+
+from app.services.cds_records import (
+    PARTITION_BY_ACADEMIC_YEAR,
+    load_record,
+    load_records,
+    partition_namespace,
+    record_chunks,
+    record_year,
+)
+from app.services.embeddings import EmbeddingProvider, EmbeddingUnavailable, get_embedding_provider
+from app.services.lexical_index import build_lexical_index
+from app.services.metrics import span, stage_summary
+from app.services.summary_cards import refresh_cards
 
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 INDEX_NAME = "college-consulting-index"
+PINECONE_INDEX_HOST = os.getenv("PINECONE_INDEX_HOST", "")
 
 # Data directory configuration
 # Assuming run from project root: app/data/json
 DATA_DIR = os.path.join(project_root, 'app', 'data', 'json')
 PROCESSED_LIST_FILE = os.path.join(DATA_DIR, "_processed_cds_lists.txt")
 
-# Initialize Pinecone
-if not PINECONE_API_KEY:
-    raise ValueError("PINECONE_API_KEY is not set in environment variables.")
-
-pc = Pinecone(api_key=PINECONE_API_KEY)
-# We assume the index already exists as per instructions.
-index = pc.Index(INDEX_NAME)
 
-# Initialize Gemini Embeddings via LangChain
-if not GOOGLE_API_KEY:
-    raise ValueError("GOOGLE_API_KEY is not set in environment variables.")
+def connect_index(provider: EmbeddingProvider):
+    """Checks the API keys and connects to the Pinecone index (done in main, not at import)."""
+    if not PINECONE_API_KEY:
+        raise ValueError("PINECONE_API_KEY is not set in environment variables.")
+    if provider.name == "gemini" and not GOOGLE_API_KEY:
+        raise ValueError("GOOGLE_API_KEY is not set in environment variables.")
 
-os.environ["GOOGLE_API_KEY"] = GOOGLE_API_KEY
-import httpx
+    pc = Pinecone(api_key=PINECONE_API_KEY)
+    # We assume the index already exists as per instructions.
+    return pc.Index(INDEX_NAME, host=PINECONE_INDEX_HOST)
 
-# ... (API Keys setup is above)
 
-def get_embedding(text: str) -> List[float]:
-    """Generates embeddings using Gemini API via REST to support output_dimensionality."""
-    if not text:
-        return []
-        
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-embedding-001:embedContent?key={GOOGLE_API_KEY}"
-    
-    headers = {
-        "Content-Type": "application/json"
-    }
-    
-    payload = {
-        "content": {
-            "parts": [{"text": text}]
-        },
-        "output_dimensionality": 768
-    }
-    
+def embed_texts(provider: EmbeddingProvider, texts: List[str]) -> List[List[float]]:
+    """Embeds all chunks of a file in one batch; returns [] if the provider failed."""
     try:
-        # Using synchronous httpx for simplicity in this script
-        response = httpx.post(url, headers=headers, json=payload, timeout=30.0)
-        response.raise_for_status()
-        result = response.json()
-        return result['embedding']['values']
-    except Exception as e:
+        return provider.embed_batch(texts)
+    except EmbeddingUnavailable as e:
         print(f"Error embedding text: {e}")
-        # Print detailed error if possible
-        if 'response' in locals() and hasattr(response, 'text'):
-            print(f"Response: {response.text}")
         return []
 
-def load_processed_files() -> set:
+def processed_list_file(provider: EmbeddingProvider) -> str:
+    """Gemini keeps the original list; other providers track their own namespace."""
+    base = PROCESSED_LIST_FILE if provider.name == "gemini" else os.path.join(DATA_DIR, f"_processed_cds_lists.{provider.name}.txt")
+    if PARTITION_BY_ACADEMIC_YEAR:
+        # Records indexed before partitioning sit in the base namespace and need re-upserting
+        return base[: -len(".txt")] + ".by_year.txt"
+    return base
+
+def load_processed_files(list_file: str) -> set:
     """Loads the list of already processed files."""
-    if not os.path.exists(PROCESSED_LIST_FILE):
+    if not os.path.exists(list_file):
         return set()
-    with open(PROCESSED_LIST_FILE, 'r', encoding='utf-8') as f:
+    with open(list_file, 'r', encoding='utf-8') as f:
         return set(line.strip() for line in f if line.strip())
 
-def mark_as_processed(filename: str):
+def mark_as_processed(list_file: str, filename: str):
     """Marks a file as processed by appending it to the list file."""
     # Ensure directory exists just in case
-    os.makedirs(os.path.dirname(PROCESSED_LIST_FILE), exist_ok=True)
-    with open(PROCESSED_LIST_FILE, 'a', encoding='utf-8') as f:
+    os.makedirs(os.path.dirname(list_file), exist_ok=True)
+    with open(list_file, 'a', encoding='utf-8') as f:
         f.write(filename + "\n")
 
-def extract_structured_data(data: Any, filename: str) -> Any:
-    """Extracts the relevant structured data from the raw JSON response."""
-    structured_data = None
-    
-    # Structure 1: List of candidates with 'functionResponse' (완료된 응답)
-    if isinstance(data, list):
-        for item in data:
-            parts = item.get('content', {}).get('parts', [])
-            for part in parts:
-                fn_response = part.get('functionResponse', {})
-                if fn_response.get('name') == 'set_model_response':
-                    return fn_response.get('response')
-    
-    # Structure 2: List of candidates with 'functionCall' (호출 시점에 저장된 경우)
-    if isinstance(data, list):
-        for item in data:
-            parts = item.get('content', {}).get('parts', [])
-            for part in parts:
-                fn_call = part.get('functionCall', {})
-                if fn_call.get('name') == 'set_model_response':
-                    return fn_call.get('args')
-    
-    # Structure 3: Fallback, look for JSON string in 'text' parts
-    if isinstance(data, list):
-        for item in data:
-            parts = item.get('content', {}).get('parts', [])
-            for part in parts:
-                text = part.get('text', '')
-                if text.strip().startswith('{') and text.strip().endswith('}'):
-                    try:
-                        return json.loads(text)
-                    except json.JSONDecodeError:
-                        continue
-    
-    # Structure 4: Maybe the file itself is the dict?
-    if isinstance(data, dict):
-        return data
-
-    return None
-
-def process_file(filepath: str, filename: str) -> bool:
+def process_file(index, provider: EmbeddingProvider, filepath: str, filename: str) -> bool:
     print(f"Processing {filename}...")
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        structured_data = extract_structured_data(data, filename)
+        with span("indexer.load", filename=filename):
+            # Corrected and normalized like every other reader of the records
+            structured_data = load_record(filepath)
 
         if not structured_data:
             print(f"Skipping {filename}: No structured data found.")
             return False
 
         # Prepare vectors
-        vectors = []
-        source_file = structured_data.get('metadata', {}).get('source_file', filename)
-        institution_name = structured_data.get('general_info', {}).get('institution_name', 'Unknown University')
-        
-        for key, value in structured_data.items():
-            if key == 'metadata':
-                continue
-            
-            # Convert section to natural language text
-            chunk_text = format_section_to_text(institution_name, key, value)
-            
-            # if format_section_to_text returns empty (e.g. unknown key), fallback to JSON
-            if not chunk_text:
-                chunk_text = f"INFO FOR {institution_name} - SECTION {key}: " + json.dumps(value, ensure_ascii=False)
+        chunks = record_chunks(filename, structured_data)
+        with span("indexer.embed", chunks=len(chunks), provider=provider.name):
+            embeddings = embed_texts(provider, [chunk["text"] for chunk in chunks])
 
-            embedding = get_embedding(chunk_text)
+        vectors = []
+        for chunk, embedding in zip(chunks, embeddings):
             if not embedding:
-                print(f"  Warning: Failed to embed section '{key}'.")
+                print(f"  Warning: Failed to embed section '{chunk['metadata']['section']}'.")
                 continue
-            
-            # Create a unique ID: filename + section key
-            vector_id = f"{filename}#{key}"
-            
-            metadata = {
-                "source_file": source_file,
-                "institution_name": institution_name,
-                "section": key,
-                "text": chunk_text
-            }
-            
+
             vectors.append({
-                "id": vector_id,
+                "id": chunk["id"],
                 "values": embedding,
-                "metadata": metadata
+                "metadata": chunk["metadata"]
             })
 
         if vectors:
-            index.upsert(vectors=vectors)
-            print(f"  Successfully upserted {len(vectors)} vectors.")
+            namespace = partition_namespace(provider.namespace, record_year(filename, structured_data))
+            with span("indexer.upsert", vectors=len(vectors)):
+                if namespace:
+                    index.upsert(vectors=vectors, namespace=namespace)
+                else:
+                    index.upsert(vectors=vectors)
+            print(f"  Successfully upserted {len(vectors)} vectors{f' into {namespace}' if namespace else ''}.")
             return True
         else:
             print(f"  No vectors generated for {filename}.")
@@ -194,164 +158,56 @@ def process_file(filepath: str, filename: str) -> bool:
         # traceback.print_exc()
         return False
 
-def format_section_to_text(institution_name: str, key: str, value: Any) -> str:
-    """Converts a structured data section into a natural language string using templates."""
-    
-    if key == "general_info":
-        return (
-            f"General Information for {institution_name}:\n"
-            f"- Institution Name: {value.get('institution_name', 'N/A')}\n"
-            f"- Type: {value.get('school_type', 'N/A')}\n"
-            f"- Category: {value.get('school_category', 'N/A')}\n"
-            f"- Location: {value.get('city', 'N/A')}, {value.get('state', 'N/A')}\n"
-            f"- Website: {value.get('website', 'N/A')}\n"
-            f"- Academic Calendar: {value.get('academic_calendar', 'N/A')}"
-        )
+def build_local_index(provider: EmbeddingProvider, path: str) -> None:
+    """Embeds every record into a PartitionedVectorIndex file (no Pinecone, no processed list)."""
+    # Imported lazily: numpy is only needed for the local index
+    from app.services.vector_store import PartitionedVectorIndex
 
-    elif key == "admission_factors":
-        # Arrays to string
-        very_imp = ", ".join(value.get('very_important', [])) or "None"
-        imp = ", ".join(value.get('important', [])) or "None"
-        cons = ", ".join(value.get('considered', [])) or "None"
-        not_cons = ", ".join(value.get('not_considered', [])) or "None"
-        
-        return (
-            f"Admission Factors for {institution_name}:\n"
-            f"- Very Important: {very_imp}\n"
-            f"- Important: {imp}\n"
-            f"- Considered: {cons}\n"
-            f"- Not Considered: {not_cons}"
+    started = time.perf_counter()
+    with span("indexer.embed", provider=provider.name):
+        index = PartitionedVectorIndex.from_records(
+            load_records(DATA_DIR), provider.embed, provider.dimension, provider.embed_batch
         )
+    index.save(path)
+    partitions = ", ".join(ns or "(unpartitioned)" for ns in index.namespaces())
+    print(f"Wrote {len(index)} vectors to {path} in {time.perf_counter() - started:.1f}s ({partitions}).")
 
-    elif key == "admissions_statistics":
-        stats = value
-        applicants = stats.get('applicants', {})
-        admitted = stats.get('admitted', {})
-        enrolled = stats.get('enrolled', {})
-        waitlist = stats.get('waitlist', {})
-        
-        return (
-            f"Admissions Statistics for {institution_name} ({stats.get('cohort_year', 'N/A')}):\n"
-            f"- Acceptance Rate: {stats.get('acceptance_rate', 'N/A')}%\n"
-            f"- Yield Rate: {stats.get('yield_rate', 'N/A')}%\n"
-            f"- Total Applicants: {applicants.get('total', 'N/A')}\n"
-            f"- Total Admitted: {admitted.get('total', 'N/A')}\n"
-            f"- Total Enrolled: {enrolled.get('total', 'N/A')}\n"
-            f"- Waitlist Policy: {'Yes' if waitlist.get('has_policy') else 'No'}\n"
-            f"  * Offered Spot: {waitlist.get('offered_spot', 'N/A')}\n"
-            f"  * Accepted Spot: {waitlist.get('accepted_spot', 'N/A')}\n"
-            f"  * Admitted from Waitlist: {waitlist.get('admitted_from_waitlist', 'N/A')}"
-        )
-
-    elif key == "test_scores":
-        sat = value.get('sat', {})
-        act = value.get('act', {})
-        
-        return (
-            f"Standardized Test Scores for {institution_name}:\n"
-            f"- Policy: {value.get('policy', 'N/A')}\n"
-            f"- SAT Submission Rate: {value.get('submission_rate_sat', 'N/A')}\n"
-            f"- ACT Submission Rate: {value.get('submission_rate_act', 'N/A')}\n"
-            f"- SAT Scores (25th-75th percentile):\n"
-            f"  * Composite: {sat.get('composite_25th', 'N/A')} - {sat.get('composite_75th', 'N/A')}\n"
-            f"  * Math: {sat.get('math_25th', 'N/A')} - {sat.get('math_75th', 'N/A')}\n"
-            f"  * EBRW: {sat.get('ebrw_25th', 'N/A')} - {sat.get('ebrw_75th', 'N/A')}\n"
-            f"- ACT Scores (25th-75th percentile):\n"
-            f"  * Composite: {act.get('composite_25th', 'N/A')} - {act.get('composite_75th', 'N/A')}\n"
-            f"  * Math: {act.get('math_25th', 'N/A')} - {act.get('math_75th', 'N/A')}\n"
-            f"  * English: {act.get('english_25th', 'N/A')} - {act.get('english_75th', 'N/A')}"
-        )
-
-    elif key == "high_school_profile":
-        return (
-            f"High School Profile for {institution_name}:\n"
-            f"- Average GPA: {value.get('average_gpa', 'N/A')}\n"
-            f"- Percent in Top 10% of Class: {value.get('percent_top_10', 'N/A')}\n"
-            f"- Percent in Top 25% of Class: {value.get('percent_top_25', 'N/A')}\n"
-            f"- Percent in Top 50% of Class: {value.get('percent_top_50', 'N/A')}\n"
-            f"- GPA Submission Rate: {value.get('gpa_submission_rate', 'N/A')}\n"
-            f"- Class Rank Submission Rate: {value.get('class_rank_submission_rate', 'N/A')}"
-        )
-
-    elif key == "cost_and_financial_aid":
-        expenses = value.get('expenses', {})
-        aid = value.get('financial_aid', {})
-        
-        return (
-            f"Cost and Financial Aid for {institution_name}:\n"
-            f"- Tuition Structure: {value.get('tuition_structure', 'N/A')}\n"
-            f"- Expenses (Annual):\n"
-            f"  * Tuition (In-state): ${expenses.get('tuition_in_state', 'N/A')}\n"
-            f"  * Tuition (Out-of-state): ${expenses.get('tuition_out_of_state', 'N/A')}\n"
-            f"  * Fees: ${expenses.get('fees', 'N/A')}\n"
-            f"  * Room and Board: ${expenses.get('room_and_board', 'N/A')}\n"
-            f"  * Books and Supplies: ${expenses.get('books_and_supplies', 'N/A')}\n"
-            f"  * Other Expenses: ${expenses.get('other_expenses', 'N/A')}\n"
-            f"- Financial Aid:\n"
-            f"  * International Students Eligible: {'Yes' if aid.get('international_students_eligible') else 'No'}\n"
-            f"  * Average Need-based Package: ${aid.get('average_need_based_package', 'N/A')}\n"
-            f"  * Percent of Need Met: {aid.get('percent_need_met', 'N/A')}"
-        )
-
-    elif key == "student_life_and_faculty":
-        demo = value.get('demographics', {})
-        return (
-            f"Student Life and Faculty at {institution_name}:\n"
-            f"- Student-Faculty Ratio: {value.get('student_faculty_ratio', 'N/A')}\n"
-            f"- Undergraduate Enrollment: {value.get('undergraduate_enrollment', 'N/A')}\n"
-            f"- Class Size under 20: {value.get('class_size_under_20_percent', 'N/A')}\n"
-            f"- Demographics:\n"
-            f"  * Out-of-state Students: {demo.get('out_of_state_percent', 'N/A')}\n"
-            f"  * International Students: {demo.get('international_percent', 'N/A')}"
-        )
-
-    elif key == "deadlines":
-        text = f"Application Deadlines for {institution_name}:\n"
-        
-        # Helper for deadline details
-        def format_deadline(label, data):
-            if not data: return ""
-            return (
-                f"- {label}:\n"
-                f"  * Deadline: {data.get('deadline', 'N/A')}\n"
-                f"  * Notification: {data.get('notification_date', 'N/A')}\n"
-                f"  * Binding: {'Yes' if data.get('is_binding') else 'No'}\n"
-                f"  * Type: {data.get('type', 'N/A')}\n"
-            )
-
-        text += format_deadline("Early Decision 1", value.get('early_decision_1'))
-        text += format_deadline("Early Decision 2", value.get('early_decision_2'))
-        text += format_deadline("Early Action", value.get('early_action'))
-        text += format_deadline("Regular Decision", value.get('regular_decision'))
-        
-        transfer = value.get('transfer_admission', {})
-        if transfer:
-             text += (
-                f"- Transfer Admission:\n"
-                f"  * Deadline: {transfer.get('deadline', 'N/A')}\n"
-                f"  * Rolling: {'Yes' if transfer.get('is_rolling') else 'No'}\n"
-            )
-        return text
-
-    return ""
+def print_stage_summary():
+    for stage, stats in sorted(stage_summary().items()):
+        print(f"  {stage}: {stats['count']} calls, {stats['total_seconds']}s total, {stats['mean_ms']}ms mean")
 
 def main():
+    parser = argparse.ArgumentParser(description="Embed the extracted CDS records and index them")
+    parser.add_argument("--provider", help="Embedding provider: gemini, local or hashing (default: EMBEDDING_PROVIDER)")
+    parser.add_argument("--local-index", help="Write a PartitionedVectorIndex to this path instead of upserting to Pinecone")
+    parser.add_argument("--reindex", action="store_true", help="Re-embed every record, ignoring the processed list")
+    args = parser.parse_args()
+
     print("Starting Indexer Script...")
+    provider = get_embedding_provider(args.provider)
+    print(f"Embedding provider: {provider.name} ({provider.dimension} dims)")
     
     if not os.path.exists(DATA_DIR):
         print(f"Error: Data directory not found at {DATA_DIR}")
         return
 
     print(f"Checking directory: {DATA_DIR}")
+    if args.local_index:
+        build_local_index(provider, args.local_index)
+        build_lexical_index(DATA_DIR)
+        refresh_cards(DATA_DIR)
+        print_stage_summary()
+        return
+
+    index = connect_index(provider)
+    list_file = processed_list_file(provider)
     
-    # Check if we should re-process all files
-    # If the user wants to re-process, they should empty the list file manually or we can do it here if needed.
-    # For now, we respect the existing logic.
+    # --reindex re-processes everything (e.g. after a chunking change); otherwise listed files are skipped
 
     files = [f for f in os.listdir(DATA_DIR) if f.endswith('.json')]
     print(f"Found {len(files)} JSON files in total.")
     
-    processed_files = load_processed_files()
+    processed_files = set() if args.reindex else load_processed_files(list_file)
     print(f"Already processed: {len(processed_files)} files.")
     
     new_files_count = 0
@@ -360,11 +216,14 @@ def main():
         if filename in processed_files:
             continue
             
-        if process_file(os.path.join(DATA_DIR, filename), filename):
-            mark_as_processed(filename)
+        if process_file(index, provider, os.path.join(DATA_DIR, filename), filename):
+            mark_as_processed(list_file, filename)
             new_files_count += 1
         
     print(f"Indexing complete. Processed {new_files_count} new files.")
+    build_lexical_index(DATA_DIR)
+    refresh_cards(DATA_DIR)
+    print_stage_summary()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,332 @@
+"""
+Token-cost and Latency Profiler for Agent Event Logs
+사용법: python script/profile_events.py [--session-db app/data/sessions/sessions.db] [--table summary.md]
+
+Reads recorded agent runs and reports where tokens and time go:
+
+- app/data/json/*_full_response.json: extraction runs saved by the upload API
+- the chat session database (events table): chat turns, one run per invocation.
+  Compacted sessions only keep their recent turns, so older turns are missing.
+
+ADK timestamps a model event when its LLM call starts, so the gap after a
+model event is that agent's call (including any tools it triggered), and a
+tool's time is measured from the model event that requested it to its
+function response (so it includes generating the call). The last model call
+of an extraction log has no following event and no duration.
+
+Reports per-agent token use (prompt, candidates, thoughts) and thinking
+overhead, per-tool wall time, per-run totals, optional cost estimates, and
+outliers (beyond the upper Tukey fence: Q3 + 1.5 * IQR).
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from app.services.cds_records import JSON_DIR, extract_structured_data
+
+DEFAULT_SESSION_DB = os.getenv(
+    "SESSION_DB_PATH", os.path.join(project_root, "app", "data", "sessions", "sessions.db")
+)
+
+
+def _get(data: Dict[str, Any], camel: str, snake: str, default: Any = None) -> Any:
+    """Event logs from the API are camelCase; events stored by ADK are snake_case."""
+    if camel in data:
+        return data[camel]
+    return data.get(snake, default)
+
+
+def _quantile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    position = (len(ordered) - 1) * q
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def upper_fence(values: List[float]) -> Optional[float]:
+    """Tukey's upper fence; None when there are too few values to judge."""
+    if len(values) < 4:
+        return None
+    q1, q3 = _quantile(values, 0.25), _quantile(values, 0.75)
+    return q3 + 1.5 * (q3 - q1)
+
+
+# --- Loading ---
+
+def load_json_runs(json_dir: str) -> List[Dict[str, Any]]:
+    runs = []
+    if not os.path.isdir(json_dir):
+        return runs
+    for filename in sorted(os.listdir(json_dir)):
+        if not filename.endswith("_full_response.json"):
+            continue
+        with open(os.path.join(json_dir, filename), "r", encoding="utf-8") as f:
+            events = json.load(f)
+        if not isinstance(events, list):
+            continue
+        record = extract_structured_data(events, filename)
+        name = ((record or {}).get("general_info") or {}).get("institution_name") if isinstance(record, dict) else None
+        runs.append({"source": "extraction", "run": name or filename, "file": filename, "events": events})
+    return runs
+
+
+def load_session_runs(db_path: str) -> List[Dict[str, Any]]:
+    """One run per chat invocation (user message plus everything it triggered)."""
+    if not os.path.exists(db_path):
+        return []
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        rows = conn.execute(
+            "SELECT session_id, invocation_id, event_data FROM events ORDER BY session_id, timestamp"
+        ).fetchall()
+    finally:
+        conn.close()
+
+    grouped: Dict[Tuple[str, str], List[Dict[str, Any]]] = defaultdict(list)
+    for session_id, invocation_id, event_data in rows:
+        grouped[(session_id, invocation_id)].append(json.loads(event_data))
+    return [
+        {"source": "chat", "run": f"{session_id[:8]}/{invocation_id[-8:]}", "file": None, "events": events}
+        for (session_id, invocation_id), events in grouped.items()
+    ]
+
+
+# --- Analysis ---
+
+def analyze_run(run: Dict[str, Any]) -> Dict[str, Any]:
+    """Per-call records for one run: model calls and tool calls with their wall time."""
+    events = [e for e in run["events"] if not e.get("partial")]
+    events.sort(key=lambda e: e.get("timestamp") or 0)
+
+    model_calls, tool_calls = [], []
+    call_started: Dict[str, float] = {}  # function call id/name -> timestamp of the model event
+    for i, event in enumerate(events):
+        ts = event.get("timestamp")
+        next_ts = events[i + 1].get("timestamp") if i + 1 < len(events) else None
+        parts = (event.get("content") or {}).get("parts") or []
+
+        usage = _get(event, "usageMetadata", "usage_metadata")
+        if usage:
+            # ADK stamps a model event when the LLM call starts, so the gap to
+            # the next event is the call itself (plus any tools it triggered)
+            model_calls.append({
+                "agent": event.get("author", "unknown"),
+                "prompt": _get(usage, "promptTokenCount", "prompt_token_count", 0) or 0,
+                "candidates": _get(usage, "candidatesTokenCount", "candidates_token_count", 0) or 0,
+                "thoughts": _get(usage, "thoughtsTokenCount", "thoughts_token_count", 0) or 0,
+                "seconds": next_ts - ts if ts is not None and next_ts is not None else None,
+            })
+
+        for part in parts:
+            call = _get(part, "functionCall", "function_call")
+            if call and ts is not None:
+                call_started[call.get("id") or call.get("name")] = ts
+            response = _get(part, "functionResponse", "function_response")
+            if response:
+                started = call_started.pop(response.get("id") or response.get("name"), None)
+                if started is None:
+                    started = call_started.pop(response.get("name"), None)
+                tool_calls.append({
+                    "tool": response.get("name", "unknown"),
+                    "seconds": ts - started if ts is not None and started is not None else None,
+                    "response_chars": len(json.dumps(response.get("response"), ensure_ascii=False, default=str)),
+                })
+
+    timestamps = [e["timestamp"] for e in events if e.get("timestamp") is not None]
+    return {
+        "source": run["source"],
+        "run": run["run"],
+        "file": run["file"],
+        "events": len(events),
+        "wall_seconds": (max(timestamps) - min(timestamps)) if len(timestamps) > 1 else None,
+        "model_calls": model_calls,
+        "tool_calls": tool_calls,
+        "prompt": sum(c["prompt"] for c in model_calls),
+        "candidates": sum(c["candidates"] for c in model_calls),
+        "thoughts": sum(c["thoughts"] for c in model_calls),
+    }
+
+
+def _cost(prompt: int, output: int, input_price: Optional[float], output_price: Optional[float]) -> Optional[float]:
+    if input_price is None or output_price is None:
+        return None
+    return round(prompt / 1e6 * input_price + output / 1e6 * output_price, 6)
+
+
+def _mean(values: Iterable[Optional[float]]) -> Optional[float]:
+    values = [v for v in values if v is not None]
+    return round(sum(values) / len(values), 3) if values else None
+
+
+def summarize(analyses: List[Dict[str, Any]], input_price: Optional[float], output_price: Optional[float]) -> Dict[str, Any]:
+    by_agent: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    by_tool: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for analysis in analyses:
+        for call in analysis["model_calls"]:
+            by_agent[call["agent"]].append(call)
+        for call in analysis["tool_calls"]:
+            by_tool[call["tool"]].append(call)
+
+    agents = {}
+    for agent, calls in sorted(by_agent.items()):
+        prompt = sum(c["prompt"] for c in calls)
+        candidates = sum(c["candidates"] for c in calls)
+        thoughts = sum(c["thoughts"] for c in calls)
+        seconds = [c["seconds"] for c in calls if c["seconds"] is not None]
+        agents[agent] = {
+            "calls": len(calls),
+            "prompt_tokens": prompt,
+            "candidates_tokens": candidates,
+            "thoughts_tokens": thoughts,
+            # Share of generated tokens spent thinking (ThinkingLevel.HIGH overhead)
+            "thinking_share": round(thoughts / (thoughts + candidates), 3) if thoughts + candidates else None,
+            "mean_call_seconds": _mean(seconds),
+            "p95_call_seconds": round(_quantile(seconds, 0.95), 3) if seconds else None,
+            "cost": _cost(prompt, candidates + thoughts, input_price, output_price),
+            "thinking_cost": _cost(0, thoughts, input_price, output_price),
+        }
+
+    tools = {}
+    for tool, calls in sorted(by_tool.items()):
+        seconds = [c["seconds"] for c in calls if c["seconds"] is not None]
+        tools[tool] = {
+            "calls": len(calls),
+            # From the requesting model event to the function response
+            "mean_seconds": _mean(seconds),
+            "p95_seconds": round(_quantile(seconds, 0.95), 3) if seconds else None,
+            "mean_response_chars": _mean(c["response_chars"] for c in calls),
+        }
+
+    runs = [
+        {
+            "source": a["source"],
+            "run": a["run"],
+            "events": a["events"],
+            "model_calls": len(a["model_calls"]),
+            "wall_seconds": round(a["wall_seconds"], 3) if a["wall_seconds"] is not None else None,
+            "prompt_tokens": a["prompt"],
+            "candidates_tokens": a["candidates"],
+            "thoughts_tokens": a["thoughts"],
+            "cost": _cost(a["prompt"], a["candidates"] + a["thoughts"], input_price, output_price),
+        }
+        for a in analyses
+    ]
+    return {"agents": agents, "tools": tools, "runs": runs, "outliers": find_outliers(analyses, runs)}
+
+
+def find_outliers(analyses: List[Dict[str, Any]], runs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Runs and model calls above the upper Tukey fence, per source."""
+    outliers = []
+    for source in sorted({r["source"] for r in runs}):
+        source_runs = [r for r in runs if r["source"] == source]
+        for metric in ("wall_seconds", "thoughts_tokens", "prompt_tokens"):
+            values = [r[metric] for r in source_runs if r[metric] is not None]
+            fence = upper_fence(values)
+            if fence is None:
+                continue
+            for r in source_runs:
+                if r[metric] is not None and r[metric] > fence:
+                    outliers.append({"kind": "run", "source": source, "run": r["run"], "metric": metric, "value": r[metric], "fence": round(fence, 3)})
+
+    calls = [(a["run"], c) for a in analyses for c in a["model_calls"] if c["seconds"] is not None]
+    for agent in sorted({c["agent"] for _, c in calls}):
+        agent_calls = [(run, c) for run, c in calls if c["agent"] == agent]
+        fence = upper_fence([c["seconds"] for _, c in agent_calls])
+        if fence is None:
+            continue
+        for run, c in agent_calls:
+            if c["seconds"] > fence:
+                outliers.append({"kind": "model_call", "agent": agent, "run": run, "metric": "seconds", "value": round(c["seconds"], 3), "fence": round(fence, 3)})
+    return outliers
+
+
+# --- Output ---
+
+def _table(headers: List[str], rows: List[List[Any]]) -> str:
+    def fmt(value: Any) -> str:
+        if value is None:
+            return "-"
+        if isinstance(value, float):
+            return f"{value:,.3f}"
+        if isinstance(value, int):
+            return f"{value:,}"
+        return str(value)
+
+    lines = ["| " + " | ".join(headers) + " |", "|" + "|".join("---" for _ in headers) + "|"]
+    lines += ["| " + " | ".join(fmt(v) for v in row) + " |" for row in rows]
+    return "\n".join(lines)
+
+
+def render_markdown(summary: Dict[str, Any]) -> str:
+    sections = ["## Agents", _table(
+        ["agent", "calls", "prompt", "candidates", "thoughts", "thinking share", "mean s", "p95 s", "cost", "thinking cost"],
+        [[name, a["calls"], a["prompt_tokens"], a["candidates_tokens"], a["thoughts_tokens"], a["thinking_share"],
+          a["mean_call_seconds"], a["p95_call_seconds"], a["cost"], a["thinking_cost"]]
+         for name, a in summary["agents"].items()],
+    )]
+    sections += ["## Tools", _table(
+        ["tool", "calls", "mean s", "p95 s", "mean response chars"],
+        [[name, t["calls"], t["mean_seconds"], t["p95_seconds"], t["mean_response_chars"]] for name, t in summary["tools"].items()],
+    )]
+    runs = sorted(summary["runs"], key=lambda r: (r["source"], -(r["wall_seconds"] or 0)))
+    sections += ["## Runs", _table(
+        ["source", "run", "model calls", "wall s", "prompt", "candidates", "thoughts", "cost"],
+        [[r["source"], r["run"], r["model_calls"], r["wall_seconds"], r["prompt_tokens"], r["candidates_tokens"],
+          r["thoughts_tokens"], r["cost"]] for r in runs],
+    )]
+    if summary["outliers"]:
+        sections += ["## Outliers", _table(
+            ["kind", "run", "agent / source", "metric", "value", "fence"],
+            [[o["kind"], o["run"], o.get("agent") or o.get("source"), o["metric"], o["value"], o["fence"]] for o in summary["outliers"]],
+        )]
+    else:
+        sections += ["## Outliers", "None above the upper Tukey fence."]
+    return "\n\n".join(sections) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile token use and latency in recorded agent runs")
+    parser.add_argument("--json-dir", default=JSON_DIR)
+    parser.add_argument("--session-db", default=DEFAULT_SESSION_DB)
+    parser.add_argument("--no-sessions", action="store_true", help="Only read the extraction event logs")
+    parser.add_argument("--input-price", type=float, help="USD per 1M prompt tokens")
+    parser.add_argument("--output-price", type=float, help="USD per 1M output tokens (thoughts are billed as output)")
+    parser.add_argument("--table", help="Write the markdown summary table to this file")
+    parser.add_argument("--output", help="Write the full JSON report to this file")
+    args = parser.parse_args()
+
+    runs = load_json_runs(args.json_dir)
+    if not args.no_sessions:
+        runs += load_session_runs(args.session_db)
+    if not runs:
+        print("No recorded runs found.")
+        return
+    print(f"📈 Profiling {len(runs)} runs", file=sys.stderr)
+
+    summary = summarize([analyze_run(run) for run in runs], args.input_price, args.output_price)
+    markdown = render_markdown(summary)
+    print(markdown)
+    if args.table:
+        with open(args.table, "w", encoding="utf-8") as f:
+            f.write(markdown)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
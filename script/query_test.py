@@ -1,94 +1,73 @@
 """
 Pinecone Query Test Script
-사용법: python script/query_test.py "하버드 학비 얼마야?"
+사용법: python script/query_test.py "하버드 학비 얼마야?" [--provider hashing] [--top-k 3] [--years 2023-2024|all]
+
+Runs the same embedding and vector search as the query_college_info tool:
+the latest academic year by default, or the partitions named by --years.
+With LOCAL_VECTOR_INDEX_PATH set it searches the local index instead of Pinecone.
 """
+import argparse
 import os
 import sys
-from dotenv import load_dotenv
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from pinecone import Pinecone
-from typing import List
+import time
 
-# Load environment variables
 current_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.dirname(current_dir)
-env_path = os.path.join(project_root, 'app', '.env')
-
-if os.path.exists(env_path):
-    load_dotenv(dotenv_path=env_path)
-else:
-    load_dotenv(dotenv_path="app/.env")
-
-PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-INDEX_NAME = "college-consulting-index"
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
 
-# Initialize
-pc = Pinecone(api_key=PINECONE_API_KEY)
-index = pc.Index(INDEX_NAME)
+from app.services.embeddings import EmbeddingUnavailable, get_embedding_provider
+from app.agents.sub_agents.college_agent.tools.query_pinecone import requested_years, search_scoped
 
-import httpx
+# Default test queries
+DEFAULT_QUERIES = [
+    "하버드 학비 얼마야?",
+    "스탠포드 합격률",
+    "윌리엄스 입학 마감일",
+]
 
-# ... setup ...
 
-def get_embedding_rest(text: str) -> List[float]:
-    """Generates embeddings using Gemini API via REST."""
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-embedding-001:embedContent?key={GOOGLE_API_KEY}"
-    payload = {
-        "content": {"parts": [{"text": text}]},
-        "output_dimensionality": 768
-    }
-    try:
-        response = httpx.post(url, json=payload, timeout=30.0)
-        response.raise_for_status()
-        return response.json()['embedding']['values']
-    except Exception as e:
-        print(f"Error embedding: {e}")
-        return []
-
-def query_pinecone(query_text: str, top_k: int = 3):
+def query_pinecone(query_text: str, provider_name: str = None, top_k: int = 3, years: str = ""):
     """Query Pinecone with a text query."""
     print(f"\n🔍 Query: {query_text}")
     print("-" * 50)
-    
+
+    provider = get_embedding_provider(provider_name)
+
     # Generate embedding for query
-    query_embedding = get_embedding_rest(query_text)
-    
-    if not query_embedding:
-        print("Failed to generate embedding for query.")
+    started = time.perf_counter()
+    try:
+        query_embedding = provider.embed(query_text)
+    except EmbeddingUnavailable as e:
+        print(f"Failed to generate embedding for query: {e}")
         return
-    
+    embedded = time.perf_counter()
+
     # Query Pinecone
-    results = index.query(
-        vector=query_embedding,
-        top_k=top_k,
-        include_metadata=True
+    results = search_scoped(
+        query_embedding, top_k=top_k, years=requested_years(query_text, years), namespace=provider.namespace
     )
-    
-    print(f"\n📊 Top {top_k} Results:\n")
-    for i, match in enumerate(results['matches'], 1):
-        score = match['score']
-        metadata = match['metadata']
-        
-        print(f"#{i} Score: {score:.4f}")
-        print(f"   📁 Source: {metadata.get('source_file', 'N/A')}")
-        print(f"   🏫 Institution: {metadata.get('institution_name', 'N/A')}")
-        print(f"   📑 Section: {metadata.get('section', 'N/A')}")
-        print(f"   📝 Text Preview: {metadata.get('text', 'N/A')[:200]}...")
+    searched = time.perf_counter()
+
+    print(f"\n📊 Top {top_k} Results ({provider.name}: embed {(embedded - started) * 1000:.0f}ms, "
+          f"search {(searched - embedded) * 1000:.0f}ms):\n")
+    for i, chunk in enumerate(results, 1):
+        print(f"#{i} Score: {chunk['score']:.4f}")
+        print(f"   📁 Source: {chunk['source_file']}")
+        print(f"   🏫 Institution: {chunk['institution_name']}")
+        field = f" / {chunk['field_group']}" if chunk.get("field_group") else ""
+        print(f"   📑 Section: {chunk['section']}{field} ({chunk.get('academic_year') or 'unknown year'})")
+        print(f"   📝 Text Preview: {chunk['text'][:200]}...")
         print()
 
+
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
-        query = " ".join(sys.argv[1:])
-    else:
-        # Default test queries
-        test_queries = [
-            "하버드 학비 얼마야?",
-            "스탠포드 합격률",
-            "윌리엄스 입학 마감일",
-        ]
-        for q in test_queries:
-            query_pinecone(q)
-        sys.exit(0)
-    
-    query_pinecone(query)
+    parser = argparse.ArgumentParser(description="Run a test query against the vector index")
+    parser.add_argument("query", nargs="*", help="Query text (default: a few sample queries)")
+    parser.add_argument("--provider", help="Embedding provider: gemini, local or hashing (default: EMBEDDING_PROVIDER)")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--years", default="", help="Academic years to search, comma-separated, or 'all'")
+    args = parser.parse_args()
+
+    for q in [" ".join(args.query)] if args.query else DEFAULT_QUERIES:
+        query_pinecone(q, args.provider, args.top_k, args.years)
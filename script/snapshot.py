@@ -0,0 +1,344 @@
+"""
+Vector Index Snapshots (export and restore without re-embedding)
+사용법: python script/snapshot.py export snapshots/gemini.npz [--from-local app/data/index/local]
+        python script/snapshot.py restore snapshots/gemini.npz [--to-local app/data/index/local] [--replace]
+        python script/snapshot.py info snapshots/gemini.npz
+
+export dumps every vector of one embedding provider (ids, values and
+metadata, per namespace) from Pinecone, or from a local index with
+--from-local, into a single .npz bundle. The bundle's manifest records the
+embedding provider, model and dimension, the namespace layout and the vector
+counts, so a snapshot is never restored next to vectors of another model.
+
+restore loads a bundle straight into Pinecone, upserting batches from a
+thread pool, or writes it out as a local index (--to-local) for
+LOCAL_VECTOR_INDEX_PATH. No embedding calls are made either way. After a
+Pinecone restore the restored files are added to the indexer's processed
+list, so script/indexer.py only embeds records the snapshot did not have.
+
+A Pinecone restore only upserts, so vectors the snapshot does not have stay
+in the index. With --replace every namespace in the snapshot is emptied
+first and the processed list is rewritten to the snapshot's files, which
+rolls the index back to exactly the snapshot.
+
+Exporting from Pinecone lists vector ids, which only serverless indexes
+support.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+import numpy as np
+from pinecone import Pinecone
+
+from app.services.env import load_env
+
+load_env()
+
+from app.services.cds_records import ACADEMIC_YEAR_RE, PARTITION_BY_ACADEMIC_YEAR, UNKNOWN_YEAR
+from app.services.embeddings import PROVIDERS, EmbeddingProvider, get_embedding_provider
+from app.services.vector_store import LocalVectorIndex, PartitionedVectorIndex
+
+from indexer import INDEX_NAME, PINECONE_API_KEY, PINECONE_INDEX_HOST, load_processed_files, processed_list_file
+
+SNAPSHOT_FORMAT = 1
+# Pinecone fetches ids as query parameters; keep requests well under URL limits
+FETCH_BATCH_SIZE = 100
+# Pinecone caps upsert requests at 2 MB: ~100 768-dim vectors with metadata
+UPSERT_BATCH_SIZE = 100
+UPSERT_ATTEMPTS = 3
+
+# ids, unit vectors and metadata of one namespace
+Partition = Tuple[List[str], np.ndarray, List[Dict[str, Any]]]
+
+
+def partition_of(namespace: str, base: str) -> Optional[str]:
+    """
+    The year partition a Pinecone namespace holds for the provider namespace base.
+
+    Returns None for namespaces of other providers. Gemini's base namespace is
+    "", so its year namespaces are recognised by their name.
+    """
+    if namespace == base:
+        return ""
+    if base:
+        return namespace[len(base) + 1:] if namespace.startswith(f"{base}-") else None
+    return namespace if namespace == UNKNOWN_YEAR or ACADEMIC_YEAR_RE.fullmatch(namespace) else None
+
+
+def pinecone_namespace(base: str, partition: str) -> str:
+    if not partition:
+        return base
+    return f"{base}-{partition}" if base else partition
+
+
+def connect_index():
+    if not PINECONE_API_KEY:
+        raise SystemExit("❌ PINECONE_API_KEY is not set")
+    return Pinecone(api_key=PINECONE_API_KEY).Index(INDEX_NAME, host=PINECONE_INDEX_HOST)
+
+
+def _batches(items: List[Any], size: int) -> Iterator[List[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def export_pinecone(index, provider: EmbeddingProvider, workers: int) -> Dict[str, Partition]:
+    """Lists and fetches every vector in the provider's namespaces."""
+    stats = index.describe_index_stats()
+    if stats.dimension and stats.dimension != provider.dimension:
+        raise SystemExit(f"❌ The index holds {stats.dimension}-dim vectors; {provider.name} produces {provider.dimension}")
+    partitions: Dict[str, Partition] = {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="snapshot-fetch") as pool:
+        for namespace in sorted(stats.namespaces or {}):
+            partition = partition_of(namespace, provider.namespace)
+            if partition is None:
+                continue
+            ids = [item.id for page in index.list(namespace=namespace) for item in page.vectors if item.id]
+            fetched: Dict[str, Any] = {}
+            for response in pool.map(lambda batch: index.fetch(ids=batch, namespace=namespace), _batches(ids, FETCH_BATCH_SIZE)):
+                fetched.update(response.vectors)
+            ids = [vector_id for vector_id in ids if vector_id in fetched]
+            matrix = np.asarray([fetched[vector_id].values for vector_id in ids], dtype=np.float32).reshape(-1, provider.dimension)
+            metadata = [dict(fetched[vector_id].metadata or {}) for vector_id in ids]
+            partitions[partition] = (ids, matrix, metadata)
+            print(f"  {namespace or '(default)'}: {len(ids)} vectors")
+    return partitions
+
+
+def export_local(path: str) -> Dict[str, Partition]:
+    local = PartitionedVectorIndex.load(path)
+    return {
+        namespace: (list(index.ids), index._matrix, list(index.metadata))
+        for namespace, index in local.partitions.items()
+    }
+
+
+def _pack(value: Any) -> np.ndarray:
+    return np.frombuffer(zlib.compress(json.dumps(value, ensure_ascii=False).encode("utf-8")), dtype=np.uint8)
+
+
+def _unpack(array: np.ndarray) -> Any:
+    return json.loads(zlib.decompress(array.tobytes()).decode("utf-8"))
+
+
+def write_snapshot(path: str, partitions: Dict[str, Partition], manifest: Dict[str, Any], dtype: str) -> None:
+    """
+    Writes the bundle through a temp file, so a failed export never replaces a good snapshot.
+
+    Vectors are stored raw (they barely compress, and deflating them made
+    export and restore several times slower); ids and metadata are zlib-packed JSON.
+    """
+    arrays: Dict[str, np.ndarray] = {}
+    manifest = dict(manifest, format=SNAPSHOT_FORMAT, dtype=dtype, namespaces=[])
+    for i, (partition, (ids, matrix, metadata)) in enumerate(sorted(partitions.items())):
+        arrays[f"vectors_{i}"] = matrix.astype(dtype, copy=False)
+        arrays[f"records_{i}"] = _pack({"ids": ids, "metadata": metadata})
+        manifest["namespaces"].append({"partition": partition, "vectors": len(ids)})
+    manifest["vectors"] = sum(item["vectors"] for item in manifest["namespaces"])
+    arrays["manifest"] = np.asarray(json.dumps(manifest, ensure_ascii=False))
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.part"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+
+
+def read_manifest(path: str) -> Dict[str, Any]:
+    with np.load(path) as bundle:
+        return json.loads(str(bundle["manifest"]))
+
+
+def read_partitions(path: str) -> Iterator[Tuple[str, Partition]]:
+    """Yields (partition, (ids, float32 vectors, metadata)), one namespace in memory at a time."""
+    with np.load(path) as bundle:
+        manifest = json.loads(str(bundle["manifest"]))
+        for i, item in enumerate(manifest["namespaces"]):
+            records = _unpack(bundle[f"records_{i}"])
+            yield item["partition"], (records["ids"], bundle[f"vectors_{i}"].astype(np.float32), records["metadata"])
+
+
+def _upsert_with_retries(index, vectors: List[Dict[str, Any]], namespace: str) -> int:
+    for attempt in range(1, UPSERT_ATTEMPTS + 1):
+        try:
+            if namespace:
+                index.upsert(vectors=vectors, namespace=namespace)
+            else:
+                index.upsert(vectors=vectors)
+            return len(vectors)
+        except Exception as e:
+            if attempt == UPSERT_ATTEMPTS:
+                raise
+            print(f"  ⚠️ Upsert of {len(vectors)} vectors failed ({e}); retrying", file=sys.stderr)
+            time.sleep(0.5 * 2 ** attempt)
+    return 0
+
+
+def restore_pinecone(
+    index, path: str, manifest: Dict[str, Any], workers: int, batch_size: int, replace: bool = False
+) -> int:
+    stats = index.describe_index_stats()
+    if stats.dimension and stats.dimension != manifest["dimension"]:
+        raise SystemExit(f"❌ The index holds {stats.dimension}-dim vectors; the snapshot has {manifest['dimension']}")
+    existing = stats.namespaces or {}
+    restored = 0
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="snapshot-upsert") as pool:
+        for partition, (ids, matrix, metadata) in read_partitions(path):
+            namespace = pinecone_namespace(manifest["base_namespace"], partition)
+            # Deleting a namespace that does not exist fails on serverless indexes
+            if replace and namespace in existing:
+                index.delete(delete_all=True, namespace=namespace)
+                print(f"  {namespace or '(default)'}: deleted {existing[namespace].vector_count} vectors")
+            vectors = [
+                {"id": vector_id, "values": row.tolist(), "metadata": meta}
+                for vector_id, row, meta in zip(ids, matrix, metadata)
+            ]
+            count = sum(pool.map(lambda batch: _upsert_with_retries(index, batch, namespace), _batches(vectors, batch_size)))
+            print(f"  {namespace or '(default)'}: {count} vectors")
+            restored += count
+    return restored
+
+
+def restore_local(path: str, manifest: Dict[str, Any], target: str) -> int:
+    local = PartitionedVectorIndex(manifest["dimension"])
+    for partition, (ids, matrix, metadata) in read_partitions(path):
+        index = LocalVectorIndex(manifest["dimension"])
+        # Snapshot vectors are already unit-normalized: skip upsert() and its per-row bookkeeping
+        index.ids, index.metadata, index._matrix = ids, metadata, matrix
+        index._positions = {vector_id: i for i, vector_id in enumerate(ids)}
+        index._first_pass_stale = True
+        local.partitions[partition] = index
+    local.save(target)
+    return len(local)
+
+
+def mark_restored_files(provider: EmbeddingProvider, manifest: Dict[str, Any], path: str, replace: bool = False) -> None:
+    """
+    Adds the snapshot's source files to the indexer's processed list, if the namespace layouts agree.
+
+    With replace the list is rewritten to hold only the snapshot's files.
+    """
+    partitioned = any(item["partition"] for item in manifest["namespaces"])
+    if partitioned != PARTITION_BY_ACADEMIC_YEAR:
+        print("  Namespace layout differs from PARTITION_BY_ACADEMIC_YEAR; processed list left unchanged")
+        return
+    list_file = processed_list_file(provider)
+    done = set() if replace else load_processed_files(list_file)
+    filenames = {vector_id.split("#", 1)[0] for _, (ids, _, _) in read_partitions(path) for vector_id in ids}
+    new = sorted(filenames - done)
+    if new or replace:
+        os.makedirs(os.path.dirname(list_file), exist_ok=True)
+        with open(list_file, "w" if replace else "a", encoding="utf-8") as f:
+            f.writelines(f"{filename}\n" for filename in new)
+    print(f"  Marked {len(new)} files as processed in {os.path.basename(list_file)}")
+
+
+def cmd_export(args) -> None:
+    provider = get_embedding_provider(args.provider)
+    started = time.perf_counter()
+    if args.from_local:
+        print(f"Exporting local index {args.from_local} ({provider.name})...")
+        partitions = export_local(args.from_local)
+        source = f"local:{args.from_local}"
+    else:
+        print(f"Exporting {provider.name} vectors from Pinecone index {INDEX_NAME}...")
+        partitions = export_pinecone(connect_index(), provider, args.workers)
+        source = f"pinecone:{INDEX_NAME}"
+    if not partitions:
+        raise SystemExit("❌ No vectors to export")
+    for ids, matrix, _ in partitions.values():
+        if len(ids) and matrix.shape[1] != provider.dimension:
+            raise SystemExit(f"❌ Vectors have {matrix.shape[1]} dims; {provider.name} produces {provider.dimension}")
+
+    manifest = {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "source": source,
+        "embedding_provider": provider.name,
+        "embedding_model": provider.model,
+        "dimension": provider.dimension,
+        "base_namespace": provider.namespace,
+    }
+    write_snapshot(args.snapshot, partitions, manifest, args.dtype)
+    total = sum(len(ids) for ids, _, _ in partitions.values())
+    size_mb = os.path.getsize(args.snapshot) / 2**20
+    print(f"Wrote {total} vectors in {len(partitions)} namespaces to {args.snapshot} "
+          f"({size_mb:.1f} MB) in {time.perf_counter() - started:.1f}s.")
+
+
+def cmd_restore(args) -> None:
+    manifest = read_manifest(args.snapshot)
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        raise SystemExit(f"❌ Unsupported snapshot format {manifest.get('format')}")
+    provider = get_embedding_provider(manifest["embedding_provider"])
+    if (provider.model, provider.dimension) != (manifest["embedding_model"], manifest["dimension"]) and not args.force:
+        raise SystemExit(
+            f"❌ Snapshot vectors come from {manifest['embedding_model']} ({manifest['dimension']} dims), but the "
+            f"{provider.name} provider is configured for {provider.model} ({provider.dimension} dims); use --force to restore anyway"
+        )
+
+    started = time.perf_counter()
+    if args.to_local:
+        print(f"Restoring {manifest['vectors']} vectors into local index {args.to_local}...")
+        restored = restore_local(args.snapshot, manifest, args.to_local)
+    else:
+        print(f"Restoring {manifest['vectors']} vectors into Pinecone index {INDEX_NAME}...")
+        restored = restore_pinecone(
+            connect_index(), args.snapshot, manifest, args.workers, args.batch_size, replace=args.replace
+        )
+        mark_restored_files(provider, manifest, args.snapshot, replace=args.replace)
+    elapsed = time.perf_counter() - started
+    print(f"Restored {restored} vectors in {elapsed:.1f}s ({restored / max(elapsed, 1e-9):.0f} vectors/s), no embedding calls.")
+
+
+def cmd_info(args) -> None:
+    manifest = read_manifest(args.snapshot)
+    manifest["size_mb"] = round(os.path.getsize(args.snapshot) / 2**20, 2)
+    print(json.dumps(manifest, indent=2, ensure_ascii=False))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export and restore vector index snapshots")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="Dump the vectors of one embedding provider to a snapshot")
+    export.add_argument("snapshot", help="Snapshot file to write (.npz)")
+    export.add_argument("--provider", choices=list(PROVIDERS), help="Embedding provider (default: EMBEDDING_PROVIDER)")
+    export.add_argument("--from-local", help="Export this local index instead of Pinecone")
+    export.add_argument("--dtype", choices=["float32", "float16"], default="float32",
+                        help="float16 halves the file; cosine scores change only in the 4th decimal")
+    export.add_argument("--workers", type=int, default=8, help="Parallel Pinecone fetches")
+    export.set_defaults(func=cmd_export)
+
+    restore = commands.add_parser("restore", help="Load a snapshot into Pinecone or a local index")
+    restore.add_argument("snapshot", help="Snapshot file to read (.npz)")
+    restore.add_argument("--to-local", help="Write a local index to this path instead of upserting to Pinecone")
+    restore.add_argument("--workers", type=int, default=8, help="Parallel Pinecone upserts")
+    restore.add_argument("--batch-size", type=int, default=UPSERT_BATCH_SIZE)
+    restore.add_argument("--force", action="store_true", help="Restore even if the configured embedding model differs")
+    restore.add_argument("--replace", action="store_true",
+                         help="Delete each of the snapshot's Pinecone namespaces before upserting into it")
+    restore.set_defaults(func=cmd_restore)
+
+    info = commands.add_parser("info", help="Print a snapshot's manifest")
+    info.add_argument("snapshot")
+    info.set_defaults(func=cmd_info)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,597 @@
+"""
+Local Stand-ins for Gemini, Pinecone and Redis
+사용법: python script/stand_ins.py [--port 8790] [--llm-latency 800:300] ...
+
+Serves three small HTTP services and a Redis stand-in so the backend can be
+load-tested offline:
+
+- Embedding (port):   :embedContent / :batchEmbedContents with deterministic
+                      hashing vectors, so similar texts get similar vectors.
+- LLM (port + 1):     :generateContent / :streamGenerateContent for the three
+                      agents. extract_pdf_agent turns are replayed from the
+                      recorded *_full_response.json event logs; chat turns
+                      follow the query analysis -> tool call -> answer flow.
+- Pinecone (port + 2): /query, /vectors/upsert, /vectors/list, /vectors/fetch
+                      and /describe_index_stats on a
+                      PartitionedVectorIndex (one namespace per academic
+                      year) seeded from the same event logs.
+- Redis (port + 3):   the few RESP commands the shared cache uses
+                      (CACHE_BACKEND=redis, see app/services/cache.py), in
+                      memory.
+
+Each service has its own latency (mean:stddev ms) and error rate. Point the
+backend at them with the environment printed on startup.
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import StreamRequestHandler, ThreadingTCPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from app.services.cds_records import JSON_DIR, extract_structured_data
+from app.services.embeddings import EMBEDDING_DIMENSION, hash_embedding
+from app.services.vector_store import PartitionedVectorIndex
+
+
+@dataclass
+class LatencyProfile:
+    """Per-service latency (normal, clamped at 0) and error injection."""
+    mean_ms: float = 0.0
+    stddev_ms: float = 0.0
+    error_rate: float = 0.0
+
+    @classmethod
+    def parse(cls, spec: str, error_rate: float = 0.0) -> "LatencyProfile":
+        mean, _, stddev = spec.partition(":")
+        return cls(float(mean or 0), float(stddev or 0), error_rate)
+
+    def sleep(self) -> None:
+        delay = max(0.0, random.gauss(self.mean_ms, self.stddev_ms)) if self.stddev_ms else self.mean_ms
+        if delay:
+            time.sleep(delay / 1000)
+
+    def should_fail(self) -> bool:
+        return random.random() < self.error_rate
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def load_recordings(json_dir: str = JSON_DIR) -> List[Dict[str, Any]]:
+    """
+    Loads the recorded extraction runs.
+
+    Returns:
+        list: One entry per event log with its model turns (content and
+              usageMetadata, in order) and its structured record.
+    """
+    recordings = []
+    if not os.path.isdir(json_dir):
+        return recordings
+    for filename in sorted(os.listdir(json_dir)):
+        if not filename.endswith("_full_response.json"):
+            continue
+        with open(os.path.join(json_dir, filename), "r", encoding="utf-8") as f:
+            events = json.load(f)
+        if not isinstance(events, list):
+            continue
+        turns = [
+            {"content": event["content"], "usageMetadata": event.get("usageMetadata")}
+            for event in events
+            if event.get("usageMetadata") and event.get("content", {}).get("role", "model") == "model"
+        ]
+        record = extract_structured_data(events, filename)
+        if turns:
+            recordings.append({"filename": filename, "turns": turns, "record": record})
+    return recordings
+
+
+# --- Request handlers ---
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    profile = LatencyProfile()
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):  # Keep benchmark output clean
+        pass
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, payload: Any, status: int = 200) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _injected_failure(self) -> bool:
+        self.profile.sleep()
+        if self.profile.should_fail():
+            self._send_json({"error": {"code": 503, "message": "Injected stand-in failure", "status": "UNAVAILABLE"}}, 503)
+            return True
+        return False
+
+
+class EmbeddingHandler(_StandInHandler):
+    """Gemini embedContent / batchEmbedContents."""
+
+    def do_POST(self):
+        body = self._read_json()
+        if self._injected_failure():
+            return
+        if ":batchEmbedContents" in self.path:
+            embeddings = [
+                {"values": hash_embedding(_content_text(request.get("content")), request.get("output_dimensionality") or request.get("outputDimensionality") or EMBEDDING_DIMENSION)}
+                for request in body.get("requests", [])
+            ]
+            self._send_json({"embeddings": embeddings})
+        elif ":embedContent" in self.path:
+            dim = body.get("output_dimensionality") or body.get("outputDimensionality") or EMBEDDING_DIMENSION
+            self._send_json({"embedding": {"values": hash_embedding(_content_text(body.get("content")), dim)}})
+        else:
+            self._send_json({"error": {"code": 404, "message": f"Unknown path {self.path}"}}, 404)
+
+
+class LlmHandler(_StandInHandler):
+    """Gemini generateContent / streamGenerateContent for the backend's agents."""
+
+    recordings: List[Dict[str, Any]] = []
+    chunk_delay_ms = 30.0
+    _next_recording = 0
+    _lock = threading.Lock()
+
+    def do_POST(self):
+        body = self._read_json()
+        if self._injected_failure():
+            return
+        if ":streamGenerateContent" in self.path:
+            self._stream(self._respond(body))
+        elif ":generateContent" in self.path:
+            self._send_json(self._respond(body))
+        else:
+            self._send_json({"error": {"code": 404, "message": f"Unknown path {self.path}"}}, 404)
+
+    @classmethod
+    def _pick_recording(cls) -> Optional[Dict[str, Any]]:
+        if not cls.recordings:
+            return None
+        with cls._lock:
+            recording = cls.recordings[cls._next_recording % len(cls.recordings)]
+            cls._next_recording += 1
+        return recording
+
+    def _respond(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        contents = body.get("contents", [])
+        tools = {
+            declaration.get("name")
+            for tool in body.get("tools", [])
+            for declaration in tool.get("functionDeclarations", [])
+        }
+        last_parts = contents[-1].get("parts", []) if contents else []
+        after_tool = any("functionResponse" in part for part in last_parts)
+        user_text = _last_user_text(contents)
+        prompt_tokens = estimate_tokens(json.dumps(body))
+
+        if "set_model_response" in tools:
+            return self._replay_extraction(contents, user_text, prompt_tokens)
+
+        if "query_college_info" in tools and not after_tool:
+            parts = [
+                {"text": "Searching the CDS index.", "thought": True},
+                {"functionCall": {"name": "query_college_info", "args": {"query": user_text}}, "thoughtSignature": "c3RhbmQtaW4="},
+            ]
+        elif after_tool:
+            tool_output = json.dumps(last_parts[0]["functionResponse"].get("response", {}), ensure_ascii=False)
+            parts = [{"text": "Based on the retrieved Common Data Set sections:\n\n" + tool_output[:600]}]
+        else:
+            # query_analysis_agent: echo an "optimized" English search query
+            parts = [{"text": f"{user_text} admission statistics"}]
+
+        output_tokens = sum(estimate_tokens(part.get("text", "")) for part in parts if not part.get("thought"))
+        return _response(parts, {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": output_tokens,
+            "thoughtsTokenCount": 64,
+            "totalTokenCount": prompt_tokens + output_tokens + 64,
+        })
+
+    def _replay_extraction(self, contents: List[Dict[str, Any]], user_text: str, prompt_tokens: int) -> Dict[str, Any]:
+        """Returns the recorded model turn at the same step of a recorded run."""
+        recording = self._pick_recording()
+        if recording is None:
+            return _response([{"text": "{}"}], {"promptTokenCount": prompt_tokens, "candidatesTokenCount": 1, "totalTokenCount": prompt_tokens + 1})
+        step = sum(1 for content in contents if content.get("role") == "model")
+        turn = recording["turns"][min(step, len(recording["turns"]) - 1)]
+        parts = json.loads(json.dumps(turn["content"]["parts"]))
+        filename = user_text.rsplit(":", 1)[-1].strip()
+        for part in parts:
+            call = part.get("functionCall")
+            if call and call.get("name") == "read_pdf":
+                call["args"] = {"pdf_filename": filename}
+        return _response(parts, turn["usageMetadata"])
+
+    def _stream(self, response: Dict[str, Any]) -> None:
+        """Splits text parts into several SSE chunks; usage goes on the last one."""
+        parts = response["candidates"][0]["content"]["parts"]
+        chunks: List[Dict[str, Any]] = []
+        for part in parts:
+            text = part.get("text")
+            if text and not part.get("thought") and len(text) > 40:
+                pieces = [text[i:i + 40] for i in range(0, len(text), 40)]
+                chunks.extend({**part, "text": piece} for piece in pieces)
+            else:
+                chunks.append(part)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for i, part in enumerate(chunks):
+            last = i == len(chunks) - 1
+            payload = _response([part], response["usageMetadata"] if last else None, finished=last)
+            self.wfile.write(f"data: {json.dumps(payload)}\r\n\r\n".encode("utf-8"))
+            self.wfile.flush()
+            if not last and self.chunk_delay_ms:
+                time.sleep(self.chunk_delay_ms / 1000)
+        self.close_connection = True
+
+
+class PineconeHandler(_StandInHandler):
+    """Pinecone data-plane REST endpoints used by the backend and the indexer."""
+
+    index = PartitionedVectorIndex(EMBEDDING_DIMENSION)
+
+    def do_POST(self):
+        body = self._read_json()
+        if self._injected_failure():
+            return
+        if self.path.startswith("/query"):
+            include_metadata = bool(body.get("includeMetadata"))
+            matches = [
+                {"id": vector_id, "score": score, "values": [], **({"metadata": metadata} if include_metadata else {})}
+                for vector_id, score, metadata in self.index.search(
+                    body.get("vector") or [], int(body.get("topK", 10)), body.get("filter"), body.get("namespace", "")
+                )
+            ]
+            self._send_json({"matches": matches, "namespace": body.get("namespace", ""), "usage": {"readUnits": 1}})
+        elif self.path.startswith("/vectors/upsert"):
+            self._send_json({"upsertedCount": self.index.upsert(body.get("vectors", []), body.get("namespace", ""))})
+        elif self.path.startswith("/describe_index_stats"):
+            self._describe()
+        else:
+            self._send_json({"message": f"Unknown path {self.path}"}, 404)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        namespace = params.get("namespace", [""])[0]
+        partition = self.index.partitions.get(namespace)
+        if url.path.startswith("/describe_index_stats"):
+            self._describe()
+        elif url.path.startswith("/vectors/list"):
+            # Every id in one page (no pagination token)
+            ids = list(partition.ids) if partition is not None else []
+            self._send_json({"vectors": [{"id": vector_id} for vector_id in ids], "namespace": namespace, "usage": {"readUnits": 1}})
+        elif url.path.startswith("/vectors/fetch"):
+            vectors = {}
+            for vector_id in params.get("ids", []):
+                position = partition._positions.get(vector_id) if partition is not None else None
+                if position is not None:
+                    vectors[vector_id] = {
+                        "id": vector_id,
+                        "values": partition._matrix[position].tolist(),
+                        "metadata": partition.metadata[position],
+                    }
+            self._send_json({"vectors": vectors, "namespace": namespace, "usage": {"readUnits": 1}})
+        else:
+            self._send_json({"message": f"Unknown path {self.path}"}, 404)
+
+    def _describe(self) -> None:
+        count = len(self.index)
+        self._send_json({
+            "namespaces": {
+                namespace: {"vectorCount": len(partition)} for namespace, partition in self.index.partitions.items()
+            },
+            "dimension": EMBEDDING_DIMENSION,
+            "indexFullness": 0.0,
+            "totalVectorCount": count,
+        })
+
+
+class RedisHandler(StreamRequestHandler):
+    """
+    In-memory Redis over RESP: strings with expiry and sorted sets, nothing else.
+
+    Unknown commands get an error reply, so a cache change that needs more
+    of Redis fails loudly here instead of passing against a fake.
+    """
+
+    profile = LatencyProfile()
+    strings: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+    zsets: Dict[bytes, Dict[bytes, float]] = {}
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        # Pipelined replies are written one by one; without this each waits for a delayed ACK
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def handle(self):
+        while True:
+            command = self._read_command()
+            if command is None:
+                return
+            self.profile.sleep()
+            if self.profile.should_fail():
+                self._write(RuntimeError("ERR injected failure"))
+                continue
+            name = command[0].decode().upper()
+            handler = getattr(self, f"cmd_{name.lower()}", None)
+            if handler is None:
+                self._write(RuntimeError(f"ERR unknown command '{name}'"))
+                continue
+            with self.lock:
+                try:
+                    reply = handler(*command[1:])
+                except (TypeError, ValueError, IndexError) as e:
+                    reply = RuntimeError(f"ERR {name}: {e}")
+            self._write(reply)
+
+    def _read_command(self) -> Optional[List[bytes]]:
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.split()  # inline command (redis-cli, telnet)
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def _write(self, reply: Any) -> None:
+        self.wfile.write(self._encode(reply))
+        self.wfile.flush()
+
+    def _encode(self, reply: Any) -> bytes:
+        if reply is None:
+            return b"$-1\r\n"
+        if isinstance(reply, RuntimeError):
+            return f"-{reply}\r\n".encode()
+        if isinstance(reply, bool):
+            return b"+OK\r\n"
+        if isinstance(reply, int):
+            return f":{reply}\r\n".encode()
+        if isinstance(reply, float):
+            reply = repr(reply).encode()
+        if isinstance(reply, bytes):
+            return b"$%d\r\n%s\r\n" % (len(reply), reply)
+        return b"*%d\r\n" % len(reply) + b"".join(self._encode(item) for item in reply)
+
+    def _live(self, key: bytes) -> Optional[bytes]:
+        entry = self.strings.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.time():
+            del self.strings[key]
+            entry = None
+        return entry[0] if entry is not None else None
+
+    def cmd_ping(self, *args):
+        return args[0] if args else True
+
+    def cmd_client(self, *args):
+        return True
+
+    def cmd_select(self, db):
+        return True
+
+    def cmd_get(self, key):
+        return self._live(key)
+
+    def cmd_set(self, key, value, *options):
+        options = [option.upper() for option in options]
+        expires_at = None
+        for unit, scale in ((b"EX", 1.0), (b"PX", 0.001)):
+            if unit in options:
+                expires_at = time.time() + float(options[options.index(unit) + 1]) * scale
+        self.strings[key] = (value, expires_at)
+        return True
+
+    def cmd_del(self, *keys):
+        removed = 0
+        for key in keys:
+            removed += (self._live(key) is not None) + (self.zsets.pop(key, None) is not None)
+            self.strings.pop(key, None)
+        return removed
+
+    def cmd_zadd(self, key, *args):
+        flags = []
+        while args and args[0].upper() in (b"XX", b"NX", b"CH"):
+            flags.append(args[0].upper())
+            args = args[1:]
+        zset = self.zsets.setdefault(key, {})
+        added = 0
+        for score, member in zip(args[::2], args[1::2]):
+            if (b"XX" in flags and member not in zset) or (b"NX" in flags and member in zset):
+                continue
+            added += member not in zset
+            zset[member] = float(score)
+        if not zset:
+            del self.zsets[key]
+        return added
+
+    def cmd_zrem(self, key, *members):
+        zset = self.zsets.get(key, {})
+        return sum(zset.pop(member, None) is not None for member in members)
+
+    def cmd_zcard(self, key):
+        return len(self.zsets.get(key, {}))
+
+    def _sorted(self, key: bytes) -> List[Tuple[bytes, float]]:
+        return sorted(self.zsets.get(key, {}).items(), key=lambda item: (item[1], item[0]))
+
+    def cmd_zrange(self, key, start, stop):
+        members = [member for member, _ in self._sorted(key)]
+        stop = int(stop)
+        return members[int(start):None if stop == -1 else stop + 1]
+
+    def cmd_zpopmin(self, key, count=b"1"):
+        popped = self._sorted(key)[:int(count)]
+        for member, _ in popped:
+            del self.zsets[key][member]
+        return [value for member, score in popped for value in (member, score)]
+
+    def cmd_zremrangebyscore(self, key, low, high):
+        def bound(value: bytes) -> float:
+            return float(value.decode().replace("inf", "Infinity"))
+
+        doomed = [member for member, score in self._sorted(key) if bound(low) <= score <= bound(high)]
+        for member in doomed:
+            del self.zsets[key][member]
+        return len(doomed)
+
+
+class _RedisServer(ThreadingTCPServer):
+    allow_reuse_address = True
+
+
+def _content_text(content: Optional[Dict[str, Any]]) -> str:
+    return " ".join(part.get("text", "") for part in (content or {}).get("parts", []))
+
+
+def _last_user_text(contents: List[Dict[str, Any]]) -> str:
+    for content in reversed(contents):
+        if content.get("role") != "user":
+            continue
+        texts = [part["text"] for part in content.get("parts", []) if part.get("text")]
+        if texts:
+            return texts[-1].strip()
+    return ""
+
+
+def _response(parts: List[Dict[str, Any]], usage: Optional[Dict[str, Any]], finished: bool = True) -> Dict[str, Any]:
+    candidate: Dict[str, Any] = {"content": {"role": "model", "parts": parts}, "index": 0}
+    if finished:
+        candidate["finishReason"] = "STOP"
+    payload: Dict[str, Any] = {"candidates": [candidate], "modelVersion": "stand-in"}
+    if usage:
+        payload["usageMetadata"] = usage
+    return payload
+
+
+class StandIns:
+    """Runs the four stand-in servers on background threads."""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8790,
+        embedding: LatencyProfile = LatencyProfile(),
+        llm: LatencyProfile = LatencyProfile(),
+        pinecone: LatencyProfile = LatencyProfile(),
+        redis: LatencyProfile = LatencyProfile(),
+        llm_chunk_delay_ms: float = 30.0,
+        json_dir: str = JSON_DIR,
+    ):
+        recordings = load_recordings(json_dir)
+        records = {r["filename"]: r["record"] for r in recordings if isinstance(r["record"], dict)}
+        index = PartitionedVectorIndex.from_records(records, hash_embedding, EMBEDDING_DIMENSION)
+        seeded = len(index)
+        print(f"🧪 Stand-ins: {len(recordings)} recorded runs, {seeded} vectors seeded")
+
+        handlers = [
+            type("Embedding", (EmbeddingHandler,), {"profile": embedding}),
+            type("Llm", (LlmHandler,), {"profile": llm, "recordings": recordings, "chunk_delay_ms": llm_chunk_delay_ms}),
+            type("Pinecone", (PineconeHandler,), {"profile": pinecone, "index": index}),
+        ]
+        self.host = host
+        self.servers = [ThreadingHTTPServer((host, port + i), handler) for i, handler in enumerate(handlers)]
+        redis_handler = type("Redis", (RedisHandler,), {"profile": redis, "strings": {}, "zsets": {}, "lock": threading.Lock()})
+        self.servers.append(_RedisServer((host, port + len(handlers)), redis_handler))
+        for server in self.servers:
+            server.daemon_threads = True
+
+    def base_url(self, i: int) -> str:
+        return f"http://{self.host}:{self.servers[i].server_address[1]}"
+
+    def environment(self) -> Dict[str, str]:
+        """Environment variables that point the backend at the stand-ins."""
+        return {
+            "GEMINI_API_BASE": self.base_url(0),
+            "GOOGLE_GEMINI_BASE_URL": self.base_url(1),
+            "PINECONE_INDEX_HOST": self.base_url(2),
+            "GOOGLE_API_KEY": "stand-in",
+            "PINECONE_API_KEY": "stand-in",
+            "GOOGLE_GENAI_USE_VERTEXAI": "FALSE",
+            "CACHE_REDIS_URL": f"redis://{self.host}:{self.servers[3].server_address[1]}/0",
+        }
+
+    def start(self) -> "StandIns":
+        for server in self.servers:
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+
+def add_stand_in_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--stand-in-port", type=int, default=8790, help="First of four consecutive ports")
+    parser.add_argument("--embedding-latency", default="40:10", help="mean:stddev in ms")
+    parser.add_argument("--embedding-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-latency", default="800:250", help="mean:stddev in ms (time to first chunk)")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-chunk-delay", type=float, default=30.0, help="ms between streamed chunks")
+    parser.add_argument("--pinecone-latency", default="25:8", help="mean:stddev in ms")
+    parser.add_argument("--pinecone-error-rate", type=float, default=0.0)
+    parser.add_argument("--redis-latency", default="0.3:0.1", help="mean:stddev in ms")
+
+
+def stand_ins_from_args(args: argparse.Namespace) -> StandIns:
+    return StandIns(
+        port=args.stand_in_port,
+        embedding=LatencyProfile.parse(args.embedding_latency, args.embedding_error_rate),
+        llm=LatencyProfile.parse(args.llm_latency, args.llm_error_rate),
+        pinecone=LatencyProfile.parse(args.pinecone_latency, args.pinecone_error_rate),
+        redis=LatencyProfile.parse(args.redis_latency),
+        llm_chunk_delay_ms=args.llm_chunk_delay,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Gemini, Pinecone and Redis stand-ins")
+    add_stand_in_arguments(parser)
+    args = parser.parse_args()
+
+    stand_ins = stand_ins_from_args(args).start()
+    print("Export these before starting the backend:")
+    for key, value in stand_ins.environment().items():
+        print(f"  export {key}={value}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stand_ins.stop()
+
+
+if __name__ == "__main__":
+    main()